@@ -24,6 +24,14 @@ try:  # import ladybug_rhino dependencies
 except ImportError as e:
     raise ImportError('\nFailed to import ladybug_rhino:\n\t{}'.format(e))
 
+try:  # shared solve cache, see Grasshopper Scripts/construction_cache.py
+    from construction_cache import document_cache, layers_key
+except ImportError:
+    document_cache = None
+
+# Material fields the constructions depend on, part of the cache keys
+LAYER_FIELDS = ['UUID', 'Material', 'Thickness', 'Conductivity', 'Density', 'U-value']
+
 
 def read_csv_file(file_path):
     with open(file_path, 'rb') as csvfile:
@@ -78,88 +86,100 @@ HB_Roofs = [base_Roof]
 HB_Windows = [base_Window]
 
 
+cache = document_cache(ghenv) if document_cache is not None else None
+
+
+def cached(key, build):
+    """The construction of key from the document cache, built only if it is not cached."""
+    if cache is None:
+        return build()
+    return cache.get_or_build(key, build)
+
+
+def construction_key(construction, base):
+    """Cache key: element and name, the base construction and the material rows of the layers."""
+    layers = [mat_data[layer_info['UUID']] for layer_info in cons_data[construction]['Layer']]
+    return (construction, hash(base) if base is not None else None, layers_key(layers, LAYER_FIELDS))
+
+
+def build_wall(construction):
+    _materials = list(base_Wall.materials)
+    for layer_info in cons_data[construction]['Layer']:
+        layer = mat_data[layer_info['UUID']]
+        _name_ = layer['Material']
+        name = clean_and_id_ep_string('OpaqueMaterial') if _name_ is None else \
+            clean_ep_string(_name_)
+        mat = EnergyMaterial(
+            name,
+            float(layer['Thickness']),
+            float(layer['Conductivity']),
+            float(layer['Density']),
+            950,  # _spec_heat
+            'MediumRough',  # _roughness_
+            0.9,  # _therm_absp_
+            0.7,  # _sol_absp_
+            0.9  # _vis_absp_
+        )
+        _materials.append(mat)
+    material_objs = [opaque_material_by_identifier(mat) if isinstance(mat, str) else mat for mat in _materials]
+    name = clean_and_id_ep_string('OpaqueConstruction') if construction is None else \
+        clean_ep_string(construction)
+    constr = OpaqueConstruction(name, material_objs)
+    constr.display_name = construction
+    return constr
+
+
+def build_opaque(construction, base):
+    _materials = list(base.materials)
+    for layer_info in cons_data[construction]['Layer']:
+        layer = mat_data[layer_info['UUID']]
+        mat = EnergyMaterial(
+            layer['Material'],
+            float(layer['Thickness']),
+            float(layer['Conductivity']),
+            float(layer['Density']),
+            950,  # _spec_heat
+            'MediumRough',  # _roughness_
+            0.9,  # _therm_absp_
+            0.7,  # _sol_absp_
+            0.9  # _vis_absp_
+        )
+        _materials.append(mat)
+    material_objs = [opaque_material_by_identifier(mat) if isinstance(mat, str) else mat for mat in _materials]
+    return OpaqueConstruction(construction, material_objs)
+
+
+def build_window(construction):
+    _materials = []
+    for layer_info in cons_data[construction]['Layer']:
+        layer = mat_data[layer_info['UUID']]
+        mat = EnergyWindowMaterialSimpleGlazSys(
+            layer['Material'],
+            float(layer['U-value']),
+            0.3,    #shgc
+            0.6     #t_vis
+        )
+        _materials.append(mat)
+    material_objs = [window_material_by_identifier(mat) if isinstance(mat, str) else mat for mat in _materials]
+    return WindowConstruction(construction, material_objs)
+
+
 for construction in cons_data:
     if 'Wall' in construction:
-        _materials = list(base_Wall.materials)
-        for layer_info in cons_data[construction]['Layer']:
-            layer = mat_data[layer_info['UUID']]
-            _name_ = layer['Material']
-            name = clean_and_id_ep_string('OpaqueMaterial') if _name_ is None else \
-                clean_ep_string(_name_)
-            mat = EnergyMaterial(
-                name,
-                float(layer['Thickness']),
-                float(layer['Conductivity']),
-                float(layer['Density']),
-                950,  # _spec_heat
-                'MediumRough',  # _roughness_
-                0.9,  # _therm_absp_
-                0.7,  # _sol_absp_
-                0.9  # _vis_absp_
-            )
-            _materials.append(mat)
-        material_objs = [opaque_material_by_identifier(mat) if isinstance(mat, str) else mat for mat in _materials]
-        print construction
-        name = clean_and_id_ep_string('OpaqueConstruction') if construction is None else \
-            clean_ep_string(construction)
-        print name
-        constr = OpaqueConstruction(name, material_objs)
-        constr.display_name = construction
-        HB_Walls.append(constr)
-
+        HB_Walls.append(cached(construction_key(construction, base_Wall),
+                               lambda: build_wall(construction)))
 
     if 'Floor' in construction:
-        _materials = list(base_Floor.materials)
-        for layer_info in cons_data[construction]['Layer']:
-            layer = mat_data[layer_info['UUID']]
-            mat = EnergyMaterial(
-                layer['Material'],
-                float(layer['Thickness']),
-                float(layer['Conductivity']),
-                float(layer['Density']),
-                950,  # _spec_heat
-                'MediumRough',  # _roughness_
-                0.9,  # _therm_absp_
-                0.7,  # _sol_absp_
-                0.9  # _vis_absp_
-            )
-            _materials.append(mat)
-        material_objs = [opaque_material_by_identifier(mat) if isinstance(mat, str) else mat for mat in _materials]
-        constr = OpaqueConstruction(construction, material_objs)
-        HB_Floors.append(constr)
+        HB_Floors.append(cached(construction_key(construction, base_Floor),
+                                lambda: build_opaque(construction, base_Floor)))
 
     if 'Roof' in construction:
-        _materials = list(base_Roof.materials)
-        for layer_info in cons_data[construction]['Layer']:
-            layer = mat_data[layer_info['UUID']]
-            mat = EnergyMaterial(
-                layer['Material'],
-                float(layer['Thickness']),
-                float(layer['Conductivity']),
-                float(layer['Density']),
-                950,  # _spec_heat
-                'MediumRough',  # _roughness_
-                0.9,  # _therm_absp_
-                0.7,  # _sol_absp_
-                0.9  # _vis_absp_
-            )
-            _materials.append(mat)
-        material_objs = [opaque_material_by_identifier(mat) if isinstance(mat, str) else mat for mat in _materials]
-        constr = OpaqueConstruction(construction, material_objs)
-        HB_Roofs.append(constr)
-
+        HB_Roofs.append(cached(construction_key(construction, base_Roof),
+                               lambda: build_opaque(construction, base_Roof)))
 
     if 'Window' in construction:
-        _materials = []
-        for layer_info in cons_data[construction]['Layer']:
-            layer = mat_data[layer_info['UUID']]
-            mat = EnergyWindowMaterialSimpleGlazSys(
-                layer['Material'],
-                float(layer['U-value']),
-                0.3,    #shgc
-                0.6     #t_vis
-            )
-            _materials.append(mat)
-        material_objs = [window_material_by_identifier(mat) if isinstance(mat, str) else mat for mat in _materials]
-        constr = WindowConstruction(construction, material_objs)
-        HB_Windows.append(constr)
\ No newline at end of file
+        HB_Windows.append(cached(construction_key(construction, None),
+                                 lambda: build_window(construction)))
+
+if cache is not None:
+    ghenv.Component.Message = cache.summary()
@@ -26,54 +26,62 @@ try:  # import ladybug_rhino dependencies
     from ladybug_rhino.grasshopper import all_required_inputs
 except ImportError as e:
     raise ImportError('\nFailed to import ladybug_rhino:\n\t{}'.format(e))
-import rhinoscriptsyntax as rs
+try:  # shared solve cache, see Grasshopper Scripts/construction_cache.py
+    from construction_cache import document_cache, layers_key
+except ImportError:
+    document_cache = None
 import ghpythonlib.treehelpers as th
 _solution = th.tree_to_list(_solution)
 
+# Default assumptions for all materials
+_roughness_ = 'MediumRough'
+_therm_absp_ = 0.9
+_sol_absp_ = 0.7
+_vis_absp_ = 0.9
+# https://www.mrsphysics.co.uk/bge/wp-content/uploads/2016/07/thermal-properties-of-building-materials.pdf
+_spec_heat = 950
+# Record fields the constructions depend on, part of the cache keys
+LAYER_FIELDS = ['name', 'thickness', 'conductivity', 'density']
+
+
+def energy_material(record, materials):
+    """
+    The EnergyMaterial of a material record (from read_csv), created once per
+    material and shared by all constructions that use it.
+    """
+    material = materials.get(record.name)
+    if material is None:
+        material = EnergyMaterial(
+            clean_ep_string(record.name),
+            record.thickness,
+            record.conductivity,
+            record.density,
+            _spec_heat,
+            _roughness_,
+            _therm_absp_,
+            _sol_absp_,
+            _vis_absp_)
+        materials[record.name] = material
+    return material
+
+
+def build_construction(sol, materials):
+    material_objs = [energy_material(layer, materials) for layer in sol]
+    name = '_'.join(material.identifier[0:3] for material in material_objs)
+    return OpaqueConstruction(name, material_objs)
 
 
 HB_Constructions = []
+materials = {}
+cache = document_cache(ghenv) if document_cache is not None else None
 
 for sol in _solution:
-    _materials = []
-    _name_ = []
-    for layer in sol:
-        prop = layer.split(';')
-        identifier = prop[0]
-        _name = clean_ep_string(prop[1])
-        _thickness = prop[2]
-        _conductivity = prop[3]
-        cost = prop[4]
-        embodied_Carbon = prop[5]
-        _density = prop[6]
-        u_value = prop[7]
-        # Adding default assumptions
-        _roughness_ = 'MediumRough'
-        _therm_absp_ = 0.9
-        _sol_absp_ = 0.7
-        _vis_absp_ = 0.9
-        # https://www.mrsphysics.co.uk/bge/wp-content/uploads/2016/07/thermal-properties-of-building-materials.pdf
-        _spec_heat = 950
-        # Creating the EnergyMaterial
-        mat = EnergyMaterial(
-        _name,
-        _thickness,
-        _conductivity,
-        _density,
-        _spec_heat,
-        _roughness_,
-        _therm_absp_,
-        _sol_absp_,
-        _vis_absp_)
-        # Add EnergyMaterial to _materials
-        _materials.append(mat)
-        _name_.append(_name[0:3])
-    # create the construction
-    material_objs = []
-    for material in _materials:
-        if isinstance(material, str):
-            material = opaque_material_by_identifier(material)
-        material_objs.append(material)
-    name = '_'.join(_name_)
-    constr = OpaqueConstruction(name, material_objs)
-    HB_Constructions.append(constr)
\ No newline at end of file
+    if cache is None:
+        constr = build_construction(sol, materials)
+    else:
+        key = ('HBConstruction_from_CSV', layers_key(sol, LAYER_FIELDS))
+        constr = cache.get_or_build(key, lambda: build_construction(sol, materials))
+    HB_Constructions.append(constr)
+
+if cache is not None:
+    ghenv.Component.Message = cache.summary()
@@ -1,35 +1,106 @@
 """Provides a scripting component.
+    Reads the material database once into typed material records. The
+    records are passed by reference to the downstream components, so no
+    strings are joined or split again while the solutions are built.
     Inputs:
-        path: The x script variable
-        run: The y script variable
+        path: Path to the material database CSV (semicolon separated)
+        run: Set to True to read the file
     Output:
-        mat_out_: The a output variable"""
+        mat_out_: List of material records, without the header
+        database: The MaterialDatabase (records and category index)"""
 
 __author__ = "fojacob"
 __version__ = "2022.10.14"
 
-import rhinoscriptsyntax as rs
+import io
+import os
 import csv
+import scriptcontext as sc
 
-identifier = []
+# Columns of the database and the record attribute they are stored in
+COLUMNS = [
+    ('identifier', 'category', str),
+    ('Material', 'name', str),
+    ('Thickness', 'thickness', float),          # m
+    ('Conductivity', 'conductivity', float),    # W/m-K
+    ('Cost', 'cost', float),
+    ('Embodied carbon', 'embodied_carbon', float),
+    ('Density', 'density', float),              # kg/m3
+    ('U-value', 'u_value', float),              # W/m2K, windows only
+]
+MISSING = ('', 'na', 'n/a')
 
-if run == True:
-    #Open the file
-    data = open(path)
 
-    #CSV reader
-    csv_data = csv.reader(data)
+class Material(object):
+    """One row of the material database. Numbers that are 'na' are None."""
+
+    __slots__ = [attribute for _, attribute, _ in COLUMNS]
+
+    def __init__(self, **values):
+        for attribute in self.__slots__:
+            setattr(self, attribute, values.get(attribute))
+
+    def __repr__(self):
+        return 'Material({}: {})'.format(self.category, self.name)
+
+
+class MaterialDatabase(object):
+    """Material records in file order and an index {category: [records]}."""
+
+    def __init__(self, records):
+        self.records = records
+        self.by_category = {}
+        for record in records:
+            self.by_category.setdefault(record.category, []).append(record)
+
+    def category(self, name):
+        return self.by_category.get(name, [])
 
-    #Reformat it into a python object List of lists
-    data_lines = list(csv_data)
+    def __repr__(self):
+        return 'MaterialDatabase({} materials, categories: {})'.format(
+            len(self.records), ', '.join(sorted(self.by_category)))
 
-#    identifier = []
-#    material = []
 
-    for line in data_lines[0:]:
-        identifier.append(line[0])
-    #    material.append(line[1])
-    
+def _convert(value, kind):
+    value = value.strip()
+    if kind is float:
+        return None if value.lower() in MISSING else float(value)
+    return value
 
-mat_out_ = identifier
-#b = material
\ No newline at end of file
+
+def read_materials(path):
+    """Parse the database CSV into a MaterialDatabase."""
+    with io.open(path, 'r', encoding='utf-8-sig') as data:
+        rows = list(csv.reader(data, delimiter=';'))
+    header = [column.strip() for column in rows[0]]
+    positions = [(header.index(column), attribute, kind) for column, attribute, kind in COLUMNS
+                 if column in header]
+    records = []
+    for row in rows[1:]:
+        if not any(cell.strip() for cell in row):
+            continue
+        records.append(Material(**dict((attribute, _convert(row[i], kind))
+                                       for i, attribute, kind in positions if i < len(row))))
+    return MaterialDatabase(records)
+
+
+def load_materials(path):
+    """
+    The MaterialDatabase of a file, parsed once and kept in sc.sticky until
+    the file changes, so re-solving the definition does not read it again.
+    """
+    key = 'material_database:' + os.path.abspath(path)
+    stamp = os.path.getmtime(path)
+    cached = sc.sticky.get(key)
+    if cached is None or cached[0] != stamp:
+        cached = (stamp, read_materials(path))
+        sc.sticky[key] = cached
+    return cached[1]
+
+
+database = None
+mat_out_ = []
+
+if run == True:
+    database = load_materials(path)
+    mat_out_ = database.records
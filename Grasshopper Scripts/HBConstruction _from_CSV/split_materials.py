@@ -1,6 +1,8 @@
 """Provides a scripting component.
+    Splits the material records of read_csv by their category, with one
+    pass over the records (no string search).
     Inputs:
-        mat_in: The x script variable
+        mat_in: The material records (mat_out_ of read_csv)
 
     Output:
         insulation: The a output variable
@@ -10,22 +12,10 @@
 __author__ = "ssanjay"
 __version__ = "2022.10.20"
 
-import rhinoscriptsyntax as rs
-# Make output list containers
-mat,thk,cond,cost,embodied,density,u_value = [],[],[],[],[],[],[]
-# Remove the header
-mat_in = mat_in[1:]
-
-insulation = []
-board = []
-window = []
-
-
-# Searching through all the materials in DB
+by_category = {}
 for mat in mat_in:
-    if 'insulation' in mat:
-        insulation.append(mat)
-    elif 'Board' in mat:
-        board.append(mat)
-    elif 'window' in mat:
-        window.append(mat)
\ No newline at end of file
+    by_category.setdefault(mat.category, []).append(mat)
+
+insulation = by_category.get('insulation', [])
+board = by_category.get('Board', [])
+window = by_category.get('window', [])
@@ -0,0 +1,124 @@
+"""
+Solve cache for Grasshopper components that build Honeybee constructions.
+
+A component rebuilds all of its constructions whenever any upstream input
+changes, e.g. in every Wallacei or Colibri iteration even when only the
+geometry changed. The cache keeps the constructions that were built, keyed by
+their material layers (and base construction), and returns the existing
+objects when the same key is asked for again.
+
+There is one cache per Grasshopper document, kept in scriptcontext.sticky, so
+all components of a definition share it and it survives re-solves. It holds
+at most max_size constructions; the least recently used ones are dropped first.
+
+Copy this file next to the other Python scripts of Rhino (e.g. the
+%APPDATA%/McNeel/Rhinoceros/<version>/scripts folder) so the components can
+import it. Usage in a component:
+
+    from construction_cache import document_cache
+    cache = document_cache(ghenv)
+    constr = cache.get_or_build(key, lambda: OpaqueConstruction(name, materials))
+    ghenv.Component.Message = cache.summary()
+"""
+
+from collections import OrderedDict
+
+try:
+    import scriptcontext as sc
+except ImportError:
+    sc = None
+
+DEFAULT_MAX_SIZE = 5000
+STICKY_PREFIX = 'construction_cache:'
+
+
+class ConstructionCache(object):
+    """
+    Least recently used cache of built constructions with hit and miss counters.
+
+    Parameters:
+    - max_size: Largest number of cached constructions.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def get_or_build(self, key, build):
+        """
+        The cached value of key, or build() stored under key.
+
+        Parameters:
+        - key: Hashable key of everything the value depends on.
+        - build: Function without arguments that builds the value.
+        """
+        if key in self.items:
+            value = self.items.pop(key)
+            self.items[key] = value                 # most recently used last
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = build()
+        self.items[key] = value
+        while len(self.items) > self.max_size:
+            self.items.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    def clear(self):
+        """Drop all cached values and reset the counters."""
+        self.items.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def summary(self):
+        """Short text for the component message, e.g. 'cache 120 hit / 12 miss'."""
+        return 'cache {} hit / {} miss'.format(self.hits, self.misses)
+
+    def __repr__(self):
+        return 'ConstructionCache({} items, {} hits, {} misses, {} evictions)'.format(
+            len(self.items), self.hits, self.misses, self.evictions)
+
+
+def document_cache(ghenv, max_size=DEFAULT_MAX_SIZE):
+    """
+    The ConstructionCache of the Grasshopper document of a component,
+    created on first use. A new max_size is applied to the existing cache.
+
+    Parameters:
+    - ghenv: The ghenv of the calling component.
+    - max_size: Largest number of cached constructions.
+    """
+    key = STICKY_PREFIX + str(ghenv.Component.OnPingDocument().DocumentID)
+    sticky = sc.sticky if sc is not None else {}
+    cache = sticky.get(key)
+    if cache is None:
+        cache = ConstructionCache(max_size)
+        sticky[key] = cache
+    cache.max_size = max_size
+    return cache
+
+
+def layers_key(layers, fields):
+    """
+    Hashable key of a material layer stack.
+
+    Parameters:
+    - layers: Material records (objects or dicts), exterior to interior.
+    - fields: Names of the fields the construction depends on.
+    """
+    key = []
+    for layer in layers:
+        if isinstance(layer, dict):
+            key.append(tuple(layer.get(field) for field in fields))
+        else:
+            key.append(tuple(getattr(layer, field, None) for field in fields))
+    return tuple(key)
@@ -5,9 +5,13 @@ The construction is composed of three layers:
     - Insulation (middle, e.g., rockwool; thickness is calculated)
     - Concrete (interior)
 The script calculates the required insulation thickness such that:
-    U = 1 / (R_cladding + R_insulation + R_concrete)
+    U = 1 / (R_si + R_cladding + R_insulation + R_concrete + R_se)
 It also outputs a step-by-step explanation of the U-value calculation.
 
+The solver functions below work for any layer stack with one or more free
+layers and accept a single target U-value or a list/array of targets, so
+they can also be used to generate U-value sweeps outside this component.
+
 Inputs:
     _u_value: Desired overall U-value [W/m²K].
     _name: Name for the construction.
@@ -15,11 +19,12 @@ Inputs:
 Outputs:
     constr: An opaque construction for Honeybee.
     calculation: A text string showing the step-by-step U-value calculation.
+        Only built when something is connected to this output.
 """
 
 ghenv.Component.Name = "HB Simple Wall U-value Construction"
 ghenv.Component.NickName = "SimpleWallU"
-ghenv.Component.Message = "v1.1"
+ghenv.Component.Message = "v1.2"
 ghenv.Component.Category = "HB-Energy"
 ghenv.Component.SubCategory = "1 :: Constructions"
 ghenv.Component.AdditionalHelpFromDocStrings = "3"
@@ -45,6 +50,146 @@ try:
 except ImportError as e:
     raise ImportError('\nFailed to import ladybug_rhino:\n\t{}'.format(e))
 
+# numpy is only available in CPython (Rhino 8); IronPython falls back to lists
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Surface resistances for horizontal heat flow according to ISO 6946 [m²K/W]
+R_SI = 0.13
+R_SE = 0.04
+
+
+def split_layers(layers):
+    """
+    Split a layer stack into its fixed resistance and its free layers.
+
+    Parameters:
+    - layers: List of dicts ordered exterior to interior. Each dict needs a
+      'conductivity' [W/m-K] and a 'thickness' [m]. Layers with thickness None
+      are free layers; they may carry a 'share' weight (default 1) that sets
+      their part of the missing resistance.
+
+    Returns:
+    - Tuple with the fixed resistance [m²K/W], the indices of the free layers
+      and a list of metres of thickness per m²K/W of missing resistance for
+      each free layer.
+    """
+    r_fixed = 0.0
+    free_index = []
+    free_shares = []
+    free_conductivity = []
+    for i, layer in enumerate(layers):
+        if layer['thickness'] is None:
+            free_index.append(i)
+            free_shares.append(float(layer.get('share', 1.0)))
+            free_conductivity.append(float(layer['conductivity']))
+        else:
+            r_fixed += float(layer['thickness']) / float(layer['conductivity'])
+    if not free_index:
+        raise ValueError("At least one layer needs a thickness of None to be solved for.")
+    share_sum = sum(free_shares)
+    m_per_r = [s / share_sum * k for s, k in zip(free_shares, free_conductivity)]
+    return r_fixed, free_index, m_per_r
+
+
+def solve_free_thickness(layers, u_values, r_si=R_SI, r_se=R_SE):
+    """
+    Solve the thickness of the free layers for one or many target U-values.
+
+    The missing resistance R_req = 1/U - R_si - R_se - R_fixed is split over
+    the free layers by their share, so every free layer i gets
+    thickness_i = R_req * share_i / sum(share) * conductivity_i. All targets
+    are solved in a single outer product.
+
+    Parameters:
+    - layers: Layer stack, see split_layers.
+    - u_values: A single U-value or a sequence of U-values [W/m²K].
+    - r_si: Interior surface resistance [m²K/W].
+    - r_se: Exterior surface resistance [m²K/W].
+
+    Returns:
+    - Thicknesses [m] of shape (n_targets, n_free). A numpy array when numpy
+      is available, otherwise a list of lists. A single U-value returns a
+      single row.
+    """
+    r_fixed, free_index, m_per_r = split_layers(layers)
+    r_known = r_fixed + r_si + r_se
+    single = not hasattr(u_values, '__len__')
+
+    if np is not None:
+        u = np.atleast_1d(np.asarray(u_values, dtype=float))
+        r_req = 1.0 / u - r_known
+        if np.any(r_req <= 0):
+            raise ValueError("Desired U-value {} is too high for the fixed layers. "
+                             "Please specify a lower U-value (i.e., higher insulation performance)."
+                             .format(u[r_req <= 0][0]))
+        thickness = np.outer(r_req, m_per_r)
+        return thickness[0] if single else thickness
+
+    u = [u_values] if single else list(u_values)
+    r_req = [1.0 / value - r_known for value in u]
+    for value, r in zip(u, r_req):
+        if r <= 0:
+            raise ValueError("Desired U-value {} is too high for the fixed layers. "
+                             "Please specify a lower U-value (i.e., higher insulation performance)."
+                             .format(value))
+    thickness = [[r * m for m in m_per_r] for r in r_req]
+    return thickness[0] if single else thickness
+
+
+def explain_u_value(layers, u_value, thickness, r_si=R_SI, r_se=R_SE):
+    """
+    Build the step-by-step explanation for a single solved layer stack.
+
+    Parameters:
+    - layers: Layer stack, see split_layers. Each layer may carry a 'name'.
+    - u_value: The target U-value [W/m²K].
+    - thickness: Solved free layer thicknesses for u_value (one row of
+      solve_free_thickness).
+    - r_si: Interior surface resistance [m²K/W].
+    - r_se: Exterior surface resistance [m²K/W].
+
+    Returns:
+    - A text string with the calculation.
+    """
+    r_fixed, free_index, m_per_r = split_layers(layers)
+    r_total = 1.0 / u_value
+    r_req = r_total - r_fixed - r_si - r_se
+
+    lines = ["Step-by-step U-value Calculation:",
+             "Provided U-value: {0:.3f} W/m²K".format(u_value)]
+    for i, layer in enumerate(layers):
+        if layer['thickness'] is None:
+            continue
+        lines.append("{0} layer: thickness = {1:.3f} m, conductivity = {2:.3f} W/m-K, "
+                     "so R = {1:.3f} / {2:.3f} = {3:.3f} m²K/W".format(
+                         layer.get('name', 'Layer {}'.format(i + 1)), layer['thickness'],
+                         layer['conductivity'], layer['thickness'] / layer['conductivity']))
+    lines.append("Surface resistances: R_si = {0:.3f} m²K/W, R_se = {1:.3f} m²K/W".format(r_si, r_se))
+    lines.append("Fixed resistance: R_fixed = R_si + sum(R_layers) + R_se = {0:.3f} m²K/W".format(
+        r_fixed + r_si + r_se))
+    lines.append("Desired total resistance: R_total = 1 / U = 1 / {0:.3f} = {1:.3f} m²K/W".format(
+        u_value, r_total))
+    lines.append("Required free resistance: R_free = R_total - R_fixed = {0:.3f} - {1:.3f} = {2:.3f} m²K/W".format(
+        r_total, r_fixed + r_si + r_se, r_req))
+    for j, i in enumerate(free_index):
+        layer = layers[i]
+        lines.append("{0} layer: conductivity = {1:.3f} W/m-K, so thickness = {2:.3f} m (R = {3:.3f} m²K/W)".format(
+            layer.get('name', 'Layer {}'.format(i + 1)), layer['conductivity'], thickness[j],
+            thickness[j] / layer['conductivity']))
+    return "\n".join(lines) + "\n"
+
+
+def output_is_connected(nickname):
+    """Returns True if the component output with the given nickname has recipients."""
+    for param in ghenv.Component.Params.Output:
+        if param.NickName == nickname:
+            return param.Recipients.Count > 0
+    return True
+
+
 if all_required_inputs(ghenv.Component):
     # ----- Fixed material properties -----
     # Concrete (interior layer)
@@ -70,21 +215,13 @@ if all_required_inputs(ghenv.Component):
     sol_absp = 0.7
     vis_absp = sol_absp
 
-    # ----- Calculate fixed layer resistances -----
-    R_conc = thickness_conc / conductivity_conc  # Concrete resistance [m²K/W]
-    R_clad = thickness_clad / conductivity_clad  # Cladding resistance [m²K/W]
-    R_fixed = R_conc + R_clad
-
-    # ----- Desired total resistance from U-value -----
-    R_total_desired = 1.0 / _u_value  # [m²K/W]
-
-    if R_total_desired <= R_fixed:
-        raise ValueError("Desired U-value is too high for the fixed layers. "
-                         "Please specify a lower U-value (i.e., higher insulation performance).")
-
-    # ----- Calculate required insulation layer -----
-    R_insul = R_total_desired - R_fixed
-    thickness_insul = R_insul * conductivity_insul
+    # ----- Layer stack (exterior to interior), insulation is solved -----
+    layers = [
+        {'name': 'Cladding', 'thickness': thickness_clad, 'conductivity': conductivity_clad},
+        {'name': 'Insulation', 'thickness': None, 'conductivity': conductivity_insul},
+        {'name': 'Concrete', 'thickness': thickness_conc, 'conductivity': conductivity_conc},
+    ]
+    thickness_insul = float(solve_free_thickness(layers, _u_value)[0])
 
     # ----- Create material names -----
     conc_name = clean_and_id_ep_string("Concrete_" + _name_) if _name_ is not None else clean_and_id_ep_string(
@@ -109,19 +246,7 @@ if all_required_inputs(ghenv.Component):
     constr = OpaqueConstruction(constr_name, materials_list)
     constr.display_name = _name_ if _name_ is not None else constr_name
 
-    # ----- Build the step-by-step calculation explanation -----
-    calculation = ""
-    calculation += "Step-by-step U-value Calculation:\n"
-    calculation += "1. Provided U-value: {0:.3f} W/m²K\n".format(_u_value)
-    calculation += "2. Concrete layer: thickness = {0:.3f} m, conductivity = {1:.3f} W/m-K, so R_concrete = {0:.3f} / {1:.3f} = {2:.3f} m²K/W\n".format(
-        thickness_conc, conductivity_conc, R_conc)
-    calculation += "3. Cladding layer: thickness = {0:.3f} m, conductivity = {1:.3f} W/m-K, so R_cladding = {0:.3f} / {1:.3f} = {2:.3f} m²K/W\n".format(
-        thickness_clad, conductivity_clad, R_clad)
-    calculation += "4. Fixed resistance: R_fixed = R_concrete + R_cladding = {0:.3f} + {1:.3f} = {2:.3f} m²K/W\n".format(
-        R_conc, R_clad, R_fixed)
-    calculation += "5. Desired total resistance: R_total = 1 / U = 1 / {0:.3f} = {1:.3f} m²K/W\n".format(_u_value,
-                                                                                                         R_total_desired)
-    calculation += "6. Required insulation resistance: R_insulation = R_total - R_fixed = {0:.3f} - {1:.3f} = {2:.3f} m²K/W\n".format(
-        R_total_desired, R_fixed, R_insul)
-    calculation += "7. Insulation layer: conductivity = {0:.3f} W/m-K, so thickness = R_insulation * conductivity = {1:.3f} * {0:.3f} = {2:.3f} m\n".format(
-        conductivity_insul, R_insul, thickness_insul)
+    # ----- Build the step-by-step calculation explanation only if it is used -----
+    calculation = None
+    if output_is_connected('calculation'):
+        calculation = explain_u_value(layers, _u_value, [thickness_insul])
@@ -0,0 +1,327 @@
+# Author: Computational Sustainable Design group, Chalmers
+# Context shading from a DTCC city model: neighbouring buildings within a radius
+# of the IDF building are found with a spatial index, culled if they are too low
+# or hidden behind nearer buildings, and extruded into Shading:Building:Detailed.
+
+# -------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------
+
+import os                                           # For file and directory operations
+import re                                           # For numeric IDF fields
+import json                                         # For reading the city model
+import logging                                      # For progress messages
+import numpy as np                                  # For the footprint arrays
+from scipy.spatial import cKDTree                   # For selecting neighbours
+from idf_text import IDFText, ENCODING, format_value  # For reading the IDF without an IDD
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('Context shading')
+
+NUMBER_PATTERN = re.compile(r'^[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$')
+COMMENT_COLUMN = 42                                 # Column of the '!-' comments, as written by eppy
+
+# -------------------------------------------------------------------------------
+# City model
+# -------------------------------------------------------------------------------
+
+class CityModel:
+    """
+    Building footprints of a city model in flat arrays.
+
+    Footprint b has the (x, y) vertices xy[offsets[b]:offsets[b + 1]] in
+    counterclockwise order without a closing vertex, and is extruded from
+    ground[b] to ground[b] + height[b].
+    """
+
+    def __init__(self, xy, offsets, ground, height, ids):
+        self.xy = xy
+        self.offsets = offsets
+        self.ground = ground
+        self.height = height
+        self.ids = ids
+        counts = np.diff(offsets)
+        # Centre and radius of the circle around every footprint, for the spatial index
+        self.centre = np.add.reduceat(xy, offsets[:-1]) / counts[:, None]
+        owner = np.repeat(np.arange(len(counts)), counts)
+        self.radius = np.zeros(len(counts))
+        np.maximum.at(self.radius, owner, np.linalg.norm(xy - self.centre[owner], axis=1))
+        self._tree = None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def footprint(self, b):
+        return self.xy[self.offsets[b]:self.offsets[b + 1]]
+
+    @property
+    def tree(self):
+        """KD-tree of the footprint centres, built on first use."""
+        if self._tree is None:
+            self._tree = cKDTree(self.centre)
+        return self._tree
+
+    def within(self, point, radius):
+        """Buildings with any part within radius of point (x, y)."""
+        candidates = np.array(self.tree.query_ball_point(point, radius + self.radius.max()), dtype=np.int64)
+        if len(candidates) == 0:
+            return candidates
+        distance = np.linalg.norm(self.centre[candidates] - point, axis=1) - self.radius[candidates]
+        return candidates[distance <= radius]
+
+
+def load_city_model(path, offset=None):
+    """
+    Read the buildings of a DTCC CityModel JSON (city.to_json() schema, as read
+    by the Grasshopper DTCC_CITYJSON_parser).
+
+    Parameters:
+    - path: Path to the CityModel JSON.
+    - offset: (x, y, z) added to the model coordinates to get IDF coordinates.
+      Default: (-xmin, -ymin, 0) of the model bounds, the origin the Grasshopper
+      parser uses for the Rhino model.
+
+    Returns:
+    - CityModel.
+    """
+    with open(path, 'r') as file:
+        data = json.load(file)
+    if offset is None:
+        offset = (-data['bounds']['xmin'], -data['bounds']['ymin'], 0.0)
+    rings, ground, height, ids = [], [], [], []
+    for i, building in enumerate(data['buildings']):
+        ring = np.array([(v['x'], v['y']) for v in building['footprint']['shell']['vertices']], dtype=np.float64)
+        if len(ring) > 1 and np.allclose(ring[0], ring[-1]):
+            ring = ring[:-1]
+        if len(ring) < 3 or building.get('height', 0) <= 0:
+            continue
+        # Counterclockwise seen from above (positive shoelace area)
+        area = np.dot(ring[:, 0], np.roll(ring[:, 1], -1)) - np.dot(ring[:, 1], np.roll(ring[:, 0], -1))
+        rings.append(ring if area > 0 else ring[::-1])
+        ground.append(building.get('groundHeight', 0.0))
+        height.append(building['height'])
+        ids.append(str(building.get('uuid', building.get('id', i))))
+    counts = np.array([len(ring) for ring in rings], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    xy = np.concatenate(rings) + np.asarray(offset[:2], dtype=np.float64)
+    ground = np.asarray(ground, dtype=np.float64) + offset[2]
+    logger.info(f'{len(rings)} buildings read from {path}')
+    return CityModel(xy, offsets, ground, np.asarray(height, dtype=np.float64), ids)
+
+# -------------------------------------------------------------------------------
+# Target building
+# -------------------------------------------------------------------------------
+
+def surface_vertices(idf, class_name='BUILDINGSURFACE:DETAILED'):
+    """
+    Vertices of all surfaces of a class in an IDFText, from the trailing numeric
+    fields of every object (the X, Y, Z vertex fields).
+
+    Returns:
+    - Array (n, 3).
+    """
+    vertices = []
+    for index in idf.find(class_name):
+        values = [idf.text[start:end] for start, end, _ in idf.fields(index)]
+        trailing = 0
+        while trailing < len(values) and NUMBER_PATTERN.match(values[-1 - trailing]):
+            trailing += 1
+        trailing -= trailing % 3
+        if trailing:
+            vertices.append(np.array(values[len(values) - trailing:], dtype=np.float64).reshape(-1, 3))
+    return np.concatenate(vertices) if vertices else np.empty((0, 3))
+
+
+def _cross(a, b):
+    return a[0] * b[1] - a[1] * b[0]
+
+
+def convex_hull(points):
+    """Convex hull of 2-D points in counterclockwise order (monotone chain)."""
+    points = np.unique(points, axis=0)
+    if len(points) < 3:
+        return points
+
+    def half(sequence):
+        hull = []
+        for p in sequence:
+            while len(hull) >= 2 and _cross(hull[-1] - hull[-2], p - hull[-2]) <= 0:
+                hull.pop()
+            hull.append(p)
+        return hull[:-1]
+
+    return np.array(half(points) + half(points[::-1]))
+
+
+def inside(points, polygon):
+    """Whether 2-D points are inside a polygon (even-odd rule), as a boolean array."""
+    x, y = points[:, 0:1], points[:, 1:2]
+    x1, y1 = polygon[:, 0], polygon[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    crosses = (y1 > y) != (y2 > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_cross = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+    return (crosses & (x < x_cross)).sum(axis=1) % 2 == 1
+
+# -------------------------------------------------------------------------------
+# Culling
+# -------------------------------------------------------------------------------
+
+def _azimuth_bins(view, footprint, bins):
+    """Azimuth bins covered by a footprint seen from each viewpoint, as a boolean array (viewpoints, bins)."""
+    delta = footprint[None, :, :] - view[:, None, :]
+    azimuth = np.arctan2(delta[..., 1], delta[..., 0])
+    # A footprint seen from outside covers one interval of azimuths; measure it
+    # relative to the first vertex so it does not wrap around +-pi
+    relative = np.angle(np.exp(1j * (azimuth - azimuth[:, :1])))
+    low = azimuth[:, 0] + relative.min(axis=1)
+    high = azimuth[:, 0] + relative.max(axis=1)
+    width = 2 * np.pi / bins
+    first = np.floor(low / width).astype(np.int64)
+    last = np.floor(high / width).astype(np.int64)
+    covered = np.zeros((len(view), bins), dtype=bool)
+    for v in range(len(view)):
+        covered[v, np.arange(first[v], last[v] + 1) % bins] = True
+    return covered
+
+
+def select_context(city, target_xy, target_base, target_top, radius=200.0, min_elevation=2.0,
+                   occlusion=True, bins=720):
+    """
+    Neighbours that can shade the target building.
+
+    Buildings are taken from within radius of the target, then culled:
+    - too low or too far: the top of the building is seen from the target base
+      at less than min_elevation degrees above the horizon;
+    - occluded: from every corner of the target (at its top), the building is
+      behind the horizon of nearer buildings in every azimuth it covers. Nearer
+      buildings are only counted with the elevation of their farthest vertex,
+      so the test is conservative from those viewpoints.
+
+    Parameters:
+    - city: CityModel.
+    - target_xy: Footprint (n, 2) of the target, e.g. the convex hull of its vertices.
+    - target_base, target_top: Lowest and highest z of the target.
+    - radius: Search radius in m.
+    - min_elevation: Elevation angle in degrees below which buildings are culled.
+    - occlusion: Cull occluded buildings.
+    - bins: Number of azimuth bins of the horizon.
+
+    Returns:
+    - Indices of the selected buildings, nearest first.
+    """
+    centre = target_xy.mean(axis=0)
+    candidates = city.within(centre, radius + np.linalg.norm(target_xy - centre, axis=1).max())
+    # Drop the target itself (buildings whose centre is inside the target's footprint)
+    candidates = candidates[~inside(city.centre[candidates], target_xy)]
+    if len(candidates) == 0:
+        return candidates
+
+    near, far = [], []
+    for b in candidates:
+        distance = np.linalg.norm(city.footprint(b)[None, :, :] - target_xy[:, None, :], axis=2)
+        near.append(distance.min())
+        far.append(distance.max())
+    near, far = np.maximum(np.array(near), 1e-3), np.array(far)
+    top = city.ground[candidates] + city.height[candidates]
+    elevation = np.degrees(np.arctan2(top - target_base, near))
+    keep = (near <= radius) & (elevation >= min_elevation)
+    candidates, near, far, top = candidates[keep], near[keep], far[keep], top[keep]
+    order = np.argsort(near)
+    candidates, near, far, top = candidates[order], near[order], far[order], top[order]
+    logger.info(f'{keep.sum()} buildings within {radius} m and above {min_elevation} deg, of {len(keep)}')
+    if not occlusion:
+        return candidates
+
+    views = np.vstack([target_xy, centre])
+    horizon = np.full((len(views), bins), -np.pi / 2)
+    selected = []
+    for b, top_z in zip(candidates, top):
+        footprint = city.footprint(b)
+        covered = _azimuth_bins(views, footprint, bins)
+        distance = np.linalg.norm(footprint[None, :, :] - views[:, None, :], axis=2)
+        highest = np.arctan2(top_z - target_top, np.maximum(distance.min(axis=1), 1e-3))
+        visible = (covered & (horizon < highest[:, None])).any()
+        if visible:
+            selected.append(b)
+            lowest = np.arctan2(top_z - target_top, distance.max(axis=1))
+            horizon = np.where(covered, np.maximum(horizon, lowest[:, None]), horizon)
+    logger.info(f'{len(selected)} buildings left after occlusion culling')
+    return np.array(selected, dtype=np.int64)
+
+# -------------------------------------------------------------------------------
+# Shading surfaces
+# -------------------------------------------------------------------------------
+
+def extrude(footprint, ground, height, roof=True):
+    """
+    Walls (and roof) of an extruded footprint as vertex lists, counterclockwise
+    seen from outside starting at the upper left corner.
+    """
+    top = ground + height
+    surfaces = []
+    for (x1, y1), (x2, y2) in zip(footprint, np.roll(footprint, -1, axis=0)):
+        surfaces.append([(x1, y1, top), (x1, y1, ground), (x2, y2, ground), (x2, y2, top)])
+    if roof:
+        surfaces.append([(x, y, top) for x, y in footprint])
+    return surfaces
+
+
+def shading_object_text(name, vertices):
+    """One Shading:Building:Detailed object as IDF text, in the layout eppy writes."""
+
+    def line(value, comment, last=False):
+        field = f'  {value}{";" if last else ","}'
+        return f'{field:<{COMMENT_COLUMN}}!- {comment}'
+
+    lines = ['Shading:Building:Detailed,', line(name, 'Name'), line('', 'Transmittance Schedule Name'),
+             line('', 'Number of Vertices')]
+    for i, vertex in enumerate(vertices):
+        value = ', '.join(format_value(round(float(c), 6)) for c in vertex)
+        lines.append(line(value, f'X,Y,Z Vertex {i + 1} {{m}}', last=i == len(vertices) - 1))
+    return '\n'.join(lines) + '\n'
+
+
+def add_context_shading(idf_path, city_model_path, out_path=None, radius=200.0, min_elevation=2.0,
+                        occlusion=True, roof=True, offset=None, prefix='Context'):
+    """
+    Add the neighbouring buildings of a city model to an IDF as shading surfaces.
+
+    The IDF is handled as text (see idf_text.py): the target building's vertices
+    are read from its BuildingSurface:Detailed objects, and the shading objects
+    are appended, so the rest of the file stays as it is. The city model must be
+    in the IDF's coordinates after the offset; zone origins are not applied.
+
+    Parameters:
+    - idf_path: The IDF of the target building.
+    - city_model_path: DTCC CityModel JSON.
+    - out_path: Output IDF (default: overwrite idf_path).
+    - radius, min_elevation, occlusion: See select_context.
+    - roof: Add the roofs of the neighbours as well as their walls.
+    - offset: See load_city_model.
+    - prefix: Prefix of the shading object names.
+
+    Returns:
+    - Number of shading surfaces added.
+    """
+    idf = IDFText.read(idf_path)
+    vertices = surface_vertices(idf)
+    if len(vertices) == 0:
+        raise ValueError(f'No BuildingSurface:Detailed vertices found in {idf_path}')
+    city = load_city_model(city_model_path, offset)
+    target_xy = convex_hull(vertices[:, :2])
+    selected = select_context(city, target_xy, vertices[:, 2].min(), vertices[:, 2].max(),
+                              radius, min_elevation, occlusion)
+
+    objects = []
+    for b in selected:
+        for i, surface in enumerate(extrude(city.footprint(b), city.ground[b], city.height[b], roof)):
+            objects.append(shading_object_text(f'{prefix}_{city.ids[b]}_{i}', surface))
+    newline = '\r\n' if '\r\n' in idf.text else '\n'
+    text = idf.text.rstrip() + newline * 2 + newline.join(o.replace('\n', newline) for o in objects)
+    out_path = out_path or idf_path
+    with open(out_path + '.tmp', 'w', encoding=ENCODING, newline='') as file:
+        file.write(text)
+    os.replace(out_path + '.tmp', out_path)
+    logger.info(f'{len(objects)} shading surfaces from {len(selected)} buildings added to {out_path}')
+    return len(objects)
@@ -56,13 +56,26 @@ def idf_file_generator(idf_dir):
         if idf_file.endswith('.idf'):
             yield os.path.join(idf_dir, idf_file)
 
-def modified_idf_run_generator(epwfile, idf_dir):
+def modify_idf(idf, simulation_timestep=1):
+    """
+    Apply the standard modifications to an IDF before running it.
+    
+    Parameters:
+    - idf: The IDF object to modify.
+    - simulation_timestep: Number of timesteps per hour.
+    """
+    idf.idfobjects['TIMESTEP'][0].Number_of_Timesteps_per_Hour = simulation_timestep
+    idf.idfobjects['OUTPUTCONTROL:TABLE:STYLE'][0].Unit_Conversion = 'JtoKWH'
+
+def modified_idf_run_generator(epwfile, idf_dir, results_dir='results', simulation_timestep=1):
     """
     A generator yielding modified IDF objects and their respective run options.
     
     Parameters:
     - epwfile: The weather file for the simulation.
     - idf_dir: The directory containing the IDF files.
+    - results_dir: The directory the result folders are created in.
+    - simulation_timestep: Number of timesteps per hour.
     
     Yields:
     - Tuple containing an IDF object and its associated run options.
@@ -70,38 +83,63 @@ def modified_idf_run_generator(epwfile, idf_dir):
     for idf_file in idf_file_generator(idf_dir):
         idf = IDF(idf_file, epwfile)
         # Modify the IDF properties
-        idf.idfobjects['TIMESTEP'][0].Number_of_Timesteps_per_Hour = 1
-        idf.idfobjects['OUTPUTCONTROL:TABLE:STYLE'][0].Unit_Conversion = 'JtoKWH'
+        modify_idf(idf, simulation_timestep)
         idf_name = os.path.basename(idf_file).split('.')[0]
         
-        yield (idf, make_eplaunch_options(idf, 'results/results_' + idf_name))
+        yield (idf, make_eplaunch_options(idf, os.path.join(results_dir, 'results_' + idf_name)))
 
 def lazy_run_IDF(num_CPUs=6, iddfile="Energy+_22_2_0.idd", 
                  epwfile='USA_CA_San.Francisco.Intl.AP.724940_TMY3.epw', 
-                 idf_dir='idf', results_dir='results', simulation_timestep=1):
+                 idf_dir='idf', results_dir='results', simulation_timestep=1, log_path=None, progress=True,
+                 pin_cores=False, manifest_path=None):
     """
     Set up and run the IDFs in parallel based on the provided parameters.
+    
+    num_CPUs can be a number, "all", or "auto" to run the largest IDFs first on a
+    pool sized to the available cores and memory (see run_scheduler.py).
+    
+    If log_path is given, the IDFs are run through run_telemetry.run_instrumented
+    instead of runIDFs: every run is timed and its resource use and error counts
+    are appended to log_path (.jsonl, or .db/.sqlite for SQLite). pin_cores pins
+    each simulation to its own core.
+    
+    If manifest_path is given, the batch is tracked in a resumable manifest (see
+    run_manifest.py): calling lazy_run_IDF again after an interruption skips the
+    finished runs and retries failed ones.
+    
+    Returns:
+    - List of run records if log_path is given, the number of jobs per status if
+      manifest_path is given, otherwise None.
     """
+    if log_path or manifest_path:
+        from run_telemetry import make_job, run_instrumented
+        jobs = [make_job(idf_file, epwfile, iddfile,
+                         os.path.join(results_dir, f'results_{os.path.basename(idf_file).split(".")[0]}'),
+                         modifier=modify_idf, modifier_kwargs={'simulation_timestep': simulation_timestep})
+                for idf_file in idf_file_generator(idf_dir)]
+        if manifest_path:
+            from run_manifest import run_manifest
+            return run_manifest(manifest_path, jobs, num_CPUs, log_path=log_path, progress=progress,
+                                pin_cores=pin_cores)
+        return run_instrumented(jobs, num_CPUs, log_path=log_path, progress=progress, pin_cores=pin_cores,
+                                simulation_timestep=simulation_timestep)
+
     # Set the IDD file
     IDF.setiddname(iddfile)
     
-    # Generator for modified IDFs and their run options
-    runs = list(modified_idf_run_generator(epwfile, idf_dir))  # Convert generator to list
-    
-    for i in range(len(runs)):
-        idf, options = runs[i]
-        
-        # Modify the IDF properties for timestep
-        idf.idfobjects['TIMESTEP'][0].Number_of_Timesteps_per_Hour = simulation_timestep
-        
-        # Modify the output directory based on provided results_dir
-        options['output_directory'] = os.path.join(results_dir, f'results_{os.path.basename(idf.idfname).split(".")[0]}')
-        
-        runs[i] = (idf, options)  # Update the list item
+    # Modified IDFs and their run options
+    runs = list(modified_idf_run_generator(epwfile, idf_dir, results_dir, simulation_timestep))
     
     # if num_CPUs is "all", use all available CPUs
     if num_CPUs == "all":
         num_CPUs = os.cpu_count()
+    # if num_CPUs is "auto", run the largest IDFs first and size the pool to cores and memory
+    elif num_CPUs == "auto":
+        from run_scheduler import estimate_job_cost, plan_pool_size
+        estimates = [estimate_job_cost(idf.idfname, simulation_timestep) for idf, options in runs]
+        order = sorted(range(len(runs)), key=lambda i: estimates[i]['cost'], reverse=True)
+        runs = [runs[i] for i in order]
+        num_CPUs = plan_pool_size([e['memory_mb'] for e in estimates])
 
     # Run the simulations in parallel using the provided number of CPUs
     runIDFs(runs, num_CPUs)
@@ -143,6 +181,30 @@ def extract_heating_value(htm_file, num_lines=200):
 
     return None, None
 
+def extract_cooling_value(htm_file, num_lines=200):
+    """
+    Extracts the district cooling demand from the given HTML file.
+    
+    Parameters:
+    - htm_file: Path to the HTML file.
+    - num_lines: Number of lines to read from the file for performance reasons. Default is 200.
+    
+    Returns:
+    - The district cooling demand (Cooling row, District Cooling column of the end uses table), or None.
+    """
+    with open(htm_file, "r", encoding="utf-8") as file:
+        content = ''.join([file.readline() for _ in range(num_lines)])
+
+    soup = BeautifulSoup(content, "lxml")
+    tables = soup.find_all("table")
+
+    if len(tables) >= 4:
+        rows = tables[3].find_all("tr")
+        if len(rows) >= 3:
+            return rows[2].find_all("td")[11].get_text().strip()
+
+    return None
+
 def get_htm_files(results_dir):
     """
     Recursively find all .htm files within a directory.
@@ -157,7 +219,7 @@ def get_htm_files(results_dir):
 
 def get_values(htm_files, verbose=False):
     """
-    Extract district heating demand, total building area, and normalized heating demand from given htm files.
+    Extract district heating and cooling demand, total building area, and normalized heating demand from given htm files.
     
     Parameters:
     - htm_files: List of paths to .htm files.
@@ -168,13 +230,14 @@ def get_values(htm_files, verbose=False):
     """
     result_values = {}
     for htm_file in htm_files:
-        path_parts = htm_file.split(os.path.sep)
-        idf_name = path_parts[1].split("_")[1] if path_parts else ""
+        # results_<idf name>/<prefix>Table.htm, IDF names may contain underscores
+        idf_name = os.path.basename(os.path.dirname(htm_file)).split("_", 1)[-1]
         if verbose:
             print(f"Processing {idf_name}")
         heating_value, building_area = extract_heating_value(htm_file)
         result_values[idf_name] = {
             'district_heating_demand_kwh': heating_value,
+            'district_cooling_demand_kwh': extract_cooling_value(htm_file),
             'total_building_area_m2': building_area,
             'normalised_district_heating_demand_kwh_m2': float(heating_value) / float(building_area)
         }
@@ -0,0 +1,223 @@
+# Author: Computational Sustainable Design group, Chalmers
+# EPW weather files parsed once into a memory-mapped NPY cache keyed by the
+# file hash, with derived quantities (degree-days, monthly statistics).
+
+# -------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------
+
+import os                                           # For file and directory operations
+import json                                         # For the cached header
+import hashlib                                      # For the cache key
+import numpy as np                                  # For the columnar data
+import pandas as pd                                 # For the hourly DataFrame
+
+# EnergyPlus weather file columns (Auxiliary Programs, Weather Converter)
+EPW_COLUMNS = [
+    'year', 'month', 'day', 'hour', 'minute', 'data_source_and_uncertainty_flags',
+    'dry_bulb_temperature', 'dew_point_temperature', 'relative_humidity', 'atmospheric_station_pressure',
+    'extraterrestrial_horizontal_radiation', 'extraterrestrial_direct_normal_radiation',
+    'horizontal_infrared_radiation_intensity', 'global_horizontal_radiation', 'direct_normal_radiation',
+    'diffuse_horizontal_radiation', 'global_horizontal_illuminance', 'direct_normal_illuminance',
+    'diffuse_horizontal_illuminance', 'zenith_luminance', 'wind_direction', 'wind_speed',
+    'total_sky_cover', 'opaque_sky_cover', 'visibility', 'ceiling_height', 'present_weather_observation',
+    'present_weather_codes', 'precipitable_water', 'aerosol_optical_depth', 'snow_depth',
+    'days_since_last_snowfall', 'albedo', 'liquid_precipitation_depth', 'liquid_precipitation_quantity',
+]
+TEXT_COLUMNS = ('data_source_and_uncertainty_flags', 'present_weather_codes')
+NUMERIC_COLUMNS = [name for name in EPW_COLUMNS if name not in TEXT_COLUMNS]
+HEADER_LINES = 8
+CACHE_VERSION = 2                                   # 2: fields x hours, one contiguous row per field
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'epw')
+
+# -------------------------------------------------------------------------------
+# Parsing and caching
+# -------------------------------------------------------------------------------
+
+def file_hash(path, block_size=1 << 20):
+    """SHA-1 of a file's content, read in blocks."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parse_location(line):
+    """The LOCATION header line as a dictionary."""
+    parts = line.strip().split(',')
+    return {
+        'city': parts[1], 'state': parts[2], 'country': parts[3], 'source': parts[4], 'wmo': parts[5],
+        'latitude': float(parts[6]), 'longitude': float(parts[7]),
+        'time_zone': float(parts[8]), 'elevation': float(parts[9]),
+    }
+
+
+def parse_epw(path):
+    """
+    Parse an EPW file.
+
+    Parameters:
+    - path: Path to the EPW file.
+
+    Returns:
+    - Tuple with the header dictionary and a float32 array (hours, len(NUMERIC_COLUMNS)).
+    """
+    with open(path, 'r', encoding='latin-1') as file:
+        header_lines = [file.readline() for _ in range(HEADER_LINES)]
+    usecols = [EPW_COLUMNS.index(name) for name in NUMERIC_COLUMNS]
+    data = np.loadtxt(path, delimiter=',', skiprows=HEADER_LINES, usecols=usecols,
+                      dtype=np.float32, encoding='latin-1', ndmin=2)
+    header = {
+        'version': CACHE_VERSION,
+        'source': os.path.abspath(path),
+        'location': parse_location(header_lines[0]),
+        'columns': NUMERIC_COLUMNS,
+        'hours': int(data.shape[0]),
+    }
+    return header, data
+
+
+def _cache_paths(cache_dir, key):
+    # The version is part of the name, so caches in an older layout are rebuilt
+    name = f'{key}.v{CACHE_VERSION}'
+    return os.path.join(cache_dir, f'{name}.npy'), os.path.join(cache_dir, f'{name}.json')
+
+
+def build_cache(path, cache_dir=DEFAULT_CACHE_DIR, key=None):
+    """
+    Parse an EPW file and write its cache files (<hash>.v<version>.npy and .json).
+
+    The array is stored as fields x hours, so every field is one contiguous
+    block of the memory-mapped file. Files are written under temporary names
+    and moved into place, so workers starting at the same time never read a
+    half written cache.
+
+    Returns:
+    - Paths of the data and header files.
+    """
+    key = key or file_hash(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    npy_path, json_path = _cache_paths(cache_dir, key)
+    header, data = parse_epw(path)
+    header['hash'] = key
+    tmp_suffix = f'.{os.getpid()}.tmp'
+    with open(npy_path + tmp_suffix, 'wb') as file:
+        np.save(file, np.ascontiguousarray(data.T))
+    with open(json_path + tmp_suffix, 'w') as file:
+        json.dump(header, file, indent=1)
+    os.replace(npy_path + tmp_suffix, npy_path)
+    os.replace(json_path + tmp_suffix, json_path)
+    return npy_path, json_path
+
+
+def load_epw(path, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Load an EPW file through the cache.
+
+    The first call parses the file and caches it; later calls, from any process,
+    memory-map the cached array read-only, so parallel workers share one copy of
+    the data in the operating system's page cache.
+
+    Parameters:
+    - path: Path to the EPW file.
+    - cache_dir: Folder of the cache files.
+
+    Returns:
+    - EPW object.
+    """
+    key = file_hash(path)
+    npy_path, json_path = _cache_paths(cache_dir, key)
+    if not (os.path.exists(npy_path) and os.path.exists(json_path)):
+        build_cache(path, cache_dir, key)
+    with open(json_path, 'r') as file:
+        header = json.load(file)
+    if header.get('version') != CACHE_VERSION:
+        build_cache(path, cache_dir, key)
+        with open(json_path, 'r') as file:
+            header = json.load(file)
+    return EPW(header, np.load(npy_path, mmap_mode='r'))
+
+# -------------------------------------------------------------------------------
+# Weather data and derived quantities
+# -------------------------------------------------------------------------------
+
+class EPW:
+    """
+    Hourly weather data of one EPW file.
+
+    Columns are available as read-only arrays, e.g. epw['dry_bulb_temperature'].
+    data holds one row per column (fields x hours), as cached by build_cache.
+    """
+
+    def __init__(self, header, data):
+        self.header = header
+        self.location = header['location']
+        self.data = data
+        self._index = {name: i for i, name in enumerate(header['columns'])}
+
+    def __getitem__(self, name):
+        return self.data[self._index[name]]
+
+    def __len__(self):
+        return self.data.shape[1]
+
+    @property
+    def columns(self):
+        return list(self._index)
+
+    def to_dataframe(self, year=None):
+        """
+        Hourly DataFrame with a DatetimeIndex at the start of every hour.
+
+        Parameters:
+        - year: Year for the index (default: the year column; TMY files mix
+          years, so pass a year for a continuous index, e.g. for radial_plot).
+        """
+        frame = pd.DataFrame(np.asarray(self.data).T, columns=self.columns)
+        years = np.full(len(self), year) if year is not None else frame['year'].astype(int)
+        frame.index = pd.to_datetime({
+            'year': years, 'month': frame['month'].astype(int), 'day': frame['day'].astype(int),
+        }) + pd.to_timedelta(frame['hour'].astype(int) - 1, unit='h')
+        return frame
+
+    def daily(self, name, how='mean'):
+        """Daily mean, min, max or sum of a column (files must hold whole days)."""
+        values = np.asarray(self[name], dtype=np.float64).reshape(-1, 24)
+        return getattr(values, how)(axis=1)
+
+    def heating_degree_days(self, base=17.0):
+        """Heating degree-days [K day] from daily mean dry-bulb temperatures."""
+        return float(np.clip(base - self.daily('dry_bulb_temperature'), 0, None).sum())
+
+    def cooling_degree_days(self, base=18.0):
+        """Cooling degree-days [K day] from daily mean dry-bulb temperatures."""
+        return float(np.clip(self.daily('dry_bulb_temperature') - base, 0, None).sum())
+
+    def monthly_statistics(self):
+        """
+        Monthly temperature and radiation statistics.
+
+        Returns:
+        - DataFrame indexed by month with mean, min and max dry-bulb temperature [C],
+          global horizontal, direct normal and diffuse horizontal radiation [kWh/m2],
+          mean wind speed [m/s] and heating degree-days (base 17 C) [K day].
+        """
+        month = np.asarray(self['month']).astype(int)
+        temperature = np.asarray(self['dry_bulb_temperature'], dtype=np.float64)
+        daily_month = month.reshape(-1, 24)[:, 0]
+        hdd = np.clip(17.0 - self.daily('dry_bulb_temperature'), 0, None)
+        rows = {}
+        for m in np.unique(month):
+            hours = month == m
+            rows[m] = {
+                'temperature_mean': temperature[hours].mean(),
+                'temperature_min': temperature[hours].min(),
+                'temperature_max': temperature[hours].max(),
+                'global_horizontal_kwh_m2': np.asarray(self['global_horizontal_radiation'])[hours].sum() / 1000,
+                'direct_normal_kwh_m2': np.asarray(self['direct_normal_radiation'])[hours].sum() / 1000,
+                'diffuse_horizontal_kwh_m2': np.asarray(self['diffuse_horizontal_radiation'])[hours].sum() / 1000,
+                'wind_speed_mean': np.asarray(self['wind_speed'])[hours].mean(),
+                'heating_degree_days': hdd[daily_month == m].sum(),
+            }
+        return pd.DataFrame.from_dict(rows, orient='index').rename_axis('month')
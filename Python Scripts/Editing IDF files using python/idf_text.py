@@ -0,0 +1,325 @@
+# Author: Computational Sustainable Design group, Chalmers
+# Text-level IDF patcher: finds objects by class and name with a lightweight
+# index and rewrites only the touched field values, leaving every other byte
+# of the file as it was. No IDD or eppy parse is needed for simple edits.
+
+# -------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------
+
+import os                                           # For file and directory operations
+import re                                           # For tokenizing the IDF text
+import fnmatch                                      # For object name patterns
+from functools import lru_cache                     # For caching IDD field names
+
+# Comments run from '!' to the end of the line; ',' ends a field and ';' an object
+TOKEN_PATTERN = re.compile(r'!.*|[,;]')
+OBJECT_END_PATTERN = re.compile(r'!.*|;')
+FIELD_COMMENT_PATTERN = re.compile(r'!-\s*(.*?)\s*(\{.*\})?\s*$')
+CLASS_PATTERN = re.compile(r'(?:\s|!.*)*([^,;!\s][^,;!]*?)\s*[,;]')
+# IDD field lines, e.g. '  N1 ; \field Number of Timesteps per Hour'
+IDD_FIELD_PATTERN = re.compile(r'(?:[AN]\d+\s*[,;]\s*)?\\field\s+(.*?)\s*$')
+ENCODING = 'latin-1'                                # Maps every byte to one character and back
+
+# Field order of the objects edited by this repository's scripts, used when no
+# IDD is given and the field is missing from the object (e.g. Unit Conversion
+# after a Column Separator that ends the object)
+KNOWN_FIELDS = {
+    'TIMESTEP': ['Number of Timesteps per Hour'],
+    'OUTPUTCONTROL:TABLE:STYLE': ['Column Separator', 'Unit Conversion'],
+    'OUTPUT:SQLITE': ['Option Type', 'Unit Conversion for Tabular Data'],
+    'SIMULATIONCONTROL': ['Do Zone Sizing Calculation', 'Do System Sizing Calculation',
+                          'Do Plant Sizing Calculation', 'Run Simulation for Sizing Periods',
+                          'Run Simulation for Weather File Run Periods',
+                          'Do HVAC Sizing Simulation for Sizing Periods',
+                          'Maximum Number of HVAC Sizing Simulation Passes'],
+}
+
+# -------------------------------------------------------------------------------
+# Field names
+# -------------------------------------------------------------------------------
+
+def normalise_field_name(name):
+    """'Number_of_Timesteps_per_Hour', 'Number of Timesteps per Hour' -> 'numberoftimestepsperhour'."""
+    return re.sub(r'[^0-9a-z]', '', name.lower())
+
+
+@lru_cache(maxsize=4)
+def idd_field_names(iddfile):
+    """
+    Field names of every class in an IDD file, without building eppy's IDD model.
+
+    Parameters:
+    - iddfile: Path to the Energy+.idd file.
+
+    Returns:
+    - Dictionary {class name in upper case: [normalised field names]}.
+    """
+    with open(iddfile, 'r', encoding=ENCODING) as file:
+        return parse_idd_field_names(file)
+
+
+def parse_idd_field_names(lines):
+    r"""
+    Field names of every class in the lines of an IDD file.
+
+    >>> parse_idd_field_names([
+    ...     'Timestep,',
+    ...     '      \\unique-object',
+    ...     '  N1 ; \\field Number of Timesteps per Hour',
+    ...     '      \\default 6',
+    ...     'OutputControl:Table:Style,',
+    ...     '  A1 , \\field Column Separator',
+    ...     '       \\type choice',
+    ...     '  A2 ; \\field Unit Conversion',
+    ... ])
+    {'TIMESTEP': ['numberoftimestepsperhour'], 'OUTPUTCONTROL:TABLE:STYLE': ['columnseparator', 'unitconversion']}
+    """
+    classes = {}
+    current = None
+    for line in lines:
+        stripped = line.strip()
+        if not stripped or stripped.startswith('!'):
+            continue
+        if not line[0].isspace() and not stripped.startswith('\\'):
+            current = classes.setdefault(stripped.split('!')[0].strip().rstrip(',;').upper(), [])
+        elif current is not None:
+            field = IDD_FIELD_PATTERN.match(stripped)
+            if field:
+                current.append(normalise_field_name(field.group(1)))
+    return classes
+
+# -------------------------------------------------------------------------------
+# Patcher
+# -------------------------------------------------------------------------------
+
+class IDFText:
+    """
+    An IDF file as text with an index of its objects.
+
+    The index only records where every object starts and ends and its class;
+    the fields of an object are tokenized when the object is first accessed.
+    Edits are kept as replacements of field value spans and applied by to_text,
+    so the output is identical to the input outside the edited values. Fields
+    added after the end of an object are kept per object and written once,
+    before its ';'.
+    """
+
+    def __init__(self, text, iddfile=None):
+        self.text = text
+        self.field_names = idd_field_names(iddfile) if iddfile else None
+        self.edits = {}
+        self.extensions = {}                        # object index -> {position: value}
+        self._fields = {}
+        self._build_index()
+
+    @classmethod
+    def read(cls, path, iddfile=None):
+        """Read an IDF file; newlines and encoding are kept as they are."""
+        with open(path, 'r', encoding=ENCODING, newline='') as file:
+            return cls(file.read(), iddfile)
+
+    def _build_index(self):
+        """Record (class, start, end) of every object, end being just after its ';'."""
+        self.objects = []
+        self.by_class = {}
+        start = 0
+        for match in OBJECT_END_PATTERN.finditer(self.text):
+            if match.group() != ';':
+                continue
+            end = match.end()
+            head = CLASS_PATTERN.match(self.text, start)
+            if head is not None:
+                key = head.group(1).upper()
+                self.by_class.setdefault(key, []).append(len(self.objects))
+                self.objects.append((key, start, end))
+            start = end
+
+    def fields(self, index):
+        """
+        Fields of one object as (value start, value end, comment) tuples; the
+        first field is the class name.
+        """
+        if index in self._fields:
+            return self._fields[index]
+        _, start, end = self.objects[index]
+        fields = []
+        piece_start = start
+        value = None
+        for match in TOKEN_PATTERN.finditer(self.text, start, end):
+            token = match.group()
+            if token.startswith('!'):
+                comment = FIELD_COMMENT_PATTERN.match(token)
+                if comment and fields and fields[-1][2] is None:
+                    fields[-1] = (fields[-1][0], fields[-1][1], comment.group(1))
+                value = value or self._strip(piece_start, match.start())
+                piece_start = match.end()
+                continue
+            value = value or self._strip(piece_start, match.start())
+            if value is None:
+                # Empty field: an empty span just before the delimiter
+                value = (match.start(), match.start())
+            fields.append((value[0], value[1], None))
+            value = None
+            piece_start = match.end()
+        # The comment of the last field follows the ';'
+        newline = self.text.find('\n', end)
+        tail = self.text[end:newline if newline != -1 else len(self.text)].strip()
+        comment = FIELD_COMMENT_PATTERN.match(tail)
+        if comment and fields[-1][2] is None:
+            fields[-1] = (fields[-1][0], fields[-1][1], comment.group(1))
+        self._fields[index] = fields
+        return fields
+
+    def _strip(self, start, end):
+        """Span of the non-blank text between start and end, None if blank."""
+        segment = self.text[start:end]
+        stripped = segment.strip()
+        if not stripped:
+            return None
+        offset = start + segment.index(stripped)
+        return (offset, offset + len(stripped))
+
+    def value(self, index, field):
+        """Current value (including pending edits) of a field, None if the object does not have it."""
+        position = self.field_position(index, field)
+        fields = self.fields(index)
+        if position >= len(fields):
+            return self.extensions.get(index, {}).get(position)
+        start, end, _ = fields[position]
+        return self.edits.get((start, end), self.text[start:end])
+
+    def find(self, class_name, name=None):
+        """
+        Indices of the objects of a class, optionally only those whose Name (first
+        field) matches a case-insensitive pattern with * and ? wildcards.
+        """
+        indices = self.by_class.get(class_name.upper(), [])
+        if name is None:
+            return list(indices)
+        pattern = name.upper()
+        matches = []
+        for index in indices:
+            fields = self.fields(index)
+            if len(fields) > 1 and fnmatch.fnmatchcase(self.text[fields[1][0]:fields[1][1]].upper(), pattern):
+                matches.append(index)
+        return matches
+
+    def field_position(self, index, field):
+        """
+        Position of a field in an object (1 is the first field after the class name).
+
+        A field is given as an integer position or a name. Names are looked up
+        in the IDD if one was given, otherwise in the '!- Field Name' comments of the object.
+        """
+        if isinstance(field, int):
+            return field
+        wanted = normalise_field_name(field)
+        class_name = self.objects[index][0]
+        if self.field_names is not None and class_name in self.field_names:
+            names = self.field_names[class_name]
+            if wanted in names:
+                return names.index(wanted) + 1
+        for position, (_, _, comment) in enumerate(self.fields(index)):
+            if comment is not None and normalise_field_name(comment) == wanted:
+                return position
+        known = [normalise_field_name(name) for name in KNOWN_FIELDS.get(class_name, [])]
+        if wanted in known:
+            return known.index(wanted) + 1
+        raise KeyError(f'Field {field!r} not found in {class_name}; pass the IDD file or the field position')
+
+    def set(self, index, field, value):
+        """Set a field of one object. Missing trailing fields are added as empty fields."""
+        position = self.field_position(index, field)
+        fields = self.fields(index)
+        if position < len(fields):
+            start, end, _ = fields[position]
+            self.edits[(start, end)] = format_value(value)
+            return
+        # Extend the object; the added fields are written before the ';' by to_text
+        self.extensions.setdefault(index, {})[position] = format_value(value)
+
+    def apply(self, patches):
+        """
+        Apply patches in the format of idf_variants.compile_spec (class, name,
+        field, op, value).
+
+        Returns:
+        - Number of objects changed.
+        """
+        changed = set()
+        for patch in patches:
+            indices = self.find(patch['class'], patch.get('name'))
+            if not indices:
+                raise ValueError(f'No {patch["class"]} object matches {patch.get("name")!r}')
+            for index in indices:
+                op = patch.get('op', 'set')
+                if op == 'set':
+                    value = patch['value']
+                elif op == 'scale':
+                    value = float(self.value(index, patch['field'])) * patch['value']
+                else:
+                    value = float(self.value(index, patch['field'])) + patch['value']
+                self.set(index, patch['field'], value)
+                changed.add(index)
+        return len(changed)
+
+    def reset(self):
+        """Drop all pending edits."""
+        self.edits = {}
+        self.extensions = {}
+
+    def to_text(self):
+        """The IDF text with the edits applied."""
+        edits = dict(self.edits)
+        for index, added in self.extensions.items():
+            # ',a,,b' for the fields from the end of the object to the highest one set
+            fields = self.fields(index)
+            terminator = self.text.index(';', fields[-1][1])
+            edits[(terminator, terminator)] = ''.join(
+                ',' + added.get(position, '') for position in range(len(fields), max(added) + 1))
+        parts = []
+        position = 0
+        for (start, end), replacement in sorted(edits.items()):
+            parts.append(self.text[position:start])
+            parts.append(replacement)
+            position = end
+        parts.append(self.text[position:])
+        return ''.join(parts)
+
+    def save(self, path):
+        """Write the edited IDF."""
+        with open(path, 'w', encoding=ENCODING, newline='') as file:
+            file.write(self.to_text())
+
+
+def format_value(value):
+    """IDF text of a field value."""
+    if isinstance(value, bool):
+        return 'Yes' if value else 'No'
+    if isinstance(value, float):
+        return repr(int(value)) if value.is_integer() else repr(value)
+    return str(value)
+
+
+def patch_file(src_path, patches, dst_path=None, iddfile=None):
+    """
+    Apply patches to an IDF file without parsing it with eppy.
+
+    Parameters:
+    - src_path: The IDF file to patch.
+    - patches: List of dictionaries with class, optional name pattern, field,
+      optional op ('set', 'scale' or 'offset') and value.
+    - dst_path: Output path (default: overwrite src_path).
+    - iddfile: Optional IDD file for field names not written as '!-' comments.
+
+    Returns:
+    - Number of objects changed.
+    """
+    idf = IDFText.read(src_path, iddfile)
+    changed = idf.apply(patches)
+    dst_path = dst_path or src_path
+    tmp_path = dst_path + '.tmp'
+    idf.save(tmp_path)
+    os.replace(tmp_path, dst_path)
+    return changed
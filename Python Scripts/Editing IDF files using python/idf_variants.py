@@ -0,0 +1,311 @@
+# Author: Computational Sustainable Design group, Chalmers
+# Declarative parametric variants: a JSON/YAML spec with a parameter grid or a
+# list of samples is compiled to field patches that are applied to one parsed
+# base IDF and written out as variant IDFs.
+
+# -------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------
+
+import os                                           # For file and directory operations
+import csv                                          # For the variant index
+import json                                         # For JSON specs and variant keys
+import fnmatch                                      # For object name patterns
+import hashlib                                      # For deduplicating variants
+import logging                                      # For progress messages
+import itertools                                    # For the parameter grid
+from concurrent.futures import ProcessPoolExecutor  # For writing variants in parallel
+from eppy.modeleditor import IDF                    # For working with IDF files
+from idf_text import IDFText                        # For patching without an eppy parse
+
+try:
+    import yaml                                     # For YAML specs
+except ImportError:
+    yaml = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('IDF variants')
+
+OPERATIONS = ('set', 'scale', 'offset')
+
+# -------------------------------------------------------------------------------
+# Spec compilation
+# -------------------------------------------------------------------------------
+#
+# Example spec (JSON or YAML):
+#
+#   base: idf/a57460b41497.idf
+#   output_dir: variants
+#   fixed:                      # patches applied to every variant
+#     - {class: OUTPUTCONTROL:TABLE:STYLE, field: Unit_Conversion, value: JtoKWH}
+#   parameters:                 # every parameter sets one or more fields
+#     timestep:
+#       values: [1, 4, 6]
+#       patches: [{class: TIMESTEP, field: Number_of_Timesteps_per_Hour}]
+#     insulation:
+#       values: [1.0, 1.5, 2.0]
+#       patches: [{class: MATERIAL, name: '*Insulation*', field: Thickness, op: scale}]
+#   samples:                    # optional, instead of the full grid
+#     - {timestep: 4, insulation: 1.5}
+
+def load_spec(path):
+    """
+    Read a variant spec from a .json, .yaml or .yml file.
+
+    Parameters:
+    - path: Path to the spec.
+
+    Returns:
+    - Spec dictionary.
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        if path.lower().endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise ImportError('\nFailed to import yaml, install PyYAML or use a JSON spec')
+            return yaml.safe_load(file)
+        return json.load(file)
+
+
+def _normalise_value(value):
+    """Canonical form of a field value, so 4, 4.0 and '4' give the same variant."""
+    if isinstance(value, bool):
+        return 'Yes' if value else 'No'
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return str(value)
+    return int(number) if number.is_integer() else number
+
+
+def _make_patch(template, value):
+    patch = {
+        'class': template['class'].upper(),
+        'name': template.get('name'),
+        'field': template['field'].replace(' ', '_'),
+        'op': template.get('op', 'set'),
+        'value': _normalise_value(template.get('value', value)),
+    }
+    if patch['op'] not in OPERATIONS:
+        raise ValueError(f'Unknown patch operation {patch["op"]!r}, use one of {OPERATIONS}')
+    return patch
+
+
+def compile_spec(spec):
+    """
+    Compile a spec to a list of unique variants.
+
+    Variants are deduplicated on their normalised patches, so samples or grid
+    points that produce the same model are written only once.
+
+    Parameters:
+    - spec: Spec dictionary, see the example above.
+
+    Returns:
+    - List of dictionaries with the variant key, its parameter values and patches.
+    """
+    parameters = spec.get('parameters', {})
+    fixed = [_make_patch(patch, patch.get('value')) for patch in spec.get('fixed', [])]
+    if 'samples' in spec:
+        points = spec['samples']
+    else:
+        names = list(parameters)
+        points = [dict(zip(names, values)) for values in
+                  itertools.product(*[parameters[name]['values'] for name in names])]
+
+    variants, seen = [], set()
+    for point in points:
+        patches = list(fixed)
+        for name, value in point.items():
+            if name not in parameters:
+                raise KeyError(f'Sample sets {name!r}, which is not a parameter in the spec')
+            patches.extend(_make_patch(template, value) for template in parameters[name]['patches'])
+        key = hashlib.sha1(json.dumps(patches, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+        if key in seen:
+            continue
+        seen.add(key)
+        variants.append({'key': key, 'parameters': point, 'patches': patches})
+    if len(variants) < len(points):
+        logger.info(f'{len(points) - len(variants)} duplicate variants removed')
+    return variants
+
+# -------------------------------------------------------------------------------
+# Applying patches
+# -------------------------------------------------------------------------------
+
+def select_objects(idf, patch):
+    """
+    Objects of the patch class whose Name matches the patch name pattern (all
+    objects of the class if the patch has no name).
+    """
+    objects = idf.idfobjects[patch['class']]
+    if patch['name'] is None:
+        return list(objects)
+    pattern = patch['name'].upper()
+    return [obj for obj in objects if 'Name' in obj.fieldnames and fnmatch.fnmatchcase(obj.Name.upper(), pattern)]
+
+
+def apply_patches(idf, patches):
+    """
+    Apply patches to a parsed IDF in place.
+
+    Parameters:
+    - idf: The IDF object to modify.
+    - patches: List of patches from compile_spec.
+
+    Returns:
+    - Dictionary {object id: (object, {field: original value})} to undo the patches with restore.
+    """
+    touched = {}
+    for patch in patches:
+        objects = select_objects(idf, patch)
+        if not objects:
+            raise ValueError(f'No {patch["class"]} object matches {patch["name"]!r}')
+        for obj in objects:
+            original = touched.setdefault(id(obj), (obj, {}))[1]
+            original.setdefault(patch['field'], obj[patch['field']])
+            if patch['op'] == 'set':
+                obj[patch['field']] = patch['value']
+            elif patch['op'] == 'scale':
+                obj[patch['field']] = float(obj[patch['field']]) * patch['value']
+            else:
+                obj[patch['field']] = float(obj[patch['field']]) + patch['value']
+    return touched
+
+
+def restore(touched):
+    """Undo apply_patches."""
+    for obj, original in touched.values():
+        for field, value in original.items():
+            obj[field] = value
+
+
+class VariantWriter:
+    """
+    Writes variants of one parsed base IDF.
+
+    The text of every object is rendered once; a variant only re-renders the
+    objects its patches touch and joins the cached text of the others, which
+    gives the same output as IDF.idfstr() at a fraction of its cost.
+    """
+
+    def __init__(self, base_path, iddfile=None):
+        if iddfile and IDF.getiddname() is None:
+            IDF.setiddname(iddfile)
+        self.idf = IDF(base_path)
+        self.objects = [obj for key in self.idf.model.dtls for obj in self.idf.idfobjects[key]]
+        self.text = [repr(obj) for obj in self.objects]
+        self.position = {id(obj): i for i, obj in enumerate(self.objects)}
+
+    def render(self, patches):
+        """IDF text of the base model with the patches applied."""
+        touched = apply_patches(self.idf, patches)
+        try:
+            text = list(self.text)
+            for obj, _ in touched.values():
+                text[self.position[id(obj)]] = repr(obj)
+        finally:
+            restore(touched)
+        return ''.join(text)
+
+    def write(self, variant, path):
+        """Write one variant to path."""
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            file.write(self.render(variant['patches']))
+        return path
+
+
+class TextVariantWriter(VariantWriter):
+    """
+    Writes variants by patching the base IDF text (see idf_text.py) instead of
+    parsing it with eppy. Variants keep the formatting and comments of the base
+    file, and no IDD is needed for fields that are named in '!-' comments.
+    """
+
+    def __init__(self, base_path, iddfile=None):
+        self.idf = IDFText.read(base_path, iddfile)
+
+    def render(self, patches):
+        """IDF text of the base model with the patches applied."""
+        try:
+            self.idf.apply(patches)
+            return self.idf.to_text()
+        finally:
+            self.idf.reset()
+
+    def write(self, variant, path):
+        """Write one variant to path."""
+        with open(path, 'w', encoding='latin-1', newline='') as file:
+            file.write(self.render(variant['patches']))
+        return path
+
+
+WRITERS = {'eppy': VariantWriter, 'text': TextVariantWriter}
+
+# -------------------------------------------------------------------------------
+# Parallel generation
+# -------------------------------------------------------------------------------
+
+_writer = None
+
+
+def _init_worker(base_path, iddfile, backend='eppy'):
+    """Parse the base model once per worker process."""
+    global _writer
+    _writer = WRITERS[backend](base_path, iddfile)
+
+
+def _write_chunk(chunk):
+    return [_writer.write(variant, path) for variant, path in chunk]
+
+
+def variant_path(output_dir, base_path, variant):
+    """Output path of a variant: <output_dir>/<base name>_<variant key>.idf."""
+    stem = os.path.splitext(os.path.basename(base_path))[0]
+    return os.path.join(output_dir, f'{stem}_{variant["key"]}.idf')
+
+
+def generate_variants(spec, iddfile=None, workers=None, chunk_size=64, overwrite=False, backend='eppy'):
+    """
+    Write every variant of a spec as an IDF and an index of the variants.
+
+    Variants are named after the hash of their patches, so rerunning a spec, or
+    a spec that overlaps an earlier one, skips variants that already exist.
+
+    Parameters:
+    - spec: Spec dictionary or path to a JSON/YAML spec.
+    - iddfile: The IDD file (if not set already).
+    - workers: Number of processes (default: one per CPU, 1 to run in this process).
+    - chunk_size: Variants written per task.
+    - overwrite: Rewrite variant files that already exist.
+    - backend: 'eppy' to write variants from the parsed model, 'text' to patch
+      the base file text (faster, keeps its formatting, see idf_text.py).
+
+    Returns:
+    - List of dictionaries with the path, key and parameter values of every variant.
+    """
+    if isinstance(spec, str):
+        spec = load_spec(spec)
+    base_path = spec['base']
+    output_dir = spec.get('output_dir', 'variants')
+    os.makedirs(output_dir, exist_ok=True)
+
+    variants = compile_spec(spec)
+    index = [{'path': variant_path(output_dir, base_path, v), 'key': v['key'], **v['parameters']} for v in variants]
+    todo = [(v, row['path']) for v, row in zip(variants, index) if overwrite or not os.path.exists(row['path'])]
+    logger.info(f'{len(variants)} variants of {base_path}, {len(todo)} to write')
+
+    chunks = [todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size)]
+    if chunks and (workers == 1 or len(chunks) == 1):
+        _init_worker(base_path, iddfile, backend)
+        for chunk in chunks:
+            _write_chunk(chunk)
+    elif chunks:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(base_path, iddfile, backend)) as pool:
+            list(pool.map(_write_chunk, chunks))
+
+    fieldnames = ['path', 'key'] + list(spec.get('parameters', {}))
+    with open(os.path.join(output_dir, 'variants.csv'), 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=fieldnames, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(index)
+    return index
@@ -0,0 +1,260 @@
+# Author: Computational Sustainable Design group, Chalmers
+# Results warehouse for simulation sweeps: append-only, partitioned Parquet
+# tables of run metadata, variant parameters, annual results and hourly series
+# that can be read back with only the needed columns and rows.
+
+# -------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------
+
+import os                                           # For file and directory operations
+import glob                                         # For finding the table parts
+import time                                         # For part file names
+import uuid                                         # For unique part file names
+import logging                                      # For progress messages
+import operator                                     # For row filters without pyarrow
+import numpy as np                                  # For the hourly series
+import pandas as pd                                 # For the tables
+
+try:
+    import pyarrow.parquet as pq                    # For Parquet files with pushdown on read
+except ImportError:
+    pq = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('Results warehouse')
+
+# Tables of the warehouse; every table is a folder of part files, optionally
+# partitioned in sub folders named <column>=<value> (e.g. sweep=insulation)
+RUNS, VARIANTS, ANNUAL, HOURLY = 'runs', 'variants', 'annual', 'hourly'
+FILTER_OPERATORS = {
+    '==': operator.eq, '=': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le,
+    '>': operator.gt, '>=': operator.ge,
+    'in': lambda column, values: column.isin(values), 'not in': lambda column, values: ~column.isin(values),
+}
+
+
+def default_format():
+    """'parquet' if pyarrow is installed, otherwise gzipped CSV parts."""
+    return 'parquet' if pq is not None else 'csv'
+
+# -------------------------------------------------------------------------------
+# Writing
+# -------------------------------------------------------------------------------
+
+def write_part(root, table, frame, partition=None, file_format=None):
+    """
+    Append rows to a table as a new part file.
+
+    Every call writes its own file (named after the time, process id and a
+    random suffix) under a temporary name and moves it into place, so parallel
+    workers can append to the same table without locks and readers never see
+    half written files.
+
+    Parameters:
+    - root: Folder of the warehouse.
+    - table: Table name, e.g. RUNS, ANNUAL or HOURLY.
+    - frame: DataFrame of the rows to append.
+    - partition: Optional dictionary {column: value}, e.g. {'sweep': 'insulation'}.
+    - file_format: 'parquet' or 'csv' (default: default_format()).
+
+    Returns:
+    - Path of the part file, None if frame is empty.
+    """
+    if frame is None or len(frame) == 0:
+        return None
+    file_format = file_format or default_format()
+    folder = os.path.join(root, table, *[f'{column}={value}' for column, value in (partition or {}).items()])
+    os.makedirs(folder, exist_ok=True)
+    name = f'part-{time.strftime("%Y%m%d%H%M%S")}-{os.getpid()}-{uuid.uuid4().hex[:8]}'
+    if file_format == 'parquet':
+        if pq is None:
+            raise ImportError('\nFailed to import pyarrow, install it or use file_format="csv"')
+        path = os.path.join(folder, name + '.parquet')
+        frame.to_parquet(path + '.tmp', index=False, engine='pyarrow', compression='zstd')
+    else:
+        path = os.path.join(folder, name + '.csv.gz')
+        frame.to_csv(path + '.tmp', index=False, compression='gzip')
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def runs_frame(records):
+    """Run log records (run_telemetry.read_run_log) as a DataFrame with an idf_name column."""
+    frame = pd.DataFrame.from_records(records)
+    if len(frame):
+        frame.insert(0, 'idf_name', frame['output_directory'].map(
+            lambda path: os.path.basename(os.path.normpath(path)).split('_', 1)[-1]))
+    return frame
+
+
+def variants_frame(variants_csv):
+    """Variant index of idf_variants.generate_variants as a DataFrame with an idf_name column."""
+    frame = pd.read_csv(variants_csv)
+    frame.insert(0, 'idf_name', frame['path'].map(lambda path: os.path.splitext(os.path.basename(path))[0]))
+    return frame
+
+
+def hourly_frame(idf_name, key_value, name, values):
+    """One hourly series as long rows (idf_name, key_value, name, timestep, value)."""
+    values = np.asarray(values, dtype=np.float32)
+    return pd.DataFrame({
+        'idf_name': idf_name, 'key_value': key_value, 'name': name,
+        'timestep': np.arange(len(values), dtype=np.int32), 'value': values,
+    })
+
+
+def ingest_store(root, store_path, partition=None, file_format=None):
+    """
+    Copy the annual metrics and hourly series of a run_compaction result store into the warehouse.
+
+    Returns:
+    - Number of runs written.
+    """
+    from run_compaction import ResultStore
+    store = ResultStore(store_path)
+    try:
+        metrics = store.metrics()
+        annual = pd.DataFrame.from_dict(metrics, orient='index').rename_axis('idf_name').reset_index()
+        write_part(root, ANNUAL, annual, partition, file_format)
+        rows = store.connection.execute('SELECT idf_name, key_value, name, data FROM series').fetchall()
+        series = [hourly_frame(idf_name, key_value, name, np.frombuffer(data, dtype=np.float32))
+                  for idf_name, key_value, name, data in rows]
+        if series:
+            write_part(root, HOURLY, pd.concat(series, ignore_index=True), partition, file_format)
+    finally:
+        store.close()
+    return len(metrics)
+
+
+def ingest_sweep(root, sweep, run_log=None, variants_csv=None, results_csv=None, store_path=None, file_format=None):
+    """
+    Write the outputs of one sweep to the warehouse, partitioned by sweep name.
+
+    Parameters:
+    - root: Folder of the warehouse.
+    - sweep: Name of the sweep, used as the partition value.
+    - run_log: Optional run log (runs.jsonl or .db) of run_telemetry.
+    - variants_csv: Optional variant index of idf_variants.
+    - results_csv: Optional results of eppy_parallel_helper.parse_results.
+    - store_path: Optional result store of run_compaction (annual metrics and hourly series).
+    - file_format: 'parquet' or 'csv' (default: default_format()).
+    """
+    from run_telemetry import read_run_log
+    partition = {'sweep': sweep}
+    if run_log:
+        write_part(root, RUNS, runs_frame(read_run_log(run_log)), partition, file_format)
+    if variants_csv:
+        write_part(root, VARIANTS, variants_frame(variants_csv), partition, file_format)
+    if results_csv:
+        write_part(root, ANNUAL, pd.read_csv(results_csv, dtype={'idf_name': str}), partition, file_format)
+    if store_path:
+        ingest_store(root, store_path, partition, file_format)
+    logger.info(f'Sweep {sweep} written to {root}')
+
+# -------------------------------------------------------------------------------
+# Reading
+# -------------------------------------------------------------------------------
+
+def _partition_values(path, table_dir):
+    """Partition columns of a part file from its <column>=<value> folders."""
+    relative = os.path.relpath(os.path.dirname(path), table_dir)
+    return dict(part.split('=', 1) for part in relative.split(os.sep) if '=' in part)
+
+
+def _apply_filters(frame, filters):
+    mask = pd.Series(True, index=frame.index)
+    for column, op, value in filters:
+        mask &= FILTER_OPERATORS[op](frame[column], value)
+    return frame[mask]
+
+
+def read_table(root, table, columns=None, filters=None, chunksize=1_000_000):
+    """
+    Read a table, or the columns and rows of it that are needed.
+
+    With Parquet parts the column selection and filters are pushed down to
+    pyarrow, which skips partitions, row groups and columns that are not needed.
+    CSV parts are read in chunks with only the selected columns and filtered
+    chunk by chunk, so memory stays bounded by the result size.
+
+    Parameters:
+    - root: Folder of the warehouse.
+    - table: Table name.
+    - columns: Optional list of columns to read.
+    - filters: Optional list of (column, operator, value) conditions that must
+      all hold, e.g. [('sweep', '==', 'insulation'), ('name', 'in', [...])].
+      Operators: ==, !=, <, <=, >, >=, in, not in.
+    - chunksize: Rows per chunk for CSV parts.
+
+    Returns:
+    - DataFrame.
+    """
+    table_dir = os.path.join(root, table)
+    filters = filters or []
+    parquet_parts = glob.glob(os.path.join(table_dir, '**', '*.parquet'), recursive=True)
+    csv_parts = glob.glob(os.path.join(table_dir, '**', '*.csv.gz'), recursive=True)
+    frames = []
+    if parquet_parts:
+        if pq is None:
+            raise ImportError('\nFailed to import pyarrow, needed to read the Parquet parts of the warehouse')
+        frames.append(pq.read_table(table_dir, columns=columns, filters=filters or None).to_pandas())
+    for path in sorted(csv_parts):
+        partition = _partition_values(path, table_dir)
+        # Skip whole parts whose partition values fail a filter
+        if any(column in partition and not FILTER_OPERATORS[op](pd.Series([partition[column]]), value).all()
+               for column, op, value in filters):
+            continue
+        filter_columns = [column for column, _, _ in filters if column not in partition]
+        usecols = None if columns is None else \
+            lambda name: name in columns or name in filter_columns
+        for chunk in pd.read_csv(path, usecols=usecols, chunksize=chunksize, dtype={'idf_name': str},
+                                 low_memory=False):
+            for column, value in partition.items():
+                chunk[column] = value
+            chunk = _apply_filters(chunk, filters)
+            frames.append(chunk if columns is None else chunk[[c for c in columns if c in chunk.columns]])
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+
+def read_hourly(root, name, idf_names=None, key_value=None, filters=None):
+    """
+    Hourly series of one variable or meter as a (runs x timesteps) float32 array.
+
+    Returns:
+    - Tuple with the list of idf names (rows) and the array.
+    """
+    filters = list(filters or []) + [('name', '==', name)]
+    if idf_names is not None:
+        filters.append(('idf_name', 'in', list(idf_names)))
+    if key_value is not None:
+        filters.append(('key_value', '==', key_value))
+    frame = read_table(root, HOURLY, columns=['idf_name', 'timestep', 'value'], filters=filters)
+    wide = frame.pivot_table(index='idf_name', columns='timestep', values='value', aggfunc='first')
+    return list(wide.index), wide.to_numpy(dtype=np.float32)
+
+
+def compact_table(root, table, file_format=None):
+    """
+    Merge the part files of every partition of a table into one file.
+
+    Appends from many workers leave many small files; merging them makes reads
+    faster. Run this when no sweep is writing to the table.
+    """
+    table_dir = os.path.join(root, table)
+    folders = {os.path.dirname(path) for path in glob.glob(os.path.join(table_dir, '**', 'part-*'), recursive=True)
+               if not path.endswith('.tmp')}
+    for folder in sorted(folders):
+        parts = [path for path in glob.glob(os.path.join(folder, 'part-*')) if not path.endswith('.tmp')]
+        if len(parts) < 2:
+            continue
+        frames = [pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path, dtype={'idf_name': str})
+                  for path in parts]
+        partition = _partition_values(parts[0], table_dir)
+        frame = pd.concat(frames, ignore_index=True).drop(columns=list(partition), errors='ignore')
+        write_part(root, table, frame, partition, file_format)
+        for path in parts:
+            os.remove(path)
+        logger.info(f'{len(parts)} parts merged in {folder}')
@@ -0,0 +1,279 @@
+# Author: Computational Sustainable Design group, Chalmers
+# Post-run compaction: extracts the metrics and time series of finished runs
+# into one SQLite store, then deletes or compresses the EnergyPlus outputs that
+# are no longer needed and hardlinks identical inputs such as the weather file.
+
+# -------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------
+
+import os                                           # For file and directory operations
+import glob                                         # For finding run outputs
+import gzip                                         # For compressing kept outputs
+import time                                         # For the compaction timestamp
+import shutil                                       # For streaming files into gzip
+import fnmatch                                      # For the retention patterns
+import logging                                      # For progress messages
+import sqlite3                                      # For the store and eplusout.sql
+import numpy as np                                  # For storing time series
+from eppy_parallel_helper import extract_cooling_value, extract_heating_value
+from run_telemetry import parse_err_file
+from epw_cache import file_hash                     # For finding identical inputs
+from sql_series import connect_readonly, read_series
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('EnergyPlus run compaction')
+
+# Retention policy: the first matching pattern decides what happens to a file.
+# 'keep' leaves it, 'compress' replaces it with a .gz, 'delete' removes it and
+# 'link' hardlinks identical copies to one shared file.
+DEFAULT_POLICY = [
+    ('*.end', 'keep'),                              # completion check of run_manifest
+    ('*.err', 'keep'),
+    ('*.htm', 'keep'),                              # parse_results
+    ('*.epw', 'link'),
+    ('*.idf', 'keep'),
+    ('*.sql', 'keep'),                              # sql_series reads eplusout.sql, it cannot open .sql.gz
+    ('*.eso', 'compress'),
+    ('*.gz', 'keep'),
+    ('*', 'delete'),                                # .shd, .eio, .audit, .bnd, .mtr, .csv, ...
+]
+# Time series copied from eplusout.sql into the store: (key value or '*', variable or meter name)
+DEFAULT_SERIES = [
+    ('*', 'DistrictHeating:Facility'),
+    ('*', 'DistrictHeatingWater:Facility'),
+    ('*', 'DistrictCooling:Facility'),
+]
+SHARED_DIR = '_shared'
+
+# -------------------------------------------------------------------------------
+# Extraction
+# -------------------------------------------------------------------------------
+
+def extract_metrics(output_directory):
+    """
+    Annual metrics of one run.
+
+    Returns:
+    - Dictionary of metric name to float (missing values are left out).
+    """
+    metrics = {}
+    htm_files = glob.glob(os.path.join(output_directory, '*.htm'))
+    if htm_files:
+        heating, area = extract_heating_value(htm_files[0])
+        if heating is not None and area is not None:
+            metrics['district_heating_demand_kwh'] = float(heating)
+            metrics['total_building_area_m2'] = float(area)
+            if float(area) > 0:
+                metrics['normalised_district_heating_demand_kwh_m2'] = float(heating) / float(area)
+        cooling = extract_cooling_value(htm_files[0])
+        if cooling is not None:
+            metrics['district_cooling_demand_kwh'] = float(cooling)
+    for name, value in parse_err_file(output_directory).items():
+        if value is not None:
+            metrics[name] = float(value)
+    return metrics
+
+
+def series_for_store(sql_path, series=DEFAULT_SERIES, frequency='Hourly'):
+    """
+    Time series of variables and meters of one run, as stored by ResultStore.
+
+    The values come from sql_series.read_series, so they cover the weather file
+    run period only (no sizing periods or warmup days), and a '*' key is summed
+    over all keys.
+
+    Parameters:
+    - sql_path: Path to the SQLite output.
+    - series: List of (key value or '*', name) pairs.
+    - frequency: Reporting frequency as stored in the file ('Hourly', 'Daily', ...).
+
+    Returns:
+    - List of (key value, name, units, float32 array) tuples, for the series found.
+    """
+    values = read_series(sql_path, series, frequency)
+    connection = connect_readonly(sql_path)
+    try:
+        units = dict(connection.execute(
+            'SELECT Name, Units FROM ReportDataDictionary WHERE ReportingFrequency = ?', (frequency,)).fetchall())
+    finally:
+        connection.close()
+    return [(key, name, units.get(name), row) for (key, name), row in zip(series, values)
+            if row.size and not np.isnan(row).all()]
+
+# -------------------------------------------------------------------------------
+# Store
+# -------------------------------------------------------------------------------
+
+class ResultStore:
+    """SQLite store of the metrics and time series of compacted runs."""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS runs (
+                idf_name TEXT PRIMARY KEY, output_directory TEXT, compacted REAL,
+                bytes_before INTEGER, bytes_after INTEGER);
+            CREATE TABLE IF NOT EXISTS metrics (
+                idf_name TEXT, metric TEXT, value REAL, PRIMARY KEY (idf_name, metric));
+            CREATE TABLE IF NOT EXISTS series (
+                idf_name TEXT, key_value TEXT, name TEXT, frequency TEXT, units TEXT, data BLOB,
+                PRIMARY KEY (idf_name, key_value, name, frequency));
+        ''')
+
+    def add_run(self, idf_name, output_directory, metrics, series, frequency, bytes_before, bytes_after):
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?)',
+                                    (idf_name, output_directory, time.time(), bytes_before, bytes_after))
+            self.connection.executemany('INSERT OR REPLACE INTO metrics VALUES (?, ?, ?)',
+                                        [(idf_name, name, value) for name, value in metrics.items()])
+            self.connection.executemany('INSERT OR REPLACE INTO series VALUES (?, ?, ?, ?, ?, ?)',
+                                        [(idf_name, key, name, frequency, units, values.tobytes())
+                                         for key, name, units, values in series])
+
+    def is_compacted(self, idf_name):
+        return self.connection.execute('SELECT 1 FROM runs WHERE idf_name = ?', (idf_name,)).fetchone() is not None
+
+    def metrics(self):
+        """All metrics as a dictionary {idf name: {metric: value}}."""
+        table = {}
+        for idf_name, metric, value in self.connection.execute('SELECT * FROM metrics'):
+            table.setdefault(idf_name, {})[metric] = value
+        return table
+
+    def series(self, idf_name, name, key_value=None, frequency='Hourly'):
+        """One stored time series as a float32 array, None if not stored."""
+        row = self.connection.execute(
+            'SELECT data FROM series WHERE idf_name = ? AND name = ? AND frequency = ? '
+            'AND (? IS NULL OR key_value = ?)', (idf_name, name, frequency, key_value, key_value)).fetchone()
+        return np.frombuffer(row[0], dtype=np.float32) if row else None
+
+    def close(self):
+        self.connection.close()
+
+# -------------------------------------------------------------------------------
+# Retention
+# -------------------------------------------------------------------------------
+
+def _action(filename, policy):
+    for pattern, action in policy:
+        if fnmatch.fnmatch(filename.lower(), pattern):
+            return action
+    return 'keep'
+
+
+def link_shared(path, shared_dir):
+    """
+    Replace a file by a hardlink to a shared copy with the same content.
+
+    The first copy seen becomes the shared file. Nothing changes if hardlinks are
+    not supported (e.g. across drives).
+    """
+    os.makedirs(shared_dir, exist_ok=True)
+    shared = os.path.join(shared_dir, file_hash(path) + os.path.splitext(path)[1].lower())
+    try:
+        if not os.path.exists(shared):
+            os.link(path, shared)
+            return
+        if os.path.samefile(path, shared):
+            return
+        tmp_path = path + '.link'
+        os.link(shared, tmp_path)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f'Could not hardlink {path}: {e}')
+
+
+def apply_retention(output_directory, policy=DEFAULT_POLICY, shared_dir=None):
+    """
+    Delete, compress or hardlink the files of one run directory.
+
+    Returns:
+    - Tuple with the directory size in bytes before and after.
+    """
+    shared_dir = shared_dir or os.path.join(os.path.dirname(os.path.abspath(output_directory)), SHARED_DIR)
+    before = after = 0
+    # List the directory first, the .gz files written below must not be counted
+    with os.scandir(output_directory) as entries:
+        entries = list(entries)
+    for entry in entries:
+        if not entry.is_file():
+            continue
+        size = entry.stat().st_size
+        before += size
+        action = _action(entry.name, policy)
+        if action == 'delete':
+            os.remove(entry.path)
+        elif action == 'compress':
+            with open(entry.path, 'rb') as src, gzip.open(entry.path + '.gz.tmp', 'wb', compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+            os.replace(entry.path + '.gz.tmp', entry.path + '.gz')
+            os.remove(entry.path)
+            after += os.path.getsize(entry.path + '.gz')
+        elif action == 'link':
+            link_shared(entry.path, shared_dir)
+            # Hardlinked copies do not take extra space
+        else:
+            after += size
+    return before, after
+
+# -------------------------------------------------------------------------------
+# Compaction
+# -------------------------------------------------------------------------------
+
+def run_name(output_directory):
+    """IDF name of a results_<name> directory, as used by parse_results."""
+    return os.path.basename(os.path.normpath(output_directory)).split('_', 1)[-1]
+
+
+def compact_run(output_directory, store, policy=DEFAULT_POLICY, series=DEFAULT_SERIES, frequency='Hourly'):
+    """
+    Extract the metrics and series of one finished run into the store, then apply the retention policy.
+
+    Parameters:
+    - output_directory: The run's output directory.
+    - store: ResultStore.
+    - policy: Retention policy, see DEFAULT_POLICY.
+    - series: Time series to copy from eplusout.sql, see DEFAULT_SERIES.
+    - frequency: Reporting frequency of the series.
+
+    Returns:
+    - Tuple with the directory size in bytes before and after.
+    """
+    metrics = extract_metrics(output_directory)
+    sql_files = glob.glob(os.path.join(output_directory, '*.sql'))
+    found = series_for_store(sql_files[0], series, frequency) if sql_files and series else []
+    before, after = apply_retention(output_directory, policy)
+    store.add_run(run_name(output_directory), output_directory, metrics, found, frequency, before, after)
+    return before, after
+
+
+def compact_results(results_dir='results', store_path='results/store.db', policy=DEFAULT_POLICY,
+                    series=DEFAULT_SERIES, frequency='Hourly'):
+    """
+    Compact every finished results_<name> directory that is not in the store yet.
+
+    Unfinished runs (no .end file reporting success) are left untouched.
+
+    Returns:
+    - Dictionary with the number of compacted runs and the bytes before and after.
+    """
+    from run_manifest import is_complete          # run_manifest imports this module
+    store = ResultStore(store_path)
+    total = {'runs': 0, 'bytes_before': 0, 'bytes_after': 0}
+    try:
+        for output_directory in sorted(glob.glob(os.path.join(results_dir, 'results_*'))):
+            if not os.path.isdir(output_directory) or store.is_compacted(run_name(output_directory)):
+                continue
+            if not is_complete(output_directory):
+                continue
+            before, after = compact_run(output_directory, store, policy, series, frequency)
+            total['runs'] += 1
+            total['bytes_before'] += before
+            total['bytes_after'] += after
+    finally:
+        store.close()
+    logger.info(f'Compacted {total["runs"]} runs: {total["bytes_before"] / 1e6:.1f} MB -> '
+                f'{total["bytes_after"] / 1e6:.1f} MB')
+    return total
@@ -0,0 +1,236 @@
+# Author: Computational Sustainable Design group, Chalmers
+# Resumable EnergyPlus batches: every job is tracked in an SQLite manifest as
+# pending, running, done or failed, so an interrupted sweep continues where it stopped.
+
+# -------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------
+
+import os                                           # For file and directory operations
+import json                                         # For storing modifier arguments
+import time                                         # For update timestamps
+import logging                                      # For progress messages
+import sqlite3                                      # For the manifest
+import importlib                                    # For restoring modifiers from the manifest
+from run_telemetry import make_job, output_files, output_prefix, parse_err_file, run_instrumented
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('EnergyPlus run manifest')
+
+PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+MAX_ATTEMPTS = 3
+
+# -------------------------------------------------------------------------------
+# Completion check
+# -------------------------------------------------------------------------------
+
+def is_complete(output_directory, prefix=None):
+    """
+    Check if a simulation in output_directory finished successfully.
+
+    EnergyPlus writes the .end file last, with 'EnergyPlus Completed Successfully'
+    for a finished run. Without a .end file the .err file is checked instead.
+
+    Parameters:
+    - output_directory: The simulation output directory.
+    - prefix: Output prefix of the run (see run_telemetry.output_prefix). Needed
+      when several runs share the directory, so only this run's files are checked.
+
+    Returns:
+    - True if the simulation completed successfully.
+    """
+    end_files = output_files(output_directory, '.end', prefix)
+    if end_files:
+        with open(end_files[0], 'r', errors='replace') as file:
+            return 'EnergyPlus Completed Successfully' in file.read()
+    counts = parse_err_file(output_directory, prefix)
+    return bool(counts['completed_successfully']) and not counts['fatal']
+
+
+def is_transient(record):
+    """
+    Whether a failed run is worth retrying.
+
+    Runs stopped by an EnergyPlus fatal error fail the same way every time. Other
+    failures (killed or crashed processes, out of memory, file system errors) are retried.
+    """
+    return not record.get('fatal')
+
+# -------------------------------------------------------------------------------
+# Manifest
+# -------------------------------------------------------------------------------
+
+def _function_name(function):
+    return f'{function.__module__}:{function.__qualname__}' if function else None
+
+
+def _key(job):
+    return job['output_directory'], job['idf']
+
+
+def _is_job_complete(job):
+    return is_complete(job['output_directory'], output_prefix(job['idf']))
+
+
+def _load_function(name):
+    if not name:
+        return None
+    module, qualname = name.split(':')
+    function = importlib.import_module(module)
+    for attribute in qualname.split('.'):
+        function = getattr(function, attribute)
+    return function
+
+
+class Manifest:
+    """
+    SQLite table of jobs keyed by output directory and IDF, so runs that write
+    to the same directory (e.g. next to their IDFs) are separate jobs. Every
+    status change is committed immediately, so the manifest stays valid if the
+    process is killed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        columns = [row['name'] for row in self.connection.execute('PRAGMA table_info(jobs)') if row['pk']]
+        if columns == ['output_directory']:
+            # Manifests keyed by output directory only are rebuilt with the job key
+            self.connection.execute('ALTER TABLE jobs RENAME TO jobs_old')
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                output_directory TEXT, idf TEXT, epw TEXT, idd TEXT,
+                modifier TEXT, modifier_kwargs TEXT, status TEXT, attempts INTEGER,
+                last_error TEXT, updated REAL, PRIMARY KEY (output_directory, idf))''')
+        if columns == ['output_directory']:
+            self.connection.execute('INSERT INTO jobs SELECT * FROM jobs_old')
+            self.connection.execute('DROP TABLE jobs_old')
+        self.connection.commit()
+
+    def add_jobs(self, jobs):
+        """Add jobs from run_telemetry.make_job as pending, keeping the state of known jobs."""
+        self.connection.executemany(
+            'INSERT OR IGNORE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, 0, NULL, ?)',
+            [(job['output_directory'], job['idf'], job['epw'], job['idd'], _function_name(job['modifier']),
+              json.dumps(job['modifier_kwargs']), PENDING, time.time()) for job in jobs])
+        self.connection.commit()
+
+    def set_status(self, jobs, status, error=None, count_attempt=False):
+        """Set the status of one or more jobs (rows, jobs or run records)."""
+        self.connection.executemany(
+            'UPDATE jobs SET status = ?, last_error = ?, attempts = attempts + ?, updated = ? '
+            'WHERE output_directory = ? AND idf = ?',
+            [(status, error, int(count_attempt), time.time(), *_key(job)) for job in jobs])
+        self.connection.commit()
+
+    def rows(self, status=None):
+        """Jobs as dictionaries, optionally only those with the given status."""
+        if status is None:
+            return [dict(row) for row in self.connection.execute('SELECT * FROM jobs')]
+        return [dict(row) for row in self.connection.execute('SELECT * FROM jobs WHERE status = ?', (status,))]
+
+    def counts(self):
+        """Number of jobs per status."""
+        return dict(self.connection.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+    def reconcile(self):
+        """
+        Bring the manifest in line with the output directories after an interruption.
+
+        Jobs left running by a killed batch, and pending jobs whose outputs already
+        exist, are marked done if their simulation completed and pending otherwise.
+        """
+        done, pending = [], []
+        for row in self.rows(RUNNING) + self.rows(PENDING):
+            if _is_job_complete(row):
+                done.append(row)
+            elif row['status'] == RUNNING:
+                pending.append(row)
+        self.set_status(done, DONE)
+        self.set_status(pending, PENDING, error='interrupted')
+        if done or pending:
+            logger.info(f'Reconciled manifest: {len(done)} already complete, {len(pending)} interrupted runs reset')
+
+    def to_jobs(self, rows):
+        """Rebuild run_telemetry jobs from manifest rows."""
+        return [make_job(row['idf'], row['epw'], row['idd'], row['output_directory'],
+                         modifier=_load_function(row['modifier']),
+                         modifier_kwargs=json.loads(row['modifier_kwargs'] or '{}')) for row in rows]
+
+    def close(self):
+        self.connection.close()
+
+# -------------------------------------------------------------------------------
+# Runner
+# -------------------------------------------------------------------------------
+
+def run_manifest(manifest_path, jobs=None, num_CPUs='auto', max_attempts=MAX_ATTEMPTS,
+                 log_path='runs.jsonl', progress=True, pin_cores=False, store_path=None, policy=None):
+    """
+    Run every unfinished job in the manifest, retrying transient failures.
+
+    New jobs are added to the manifest first; calling this again with the same
+    manifest resumes the batch and skips finished work. A run only counts as done
+    if its own output files pass is_complete.
+
+    Parameters:
+    - manifest_path: SQLite manifest file, created if missing.
+    - jobs: Optional list of jobs from run_telemetry.make_job to add. Modifiers
+      must be top level functions so they can be restored on resume.
+    - num_CPUs, log_path, progress, pin_cores: See run_telemetry.run_instrumented.
+    - max_attempts: Number of times a job is tried before it stays failed.
+    - store_path: Optional result store; finished runs are compacted into it as
+      they complete (see run_compaction.py). Needs one output directory per job.
+    - policy: Retention policy for the compaction (default run_compaction.DEFAULT_POLICY).
+
+    Returns:
+    - Dictionary with the number of jobs per status.
+    """
+    manifest = Manifest(manifest_path)
+    store = None
+    if store_path:
+        import run_compaction
+        store = run_compaction.ResultStore(store_path)
+        policy = policy or run_compaction.DEFAULT_POLICY
+    try:
+        if jobs:
+            manifest.add_jobs(jobs)
+        if store is not None:
+            directories = [row['output_directory'] for row in manifest.rows()]
+            if len(set(directories)) < len(directories):
+                raise ValueError('Compacting runs into a store needs one output directory per job')
+        manifest.reconcile()
+
+        def on_record(record):
+            if record['status'] == 'ok' and _is_job_complete(record):
+                manifest.set_status([record], DONE, count_attempt=True)
+                if store is not None:
+                    run_compaction.compact_run(record['output_directory'], store, policy)
+                return
+            error = record['error'] or 'simulation did not complete'
+            status = PENDING if is_transient(record) else FAILED
+            manifest.set_status([record], status, error=error, count_attempt=True)
+
+        while True:
+            rows = [row for row in manifest.rows(PENDING) if row['attempts'] < max_attempts]
+            if not rows:
+                break
+            attempt = max(row['attempts'] for row in rows) + 1
+            logger.info(f'Running {len(rows)} jobs (attempt {attempt} of at most {max_attempts})')
+            manifest.set_status(rows, RUNNING)
+            run_instrumented(manifest.to_jobs(rows), num_CPUs, log_path=log_path, progress=progress,
+                             pin_cores=pin_cores, callback=on_record)
+
+        # Jobs that used up their attempts
+        manifest.connection.execute('UPDATE jobs SET status = ? WHERE status = ? AND attempts >= ?',
+                                    (FAILED, PENDING, max_attempts))
+        manifest.connection.commit()
+        counts = manifest.counts()
+        logger.info(f'Manifest {manifest_path}: {counts}')
+        return counts
+    finally:
+        manifest.close()
+        if store is not None:
+            store.close()
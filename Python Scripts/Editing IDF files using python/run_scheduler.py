@@ -0,0 +1,245 @@
+# Author: Computational Sustainable Design group, Chalmers
+# Cost estimates, pool sizing, largest-first ordering and core pinning for
+# parallel EnergyPlus batches run with run_telemetry.run_instrumented.
+
+# -------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------
+
+import os                                           # For file sizes and CPU counts
+import re                                           # For scanning IDF text
+import logging                                      # For the scheduling summary
+
+try:
+    import psutil                                   # For physical cores, free memory and affinity
+except ImportError:
+    psutil = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('EnergyPlus run scheduler')
+
+# Rough EnergyPlus memory model [MB], calibrated on the models in idf/; measured
+# peaks from a run log (see run_telemetry.py) replace it where available.
+BASE_MEMORY_MB = 150
+MEMORY_PER_ZONE_MB = 8
+MEMORY_PER_IDF_MB = 20               # per MB of IDF text (surfaces, schedules)
+AIRFLOW_NETWORK_FACTOR = 2.0         # AirflowNetwork models need more memory and time
+DEFAULT_TIMESTEP = 4
+MEMORY_FRACTION = 0.8                # share of the available memory the pool may use
+RESERVE_MEMORY_MB = 1024             # left for the operating system and the notebook
+
+ZONE_PATTERN = re.compile(rb'^\s*Zone\s*,', re.IGNORECASE | re.MULTILINE)
+AFN_PATTERN = re.compile(rb'^\s*AirflowNetwork:', re.IGNORECASE | re.MULTILINE)
+TIMESTEP_PATTERN = re.compile(rb'^\s*Timestep\s*,\s*(\d+)', re.IGNORECASE | re.MULTILINE)
+
+# -------------------------------------------------------------------------------
+# Cost estimates
+# -------------------------------------------------------------------------------
+
+def estimate_job_cost(idf_path, simulation_timestep=None, history=None):
+    """
+    Estimate the relative run time and peak memory of one IDF from its text,
+    without parsing it with eppy.
+
+    Parameters:
+    - idf_path: Path to the IDF file.
+    - simulation_timestep: Timesteps per hour the IDF will be run with
+      (default: the value in the IDF).
+    - history: Optional dict {idf path: run record} of earlier runs; a measured
+      peak_rss_mb replaces the memory estimate and a measured simulate_s is
+      added, see calibrate_costs.
+
+    Returns:
+    - Dictionary with size_mb, zones, airflow_network, timestep, cost (unitless),
+      memory_mb and, with history, simulate_s.
+    """
+    with open(idf_path, 'rb') as file:
+        text = file.read()
+    size_mb = len(text) / 1e6
+    zones = len(ZONE_PATTERN.findall(text))
+    airflow_network = len(AFN_PATTERN.findall(text)) > 0
+    timestep = simulation_timestep
+    if timestep is None:
+        match = TIMESTEP_PATTERN.search(text)
+        timestep = int(match.group(1)) if match else DEFAULT_TIMESTEP
+    factor = AIRFLOW_NETWORK_FACTOR if airflow_network else 1.0
+
+    estimate = {
+        'size_mb': size_mb,
+        'zones': zones,
+        'airflow_network': airflow_network,
+        'timestep': timestep,
+        # Zone heat balances are solved every timestep, surfaces add to every zone
+        'cost': (max(zones, 1) + size_mb) * timestep * factor,
+        'memory_mb': (BASE_MEMORY_MB + MEMORY_PER_ZONE_MB * zones + MEMORY_PER_IDF_MB * size_mb) * factor,
+    }
+    record = (history or {}).get(idf_path)
+    if record and record.get('status') == 'ok':
+        if record.get('peak_rss_mb'):
+            estimate['memory_mb'] = record['peak_rss_mb']
+        if record.get('simulate_s'):
+            estimate['simulate_s'] = record['simulate_s']
+    return estimate
+
+
+def calibrate_costs(estimates):
+    """
+    Put the estimates of a batch on one scale of seconds.
+
+    The unitless cost of the jobs that ran before is compared with their
+    measured simulate_s to fit the seconds per cost unit (median ratio). Every
+    estimate gets seconds: the measured time where there is one, the scaled
+    cost otherwise, so measured and estimated jobs can be ordered together.
+
+    Parameters:
+    - estimates: List of dictionaries from estimate_job_cost, updated in place.
+
+    Returns:
+    - Seconds per cost unit, None if no job has a measured time.
+    """
+    ratios = [e['simulate_s'] / e['cost'] for e in estimates if e.get('simulate_s') and e['cost'] > 0]
+    if not ratios:
+        return None
+    seconds_per_cost = sorted(ratios)[len(ratios) // 2]
+    for estimate in estimates:
+        estimate['seconds'] = estimate.get('simulate_s') or estimate['cost'] * seconds_per_cost
+    return seconds_per_cost
+
+
+def history_from_records(records):
+    """
+    Index run records by IDF path, keeping the latest successful run of each.
+
+    Parameters:
+    - records: List of run records, e.g. from run_telemetry.read_run_log.
+
+    Returns:
+    - Dictionary {idf path: record}.
+    """
+    history = {}
+    for record in sorted(records, key=lambda r: r.get('finished') or 0):
+        if record.get('status') == 'ok':
+            history[record['idf']] = record
+    return history
+
+# -------------------------------------------------------------------------------
+# Pool sizing and ordering
+# -------------------------------------------------------------------------------
+
+def available_resources():
+    """
+    Cores and memory available for simulations.
+
+    EnergyPlus runs one simulation per core, so physical cores are used when
+    psutil can tell them apart from hyper-threads.
+
+    Returns:
+    - Tuple with the number of cores and the available memory in MB (None without psutil).
+    """
+    if psutil is None:
+        return os.cpu_count() or 1, None
+    cores = psutil.cpu_count(logical=False) or psutil.cpu_count() or 1
+    if hasattr(psutil.Process(), 'cpu_affinity'):
+        cores = min(cores, len(psutil.Process().cpu_affinity()))
+    return cores, psutil.virtual_memory().available / 1e6
+
+
+def plan_pool_size(memory_estimates, cores=None, memory_mb=None,
+                   memory_fraction=MEMORY_FRACTION, reserve_mb=RESERVE_MEMORY_MB):
+    """
+    Number of parallel simulations that fits in the cores and memory.
+
+    The pool is sized so that the largest simulations running together still fit,
+    i.e. the sum of the `workers` largest memory estimates stays below the usable memory.
+
+    Parameters:
+    - memory_estimates: List of estimated peak memory per job [MB].
+    - cores, memory_mb: Available cores and memory (default: available_resources()).
+    - memory_fraction: Share of the available memory the pool may use.
+    - reserve_mb: Memory kept free for other processes.
+
+    Returns:
+    - Number of workers (at least 1).
+    """
+    if cores is None or memory_mb is None:
+        detected_cores, detected_memory = available_resources()
+        cores = cores or detected_cores
+        memory_mb = memory_mb if memory_mb is not None else detected_memory
+    workers = max(1, min(cores, len(memory_estimates)))
+    if memory_mb is None:
+        return workers
+    usable = max(memory_mb - reserve_mb, 0) * memory_fraction
+    largest = sorted(memory_estimates, reverse=True)
+    while workers > 1 and sum(largest[:workers]) > usable:
+        workers -= 1
+    return workers
+
+
+def schedule_jobs(jobs, num_CPUs='auto', history=None, simulation_timestep=None):
+    """
+    Order jobs largest first and size the pool for them.
+
+    Running the most expensive simulations first keeps a long run from starting
+    last and leaving the other cores idle at the end of the batch.
+
+    Parameters:
+    - jobs: List of dictionaries from run_telemetry.make_job.
+    - num_CPUs: "auto" to size the pool from cores and memory, "all" for every
+      core, or an upper limit on the number of workers.
+    - history: Optional dict {idf path: run record}, see history_from_records.
+    - simulation_timestep: Timesteps per hour the IDFs will be run with, unless
+      a job sets its own in modifier_kwargs (e.g. for eppy_parallel_helper.modify_idf).
+
+    Returns:
+    - Tuple with the ordered jobs and the number of workers.
+    """
+    if not jobs:
+        return [], 1
+    estimates = [estimate_job_cost(
+        job['idf'], (job.get('modifier_kwargs') or {}).get('simulation_timestep', simulation_timestep), history)
+        for job in jobs]
+    # Seconds if earlier runs calibrate the costs, otherwise the unitless costs
+    key = 'seconds' if calibrate_costs(estimates) else 'cost'
+    order = sorted(range(len(jobs)), key=lambda i: estimates[i][key], reverse=True)
+    ordered = []
+    for i in order:
+        job = dict(jobs[i])
+        job['estimate'] = estimates[i]
+        ordered.append(job)
+
+    cores, memory_mb = available_resources()
+    if num_CPUs not in ('auto', 'all'):
+        cores = min(cores, int(num_CPUs))
+    if num_CPUs == 'all':
+        workers = min(os.cpu_count() or 1, len(jobs))
+    else:
+        workers = plan_pool_size([e['memory_mb'] for e in estimates], cores, memory_mb)
+    memory_text = f'{memory_mb:.0f} MB' if memory_mb is not None else 'unknown memory'
+    logger.info(f'{len(jobs)} jobs, {workers} workers ({cores} cores, {memory_text} available, '
+                f'largest job ~{max(e["memory_mb"] for e in estimates):.0f} MB)')
+    return ordered, workers
+
+# -------------------------------------------------------------------------------
+# Core pinning
+# -------------------------------------------------------------------------------
+
+def pin_to_free_core(slots, lock):
+    """
+    Pool initializer pinning the worker, and the EnergyPlus processes it starts,
+    to a core no other live worker holds.
+
+    Parameters:
+    - slots: multiprocessing.Array('i') with one entry per core, holding the pid of
+      the worker pinned to it (0 if free).
+    - lock: multiprocessing.Lock guarding the slots.
+    """
+    if psutil is None or not hasattr(psutil.Process(), 'cpu_affinity'):
+        return
+    process = psutil.Process()
+    cores = sorted(process.cpu_affinity())
+    with lock:
+        for i in range(min(len(slots), len(cores))):
+            if slots[i] == 0 or not psutil.pid_exists(slots[i]):
+                slots[i] = os.getpid()
+                process.cpu_affinity([cores[i]])
+                return
@@ -0,0 +1,398 @@
+# Author: Computational Sustainable Design group, Chalmers
+# Instrumented parallel EnergyPlus runner: per-run timings, resource usage and
+# error counts, written to a JSONL or SQLite log with live progress.
+
+# -------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------
+
+import os                                           # For file and directory operations
+import re                                           # For parsing eplusout.err
+import sys                                          # For the console progress line
+import glob                                         # For finding the .err file
+import json                                         # For the JSONL log
+import time                                         # For the timings
+import socket                                       # For the host name in the log
+import sqlite3                                      # For the SQLite log
+import threading                                    # For sampling resources during a run
+import multiprocessing                              # For running IDFs in parallel
+from eppy.modeleditor import IDF                    # For working with IDF files
+from eppy_parallel_helper import make_eplaunch_options
+
+try:
+    import psutil                                   # For peak memory and CPU time of EnergyPlus
+except ImportError:
+    psutil = None
+
+try:
+    from tqdm.auto import tqdm                      # Progress bar in notebooks and terminals
+except ImportError:
+    tqdm = None
+
+SAMPLE_INTERVAL = 0.5  # seconds between resource samples
+OUTPUT_SUFFIXES = ('Out', 'out', '-out')  # EnergyPlus output suffix styles C, L and D
+RECORD_FIELDS = [
+    'idf', 'output_directory', 'status', 'returncode', 'error', 'host', 'pid',
+    'submitted', 'started', 'finished', 'queue_wait_s', 'parse_s', 'modify_s',
+    'simulate_s', 'postprocess_s', 'wall_s', 'cpu_s', 'cpu_utilisation', 'peak_rss_mb',
+    'warnings', 'severe', 'fatal', 'completed_successfully',
+]
+
+# -------------------------------------------------------------------------------
+# Resource sampling and error file parsing
+# -------------------------------------------------------------------------------
+
+class ResourceSampler(threading.Thread):
+    """
+    Samples the child processes of the current process (EnergyPlus, ExpandObjects,
+    ReadVarsESO) while a simulation runs. Requires psutil, otherwise nothing is recorded.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak_rss = 0
+        self.cpu_times = {}
+        self._stop_event = threading.Event()
+
+    def run(self):
+        if psutil is None:
+            return
+        parent = psutil.Process(os.getpid())
+        while not self._stop_event.is_set():
+            rss = 0
+            for child in parent.children(recursive=True):
+                try:
+                    rss += child.memory_info().rss
+                    times = child.cpu_times()
+                    self.cpu_times[child.pid] = times.user + times.system
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+            self.peak_rss = max(self.peak_rss, rss)
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        return {
+            'peak_rss_mb': self.peak_rss / 1e6 if psutil else None,
+            'cpu_s': sum(self.cpu_times.values()) if psutil else None,
+        }
+
+
+def output_prefix(idf_path):
+    """Output file prefix of a run, as set by make_eplaunch_options (the IDF name without extension)."""
+    return os.path.basename(idf_path).split('.')[0]
+
+
+def output_files(output_directory, extension, prefix=None):
+    """
+    EnergyPlus output files with an extension (e.g. '.err') in a directory.
+
+    With a prefix only the files of that run are returned, in any of the
+    output suffix styles (<prefix>Out.err, <prefix>out.err, <prefix>-out.err),
+    so runs that share a directory are told apart.
+    """
+    if prefix is not None:
+        return [path for path in (os.path.join(output_directory, prefix + suffix + extension)
+                                  for suffix in OUTPUT_SUFFIXES) if os.path.exists(path)]
+    return glob.glob(os.path.join(output_directory, '*' + extension))
+
+
+def parse_err_file(output_directory, prefix=None):
+    """
+    Count warnings, severe and fatal errors in the EnergyPlus .err file.
+
+    Parameters:
+    - output_directory: The simulation output directory.
+    - prefix: Output prefix of the run (see output_prefix). Needed when several
+      runs share the directory; without it the newest .err file is read.
+
+    Returns:
+    - Dictionary with warnings, severe, fatal and completed_successfully, or
+      None values if no .err file was found.
+    """
+    counts = {'warnings': None, 'severe': None, 'fatal': None, 'completed_successfully': None}
+    # sqlite.err belongs to the SQLite output, not to the simulation
+    err_files = [path for path in output_files(output_directory, '.err', prefix)
+                 if os.path.basename(path).lower() != 'sqlite.err']
+    if not err_files:
+        return counts
+    with open(max(err_files, key=os.path.getmtime), 'r', errors='replace') as file:
+        content = file.read()
+    counts['warnings'] = len(re.findall(r'^\s*\*\* Warning \*\*', content, re.MULTILINE))
+    counts['severe'] = len(re.findall(r'^\s*\*\* Severe  \*\*', content, re.MULTILINE))
+    counts['fatal'] = len(re.findall(r'^\s*\*\*  Fatal  \*\*', content, re.MULTILINE))
+    counts['completed_successfully'] = 'EnergyPlus Completed Successfully' in content
+    # The summary line is authoritative when present
+    summary = re.search(r'Completed Successfully-- (\d+) Warning; (\d+) Severe Errors', content)
+    if summary:
+        counts['warnings'], counts['severe'] = int(summary.group(1)), int(summary.group(2))
+    return counts
+
+# -------------------------------------------------------------------------------
+# Instrumented run of a single IDF
+# -------------------------------------------------------------------------------
+
+def make_job(idf_path, epwfile, iddfile, output_directory, modifier=None, modifier_kwargs=None):
+    """
+    Describe one simulation for run_instrumented.
+
+    Parameters:
+    - idf_path: Path to the IDF file.
+    - epwfile: The weather file for the simulation.
+    - iddfile: The IDD file (set in the worker process if not set already).
+    - output_directory: The desired directory for the simulation results.
+    - modifier: Optional top level function modifier(idf, **modifier_kwargs) that edits the IDF.
+    - modifier_kwargs: Keyword arguments for the modifier.
+
+    Returns:
+    - Dictionary describing the job.
+    """
+    return {
+        'idf': idf_path,
+        'epw': epwfile,
+        'idd': iddfile,
+        'output_directory': output_directory,
+        'modifier': modifier,
+        'modifier_kwargs': modifier_kwargs or {},
+        'submitted': time.time(),
+    }
+
+
+def run_job(job):
+    """
+    Parse, modify, simulate and post-process one IDF, timing every step.
+
+    Exceptions are caught and recorded, so one failing IDF does not stop the batch.
+
+    Parameters:
+    - job: Dictionary from make_job.
+
+    Returns:
+    - Dictionary with the fields in RECORD_FIELDS.
+    """
+    started = time.time()
+    record = {field: None for field in RECORD_FIELDS}
+    record.update({
+        'idf': job['idf'], 'output_directory': job['output_directory'], 'status': 'failed',
+        'host': socket.gethostname(), 'pid': os.getpid(), 'submitted': job['submitted'],
+        'started': started, 'queue_wait_s': started - job['submitted'],
+    })
+    try:
+        t = time.perf_counter()
+        if IDF.getiddname() is None:
+            IDF.setiddname(job['idd'])
+        idf = IDF(job['idf'], job['epw'])
+        record['parse_s'] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        if job['modifier'] is not None:
+            job['modifier'](idf, **job['modifier_kwargs'])
+        options = make_eplaunch_options(idf, job['output_directory'])
+        record['modify_s'] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        sampler = ResourceSampler()
+        sampler.start()
+        try:
+            idf.run(verbose='q', **options)
+            record['status'] = 'ok'
+            record['returncode'] = 0
+        except Exception as e:
+            record['returncode'] = getattr(e, 'returncode', None)
+            record['error'] = f'{type(e).__name__}: {e}'
+        finally:
+            record.update(sampler.stop())
+            record['simulate_s'] = time.perf_counter() - t
+            if record['cpu_s'] is not None and record['simulate_s'] > 0:
+                record['cpu_utilisation'] = record['cpu_s'] / record['simulate_s']
+
+        t = time.perf_counter()
+        record.update(parse_err_file(job['output_directory'], options['output_prefix']))
+        record['postprocess_s'] = time.perf_counter() - t
+    except Exception as e:
+        record['error'] = f'{type(e).__name__}: {e}'
+    record['finished'] = time.time()
+    record['wall_s'] = record['finished'] - started
+    return record
+
+# -------------------------------------------------------------------------------
+# Logs and progress
+# -------------------------------------------------------------------------------
+
+class RunLog:
+    """
+    Append-only log of run records. Paths ending in .db, .sqlite or .sqlite3 are
+    written to an SQLite table 'runs', anything else as JSON lines.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.is_sqlite = os.path.splitext(path)[1].lower() in ('.db', '.sqlite', '.sqlite3')
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        if self.is_sqlite:
+            self.connection = sqlite3.connect(path)
+            columns = ', '.join(f'"{field}"' for field in RECORD_FIELDS)
+            self.connection.execute(f'CREATE TABLE IF NOT EXISTS runs ({columns})')
+            self.connection.commit()
+        else:
+            self.file = open(path, 'a', encoding='utf-8')
+
+    def write(self, record):
+        """Append one record and flush it to disk."""
+        if self.is_sqlite:
+            placeholders = ', '.join('?' for _ in RECORD_FIELDS)
+            self.connection.execute(f'INSERT INTO runs VALUES ({placeholders})',
+                                    [record.get(field) for field in RECORD_FIELDS])
+            self.connection.commit()
+        else:
+            self.file.write(json.dumps(record) + '\n')
+            self.file.flush()
+
+    def close(self):
+        if self.is_sqlite:
+            self.connection.close()
+        else:
+            self.file.close()
+
+
+def read_run_log(path):
+    """
+    Read a run log written by RunLog.
+
+    Parameters:
+    - path: Path to the JSONL or SQLite log.
+
+    Returns:
+    - List of record dictionaries.
+    """
+    if not os.path.exists(path):
+        return []
+    if os.path.splitext(path)[1].lower() in ('.db', '.sqlite', '.sqlite3'):
+        connection = sqlite3.connect(path)
+        connection.row_factory = sqlite3.Row
+        try:
+            return [dict(row) for row in connection.execute('SELECT * FROM runs')]
+        finally:
+            connection.close()
+    with open(path, 'r', encoding='utf-8') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+class Progress:
+    """
+    Live progress of a batch: a tqdm bar (notebook or terminal) when tqdm is
+    installed, otherwise a single updating line on stderr.
+    """
+
+    def __init__(self, total, enabled=True):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.start = time.perf_counter()
+        self.enabled = enabled
+        self.bar = tqdm(total=total, unit='run') if enabled and tqdm is not None else None
+
+    def update(self, record):
+        self.done += 1
+        self.failed += record['status'] != 'ok'
+        if not self.enabled:
+            return
+        name = os.path.basename(record['idf'])
+        if self.bar is not None:
+            self.bar.set_postfix(failed=self.failed, last=name, refresh=False)
+            self.bar.update(1)
+            return
+        elapsed = time.perf_counter() - self.start
+        eta = elapsed / self.done * (self.total - self.done)
+        sys.stderr.write(f'\r{self.done}/{self.total} runs, {self.failed} failed, '
+                         f'{elapsed:.0f} s elapsed, ~{eta:.0f} s left, last: {name}   ')
+        sys.stderr.flush()
+
+    def close(self):
+        if self.bar is not None:
+            self.bar.close()
+        elif self.enabled:
+            sys.stderr.write('\n')
+
+# -------------------------------------------------------------------------------
+# Batch runner
+# -------------------------------------------------------------------------------
+
+def run_instrumented(jobs, num_CPUs=6, log_path='runs.jsonl', progress=True, pin_cores=False, callback=None,
+                     simulation_timestep=None):
+    """
+    Run jobs from make_job in parallel and record every run.
+
+    Every job runs in a fresh worker process (maxtasksperchild=1), so resource
+    samples of one simulation never include another one. Records are written to
+    the log as soon as each run finishes, so an interrupted batch keeps the
+    records of the runs that completed. Jobs are started in the given order.
+
+    Parameters:
+    - jobs: List of dictionaries from make_job.
+    - num_CPUs: Number of parallel simulations, "all", or "auto" to order the
+      jobs largest first and size the pool from cores and memory (see
+      run_scheduler.schedule_jobs, earlier runs in log_path refine the estimates).
+    - log_path: JSONL or SQLite log file (see RunLog), None to skip logging.
+    - progress: Show live progress.
+    - pin_cores: Pin every worker and its EnergyPlus process to its own core (requires psutil).
+    - callback: Optional function called with every record as soon as it arrives.
+    - simulation_timestep: Timesteps per hour the IDFs will be run with, for the
+      "auto" cost estimates (default: each job's modifier_kwargs or the IDF's value).
+
+    Returns:
+    - List of run records in completion order.
+    """
+    if num_CPUs == "auto":
+        from run_scheduler import history_from_records, schedule_jobs
+        history = history_from_records(read_run_log(log_path)) if log_path else None
+        jobs, num_CPUs = schedule_jobs(jobs, 'auto', history, simulation_timestep)
+    elif num_CPUs == "all":
+        num_CPUs = os.cpu_count()
+    initializer, initargs = None, ()
+    if pin_cores:
+        from run_scheduler import pin_to_free_core
+        initializer = pin_to_free_core
+        initargs = (multiprocessing.Array('i', os.cpu_count() or 1), multiprocessing.Lock())
+    log = RunLog(log_path) if log_path else None
+    bar = Progress(len(jobs), enabled=progress)
+    records = []
+    try:
+        with multiprocessing.Pool(num_CPUs, initializer, initargs, maxtasksperchild=1) as pool:
+            for record in pool.imap_unordered(run_job, jobs):
+                records.append(record)
+                if log is not None:
+                    log.write(record)
+                if callback is not None:
+                    callback(record)
+                bar.update(record)
+    finally:
+        bar.close()
+        if log is not None:
+            log.close()
+    return records
+
+
+def summarise_runs(records):
+    """
+    Aggregate run records into batch totals.
+
+    Parameters:
+    - records: List of run records.
+
+    Returns:
+    - Dictionary with counts, total and mean durations and error totals.
+    """
+    finished = [r for r in records if r.get('wall_s') is not None]
+    summary = {'runs': len(records), 'failed': sum(r['status'] != 'ok' for r in records)}
+    for field in ('queue_wait_s', 'parse_s', 'modify_s', 'simulate_s', 'postprocess_s', 'wall_s'):
+        values = [r[field] for r in finished if r.get(field) is not None]
+        summary[f'mean_{field}'] = sum(values) / len(values) if values else None
+    for field in ('warnings', 'severe', 'fatal'):
+        summary[field] = sum(r[field] or 0 for r in records)
+    if finished:
+        summary['batch_wall_s'] = max(r['finished'] for r in finished) - min(r['submitted'] for r in finished)
+    return summary
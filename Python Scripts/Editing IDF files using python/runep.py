@@ -1,24 +1,7 @@
 import os
-import time
 from eppy.modeleditor import IDF
-from eppy.runner.run_functions import runIDFs
-from tqdm.notebook import tqdm  # Note the change here for Jupyter
-
-def make_eplaunch_options(idf):
-
-    idfversion = idf.idfobjects['version'][0].Version_Identifier.split('.')
-    idfversion.extend([0] * (3 - len(idfversion)))
-    idfversionstr = '-'.join([str(item) for item in idfversion])
-    fname = idf.idfname
-    options = {
-        'ep_version': idfversionstr,
-        'output_prefix': os.path.basename(fname).split('.')[0],
-        'output_suffix': 'C',
-        'output_directory': os.path.dirname(fname),
-        'readvars': True,
-        'expandobjects': True
-    }
-    return options
+from run_telemetry import make_job, read_run_log, summarise_runs
+from run_manifest import run_manifest
 
 def main():
     iddfile = "Energy+_22_2_0.idd"
@@ -27,20 +10,16 @@ def main():
 
     idf_dir = 'idf'
     idf_files = [os.path.join(idf_dir, f) for f in os.listdir(idf_dir) if f.endswith('.idf')]
-    runs = []
+    # Results are written next to each IDF, as EPLaunch does
+    jobs = [make_job(idfname, epwfile, iddfile, os.path.dirname(idfname)) for idfname in idf_files]
 
-    for idfname in idf_files:
-        print(f"Processing {idfname}")
-        idf = IDF(idfname, epwfile)
-        theoptions = make_eplaunch_options(idf)
-        runs.append([idf, theoptions])
+    # Largest IDFs first, on as many cores as the memory allows
+    num_CPUs = 'auto'
 
-    # Use all available CPUs
-    num_CPUs = 4
-
-    runIDFs(runs, num_CPUs)
+    # Per-run timings, resource use and error counts are appended to runs.jsonl.
+    # manifest.db tracks finished runs, so running the script again resumes the batch.
+    print(run_manifest('manifest.db', jobs, num_CPUs, log_path='runs.jsonl', pin_cores=True))
+    print(summarise_runs(read_run_log('runs.jsonl')))
 
 if __name__ == '__main__':
     main()
-
-# This took 7m and 45.2 seconds for 4 idf files on a 4-core machine
\ No newline at end of file
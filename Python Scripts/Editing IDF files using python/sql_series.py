@@ -0,0 +1,191 @@
+# Author: Computational Sustainable Design group, Chalmers
+# Bulk extraction of hourly variables and meters from the eplusout.sql files of
+# many runs into one stacked float32 array (runs x series x timesteps), in
+# memory or as a memory-mapped .npy file.
+
+# -------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------
+
+import os                                           # For file and directory operations
+import glob                                         # For finding the SQLite outputs
+import pathlib                                      # For SQLite file URIs
+import logging                                      # For progress messages
+import sqlite3                                      # For reading eplusout.sql
+import numpy as np                                  # For the stacked series
+from multiprocessing import Pool                    # For reading files in parallel
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('EnergyPlus SQL series')
+
+WEATHER_RUN_PERIOD = 3                              # EnvironmentPeriods.EnvironmentType of weather file run periods
+
+# Values of the selected dictionary entries in the weather file run period,
+# without warmup days, in time order
+DATA_QUERY = '''
+    SELECT ReportData.ReportDataDictionaryIndex, ReportData.TimeIndex, ReportData.Value
+    FROM ReportData
+    JOIN Time ON Time.TimeIndex = ReportData.TimeIndex
+    JOIN EnvironmentPeriods ON EnvironmentPeriods.EnvironmentPeriodIndex = Time.EnvironmentPeriodIndex
+    WHERE ReportData.ReportDataDictionaryIndex IN ({indices})
+      AND EnvironmentPeriods.EnvironmentType = ? AND (Time.WarmupFlag IS NULL OR Time.WarmupFlag = 0)
+'''
+
+# -------------------------------------------------------------------------------
+# Reading one file
+# -------------------------------------------------------------------------------
+
+def connect_readonly(sql_path):
+    """
+    Open an SQLite output read-only.
+
+    The file is opened as immutable, so SQLite takes no locks and many
+    processes can read the same results folder at once.
+    """
+    uri = pathlib.Path(sql_path).resolve().as_uri() + '?mode=ro&immutable=1'
+    return sqlite3.connect(uri, uri=True)
+
+
+def read_series(sql_path, series, frequency='Hourly'):
+    """
+    Read the selected variables and meters of one run.
+
+    Parameters:
+    - sql_path: Path to the eplusout.sql file.
+    - series: List of (key value, name) pairs. A key of '*' sums the variable
+      over every key (e.g. all zones); meters use '*' or ''.
+    - frequency: Reporting frequency as stored in the file ('Hourly', 'Daily', ...).
+
+    Returns:
+    - float32 array (len(series), timesteps); series that are not in the file are NaN.
+    """
+    connection = connect_readonly(sql_path)
+    try:
+        dictionary = connection.execute(
+            'SELECT ReportDataDictionaryIndex, KeyValue, Name FROM ReportDataDictionary WHERE ReportingFrequency = ?',
+            (frequency,)).fetchall()
+        # Dictionary indices summed into every output row
+        selected = [[index for index, key_value, entry_name in dictionary
+                     if entry_name == name and (key in ('*', '') or (key_value or '').upper() == key.upper())]
+                    for key, name in series]
+        wanted = sorted({index for indices in selected for index in indices})
+        if not wanted:
+            return np.full((len(series), 0), np.nan, dtype=np.float32)
+        query = DATA_QUERY.format(indices=','.join('?' * len(wanted)))
+        data = np.array(connection.execute(query, (*wanted, WEATHER_RUN_PERIOD)).fetchall(), dtype=np.float64)
+    finally:
+        connection.close()
+
+    if len(data) == 0:
+        return np.full((len(series), 0), np.nan, dtype=np.float32)
+    times, position = np.unique(data[:, 1], return_inverse=True)
+    values = np.full((len(series), len(times)), np.nan, dtype=np.float64)
+    for row, indices in enumerate(selected):
+        if indices:
+            mask = np.isin(data[:, 0], indices)
+            values[row] = np.bincount(position[mask], weights=data[mask, 2], minlength=len(times))
+    return values.astype(np.float32)
+
+
+def _read_job(args):
+    sql_path, series, frequency = args
+    try:
+        return read_series(sql_path, series, frequency)
+    except sqlite3.Error as e:
+        logger.warning(f'Could not read {sql_path}: {e}')
+        return None
+
+# -------------------------------------------------------------------------------
+# Bulk extraction
+# -------------------------------------------------------------------------------
+
+def find_sql_files(results_dir='results'):
+    """eplusout.sql files of every results_<idf name> folder, sorted by folder name."""
+    return sorted(glob.glob(os.path.join(results_dir, 'results_*', '*.sql')))
+
+
+def run_names(sql_files):
+    """IDF names of the runs, from their results_<idf name> folders."""
+    return [os.path.basename(os.path.dirname(path)).split('_', 1)[-1] for path in sql_files]
+
+
+def extract_series(sql_files, series, frequency='Hourly', timesteps=None, out_path=None, workers=None,
+                   chunksize=4):
+    """
+    Stack the selected series of many runs into one float32 array.
+
+    Files are read in parallel; each worker opens its files read-only and reads
+    all selected series with one query per file. The parent writes every run's
+    block into the output as it arrives, so with out_path the result never has
+    to fit in memory.
+
+    Parameters:
+    - sql_files: List of eplusout.sql paths, e.g. from find_sql_files.
+    - series: List of (key value, name) pairs, see read_series.
+    - frequency: Reporting frequency.
+    - timesteps: Length of the time axis (default: taken from the first run
+      that has data). Longer runs are cut, shorter ones padded with NaN.
+    - out_path: Optional .npy path; the array is then a memory-mapped file
+      that can be reopened with np.load(out_path, mmap_mode='r').
+    - workers: Number of processes (default one per CPU, 1 to read in this process).
+    - chunksize: Files handed to a worker at a time.
+
+    Returns:
+    - float32 array (runs, series, timesteps); runs that failed are NaN.
+    """
+    jobs = [(path, list(series), frequency) for path in sql_files]
+    if workers == 1:
+        results = map(_read_job, jobs)
+        pool = None
+    else:
+        pool = Pool(workers)
+        results = pool.imap(_read_job, jobs, chunksize=chunksize)
+
+    stacked = None
+    pending = []                                    # runs read before the time axis length is known
+    try:
+        for run, values in enumerate(results):
+            if stacked is None:
+                if timesteps is None and (values is None or values.shape[1] == 0):
+                    pending.append((run, values))
+                    continue
+                timesteps = timesteps or values.shape[1]
+                shape = (len(jobs), len(series), timesteps)
+                if out_path:
+                    stacked = np.lib.format.open_memmap(out_path, mode='w+', dtype=np.float32, shape=shape)
+                    stacked[:] = np.nan
+                else:
+                    stacked = np.full(shape, np.nan, dtype=np.float32)
+                for pending_run, pending_values in pending:
+                    _store(stacked, pending_run, pending_values)
+                pending = []
+            _store(stacked, run, values)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    if stacked is None:
+        stacked = np.full((len(jobs), len(series), timesteps or 0), np.nan, dtype=np.float32)
+    if out_path and isinstance(stacked, np.memmap):
+        stacked.flush()
+    logger.info(f'{len(jobs)} runs x {len(series)} series x {stacked.shape[2]} timesteps extracted')
+    return stacked
+
+
+def _store(stacked, run, values):
+    if values is None or values.shape[1] == 0:
+        return
+    length = min(values.shape[1], stacked.shape[2])
+    stacked[run, :, :length] = values[:, :length]
+
+
+def extract_results(results_dir, series, frequency='Hourly', out_path=None, workers=None):
+    """
+    Extract the series of every run in a results folder.
+
+    Returns:
+    - Tuple with the list of IDF names (first axis) and the stacked array.
+    """
+    sql_files = find_sql_files(results_dir)
+    return run_names(sql_files), extract_series(sql_files, series, frequency, out_path=out_path, workers=workers)
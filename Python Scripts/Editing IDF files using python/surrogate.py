@@ -0,0 +1,216 @@
+# Author: Computational Sustainable Design group, Chalmers
+# Surrogate model to pre-screen IDF variants: a Gaussian process trained on the
+# variants that were simulated predicts the others, and the most promising or
+# most uncertain ones are picked for the next EnergyPlus batch.
+
+# -------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------
+
+import os                                           # For file and directory operations
+import logging                                      # For progress messages
+import numpy as np                                  # For the Gaussian process
+import pandas as pd                                 # For the variant and result tables
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('IDF surrogate')
+
+TARGET = 'normalised_district_heating_demand_kwh_m2'
+LENGTH_SCALES = [0.1, 0.2, 0.5, 1.0, 2.0, 5.0]      # candidates, in standardised feature units
+NOISE_LEVELS = [1e-6, 1e-4, 1e-2, 1e-1]             # candidates, relative to the target variance
+
+# -------------------------------------------------------------------------------
+# Features
+# -------------------------------------------------------------------------------
+
+def variant_name(path):
+    """Name of a variant as used in the results: the IDF file name without extension."""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def load_variants(variants_csv):
+    """
+    Read the variant index written by idf_variants.generate_variants.
+
+    Returns:
+    - DataFrame indexed by variant name with the path, key and parameter columns.
+    """
+    variants = pd.read_csv(variants_csv)
+    variants.index = variants['path'].map(variant_name).rename('idf_name')
+    return variants
+
+
+def make_features(variants, columns=None):
+    """
+    Numeric feature matrix of the variant parameters.
+
+    Numeric parameters are used as they are; text parameters are one-hot encoded.
+
+    Parameters:
+    - variants: DataFrame from load_variants.
+    - columns: Feature columns to keep (e.g. those of the training data), default all.
+
+    Returns:
+    - DataFrame of float features indexed like variants.
+    """
+    parameters = variants.drop(columns=['path', 'key'], errors='ignore')
+    features = pd.get_dummies(parameters, dtype=float)
+    if columns is not None:
+        features = features.reindex(columns=columns, fill_value=0.0)
+    return features.astype(float)
+
+
+def load_training_data(variants_csv, results_csv, target=TARGET):
+    """
+    Join the variant parameters with simulated results.
+
+    Parameters:
+    - variants_csv: Variant index from idf_variants.generate_variants.
+    - results_csv: Results from eppy_parallel_helper.parse_results (idf_name column).
+    - target: Result column to model.
+
+    Returns:
+    - Tuple with the variants DataFrame and a Series of the target for simulated variants.
+    """
+    variants = load_variants(variants_csv)
+    results = pd.read_csv(results_csv, dtype={'idf_name': str}).set_index('idf_name')
+    y = pd.to_numeric(results[target], errors='coerce').dropna()
+    y = y[y.index.isin(variants.index)]
+    return variants, y
+
+# -------------------------------------------------------------------------------
+# Gaussian process
+# -------------------------------------------------------------------------------
+
+class GaussianProcess:
+    """
+    Gaussian process regression with a squared exponential kernel.
+
+    Features and target are standardised; the length scale and noise level are
+    chosen from LENGTH_SCALES and NOISE_LEVELS by the log marginal likelihood.
+    """
+
+    def __init__(self, length_scales=LENGTH_SCALES, noise_levels=NOISE_LEVELS):
+        self.length_scales = length_scales
+        self.noise_levels = noise_levels
+
+    def _kernel(self, a, b):
+        squared = (a ** 2).sum(1)[:, None] + (b ** 2).sum(1)[None, :] - 2 * a @ b.T
+        return np.exp(-0.5 * np.maximum(squared, 0) / self.length_scale ** 2)
+
+    def fit(self, X, y):
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        self.x_mean = X.mean(0)
+        self.x_std = np.where(X.std(0) > 0, X.std(0), 1.0)
+        self.y_mean = y.mean()
+        self.y_std = y.std() if y.std() > 0 else 1.0
+        self.X = (X - self.x_mean) / self.x_std
+        target = (y - self.y_mean) / self.y_std
+
+        best = None
+        for length_scale in self.length_scales:
+            self.length_scale = length_scale
+            K = self._kernel(self.X, self.X)
+            for noise in self.noise_levels:
+                try:
+                    L = np.linalg.cholesky(K + noise * np.eye(len(K)))
+                except np.linalg.LinAlgError:
+                    continue
+                alpha = np.linalg.solve(L.T, np.linalg.solve(L, target))
+                likelihood = -0.5 * target @ alpha - np.log(np.diag(L)).sum()
+                if best is None or likelihood > best[0]:
+                    best = (likelihood, length_scale, noise, L, alpha)
+        if best is None:
+            raise ValueError('Could not fit the Gaussian process, check for duplicate or invalid training data')
+        self.log_likelihood, self.length_scale, self.noise, self.L, self.alpha = best
+        return self
+
+    def predict(self, X):
+        """
+        Returns:
+        - Tuple with the predicted mean and standard deviation, in target units.
+        """
+        X = (np.asarray(X, dtype=np.float64) - self.x_mean) / self.x_std
+        K_star = self._kernel(X, self.X)
+        mean = K_star @ self.alpha
+        v = np.linalg.solve(self.L, K_star.T)
+        variance = np.maximum(1.0 + self.noise - (v ** 2).sum(0), 0)
+        return mean * self.y_std + self.y_mean, np.sqrt(variance) * self.y_std
+
+# -------------------------------------------------------------------------------
+# Active learning
+# -------------------------------------------------------------------------------
+
+def acquisition(mean, std, strategy='lcb', kappa=2.0):
+    """
+    Score candidates, higher is more worth simulating.
+
+    Strategies:
+    - 'uncertainty': largest predictive standard deviation (improves the model).
+    - 'lcb': lowest lower confidence bound mean - kappa * std (low demand, or uncertain).
+    - 'mean': lowest predicted value (exploitation only).
+    """
+    if strategy == 'uncertainty':
+        return std
+    if strategy == 'lcb':
+        return -(mean - kappa * std)
+    if strategy == 'mean':
+        return -mean
+    raise ValueError(f'Unknown strategy {strategy!r}')
+
+
+def screen_variants(variants_csv, results_csv, n=10, strategy='lcb', kappa=2.0, target=TARGET):
+    """
+    Predict the target for every variant that was not simulated and pick the next batch.
+
+    Parameters:
+    - variants_csv: Variant index from idf_variants.generate_variants.
+    - results_csv: Results of the simulated variants (parse_results output).
+    - n: Number of variants to select.
+    - strategy, kappa: See acquisition.
+    - target: Result column to model.
+
+    Returns:
+    - DataFrame of the unsimulated variants with predicted mean, std, score and a
+      'selected' flag, sorted by score.
+    """
+    variants, y = load_training_data(variants_csv, results_csv, target)
+    if len(y) < 2:
+        raise ValueError(f'Need at least 2 simulated variants to train the surrogate, found {len(y)}')
+    features = make_features(variants)
+    model = GaussianProcess().fit(features.loc[y.index].values, y.values)
+    logger.info(f'Surrogate trained on {len(y)} runs (length scale {model.length_scale}, noise {model.noise})')
+
+    candidates = variants.loc[~variants.index.isin(y.index)].copy()
+    mean, std = model.predict(features.loc[candidates.index].values)
+    candidates[f'{target}_mean'] = mean
+    candidates[f'{target}_std'] = std
+    candidates['score'] = acquisition(mean, std, strategy, kappa)
+    candidates = candidates.sort_values('score', ascending=False)
+    candidates['selected'] = False
+    candidates.iloc[:n, candidates.columns.get_loc('selected')] = True
+    return candidates
+
+
+def cross_validate(variants_csv, results_csv, folds=5, target=TARGET, seed=0):
+    """
+    K-fold cross-validation of the surrogate on the simulated variants.
+
+    Returns:
+    - Dictionary with the mean absolute error, RMSE and the share of runs inside
+      the predicted 95% interval.
+    """
+    variants, y = load_training_data(variants_csv, results_csv, target)
+    X = make_features(variants).loc[y.index].values
+    order = np.random.default_rng(seed).permutation(len(y))
+    errors, inside = [], []
+    for fold in np.array_split(order, folds):
+        train = np.setdiff1d(order, fold)
+        model = GaussianProcess().fit(X[train], y.values[train])
+        mean, std = model.predict(X[fold])
+        errors.append(mean - y.values[fold])
+        inside.append(np.abs(mean - y.values[fold]) <= 1.96 * std)
+    errors = np.concatenate(errors)
+    return {'mae': float(np.abs(errors).mean()), 'rmse': float(np.sqrt((errors ** 2).mean())),
+            'coverage_95': float(np.concatenate(inside).mean())}
@@ -21,6 +21,11 @@ X_TRANS = 750
 Y_TRANS = 900
 Z_TRANS = 0
 
+CP_ANGLES = [0, 45, 90, 135, 180, 225, 270, 315]
+CP_COLUMNS = [f'c_p_{angle}' for angle in CP_ANGLES]
+CP_DTYPES = {'angle': 'float64', 'u_ref': 'float32', 'x': 'float64', 'y': 'float64', 'z': 'float64', 'c_p': 'float32'}
+CP_CACHE_VERSION = 1
+
 def path_checker(IDF_PATH, IDD_PATH, CP_PATH):
     """Checks if the paths are valid"""
     logger.info('Checking paths')
@@ -61,23 +66,78 @@ def add_wind_pressure_coefficients_array(idf1):
                                 Wind_Direction_8 = 315)
     return wind_pressure_coefficient_array
     
-def vectorize_points(cp_path, x_trans, y_trans, z_trans):
+def read_cp_csv(cp_path):
+    """Reads the columns of Cp.csv that are used, with explicit dtypes (with the pyarrow parser if it is installed)"""
+    try:
+        import pyarrow  # noqa: F401
+        engine = 'pyarrow'
+    except ImportError:
+        engine = 'c'
+    return pd.read_csv(cp_path, usecols=list(CP_DTYPES), dtype=CP_DTYPES, engine=engine)
+
+def pivot_cp(cp_data, angles=CP_ANGLES, tolerance=1e-6):
+    """Pivots the long Cp table (one row per node and angle) to one row per node with a c_p_<angle> column per angle.
+    Rows are grouped by angle with one stable sort; if the nodes of the angles are then not in the same order, rows are
+    sorted by angle and node coordinates instead, so the rows of an angle don't have to be in the same order as those
+    of angle 0. Raises a ValueError if an angle is missing or the nodes differ between angles.
+    Returns the node coordinates (n_nodes x 3), u_ref of angle 0 (n_nodes) and Cp (n_nodes x n_angles, float32)."""
+    codes, found = pd.factorize(cp_data['angle'].to_numpy())
+    missing = [a for a in angles if not np.isclose(found, a).any()]
+    if missing:
+        raise ValueError(f'Cp data has no rows for angle(s) {missing}, found {sorted(found.tolist())}')
+    # Position of every row's angle in angles, -1 for angles that are not used
+    positions = np.array([next((i for i, a in enumerate(angles) if np.isclose(value, a)), -1) for value in found])
+    angle_position = positions[codes]
+    rows = angle_position >= 0
+    xyz = cp_data[['x', 'y', 'z']].to_numpy()[rows]
+    u_ref = cp_data['u_ref'].to_numpy()[rows]
+    c_p = cp_data['c_p'].to_numpy()[rows]
+    angle_position = angle_position[rows]
+
+    counts = np.bincount(angle_position, minlength=len(angles))
+    if np.any(counts != counts[0]):
+        raise ValueError(f'Angles have different numbers of nodes: {dict(zip(angles, counts.tolist()))}')
+    n_nodes = counts[0]
+    order = np.argsort(angle_position, kind='stable')
+    grouped = xyz[order].reshape(len(angles), n_nodes, 3)
+    if np.abs(grouped - grouped[0]).max() > tolerance:
+        logger.info('Cp rows are not in the same node order for every angle, sorting by coordinates')
+        order = np.lexsort((xyz[:, 2], xyz[:, 1], xyz[:, 0], angle_position))
+        grouped = xyz[order].reshape(len(angles), n_nodes, 3)
+    xyz = grouped
+    deviation = np.abs(xyz - xyz[0]).max()
+    if deviation > tolerance:
+        raise ValueError(f'Node coordinates differ between angles by up to {deviation:g} m')
+    u_ref = u_ref[order].reshape(len(angles), n_nodes)[0]
+    c_p = c_p[order].reshape(len(angles), n_nodes).T.astype(np.float32)
+    return xyz[0], u_ref, c_p
+
+def load_cp(cp_path, angles=CP_ANGLES, cache=True):
+    """Loads Cp.csv as (xyz, u_ref, cp) arrays, see pivot_cp.
+    With cache, the arrays are saved next to the CSV (<cp_path>.npz) and reused while the CSV's size and modification
+    time are unchanged."""
+    cache_path = cp_path + '.npz'
+    stat = os.stat(cp_path)
+    key = np.array([CP_CACHE_VERSION, stat.st_size, stat.st_mtime_ns] + list(angles), dtype=np.float64)
+    if cache and os.path.exists(cache_path):
+        cached = np.load(cache_path)
+        if cached['key'].shape == key.shape and np.array_equal(cached['key'], key):
+            logger.info(f'Loading cached Cp data from {cache_path}')
+            return cached['xyz'], cached['u_ref'], cached['cp']
+    xyz, u_ref, cp = pivot_cp(read_cp_csv(cp_path), angles)
+    if cache:
+        tmp_path = f'{cache_path}.{os.getpid()}.tmp.npz'
+        np.savez(tmp_path, key=key, xyz=xyz, u_ref=u_ref, cp=cp)
+        os.replace(tmp_path, cache_path)
+    return xyz, u_ref, cp
+
+def vectorize_points(cp_path, x_trans, y_trans, z_trans, cache=True):
     """Vectorizes the points from the Cp.csv file"""
     logger.info(f'Vectorizing points from {cp_path}')
-    cp_data = pd.read_csv(cp_path)
-    cp_data.head()
-
-    # Fix cp csv
-    coords_df = cp_data[cp_data['angle'] == 0][['u_ref', 'x', 'y', 'z']]
-    cp_list = []
-    for angles in cp_data['angle'].unique():
-        cp_list.append(cp_data[cp_data['angle'] == angles]['c_p'].tolist())
-
-    # add the cp_list to the coords_df with the column name 'c_p_<angle>'
-    for i, angles in enumerate(cp_data['angle'].unique()):
-        coords_df['c_p_{}'.format(angles)] = cp_list[i]
-    # Extract just the xyz for cp0
-    points_df = coords_df[['x', 'y', 'z','c_p_0']]
+    xyz, u_ref, cp = load_cp(cp_path, cache=cache)
+    coords_df = pd.DataFrame({'u_ref': u_ref, 'x': xyz[:, 0], 'y': xyz[:, 1], 'z': xyz[:, 2]})
+    for i, column in enumerate(CP_COLUMNS):
+        coords_df[column] = cp[:, i]
     xyz_df = coords_df.copy()
     logger.info(f'Translating points in the Cp.csv file by {x_trans}, {y_trans} and {z_trans}')
 
@@ -102,8 +162,7 @@ def get_cp(surface, kdtree, coords_df, threshold=None):
         return [-9999] * 8
     # Use the indices to fetch the required rows from the original DataFrame
     closest_rows = coords_df.iloc[indices]
-    cp_columns = ['c_p_0', 'c_p_45', 'c_p_90', 'c_p_135', 'c_p_180', 'c_p_225', 'c_p_270', 'c_p_315']
-    avg_cp = closest_rows[cp_columns].mean().tolist()
+    avg_cp = closest_rows[CP_COLUMNS].mean().tolist()
     return avg_cp
 
 def fetch_surfaces(idf1):# Sample cp values
@@ -114,25 +173,75 @@ def fetch_surfaces(idf1):# Sample cp values
 
 
 
-def plot_cfd_values(xyz_df):
-    fig = go.Figure()
-    fig.add_trace(go.Scatter3d(
-        x=xyz_df['x'], y=xyz_df['y'], z=xyz_df['z'],
-        mode='markers',
-        marker=dict(
-            size=2,
-            color=xyz_df['c_p_0'],
-            colorscale='Viridis',
-            colorbar=dict(title='c_p_0'),
-        )
-    ))
-    fig.update_layout(
-        title="CP Values from CFD Simulation",
-        scene=dict(
-            xaxis_title="X", 
-            yaxis_title="Y", 
-            zaxis_title="Z", zaxis_range=[-50,250])
-    )
+MAX_PLOT_POINTS = 200000    # Points per Scatter3d trace that keep the browser interactive
+
+def _voxelize(points, origin, voxel_size):
+    """Voxel of every point (inverse) and the number of points per occupied voxel"""
+    cells = np.floor((points - origin) / voxel_size).astype(np.int64)
+    keys = np.ravel_multi_index(cells.T, cells.max(axis=0) + 1)
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    return inverse, counts
+
+def voxel_downsample(points, values=None, voxel_size=None, max_points=MAX_PLOT_POINTS):
+    """Averages the points (and values) in every voxel of a regular grid.
+    Without a voxel_size, the size is halved or doubled from the bounding box volume per point until between
+    max_points / 4 and max_points voxels are occupied (CFD nodes lie on surfaces, so most voxels are empty).
+    Returns the downsampled points, the mean value per voxel and the voxel size."""
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) <= max_points and voxel_size is None:
+        return points, values if values is None else np.asarray(values), 0.0
+    origin = points.min(axis=0)
+    if voxel_size is not None:
+        inverse, counts = _voxelize(points, origin, voxel_size)
+    else:
+        extent = np.maximum(np.ptp(points, axis=0), 1e-3)
+        voxel_size = float(np.prod(extent) / max_points) ** (1 / 3)
+        best = None
+        for _ in range(20):
+            inverse, counts = _voxelize(points, origin, voxel_size)
+            if len(counts) > max_points:
+                if best is not None:
+                    break
+                voxel_size *= 2
+                continue
+            best = (inverse, counts, voxel_size)
+            if len(counts) >= max_points / 4:
+                break
+            voxel_size /= 2
+        inverse, counts, voxel_size = best
+    sampled = np.column_stack([np.bincount(inverse, weights=points[:, i]) / counts for i in range(3)])
+    if values is not None:
+        values = np.bincount(inverse, weights=np.asarray(values, dtype=np.float64)) / counts
+    logger.info(f'Downsampled {len(points)} CFD points to {len(sampled)} ({voxel_size:g} m voxels)')
+    return sampled, values, voxel_size
+
+def surface_cp(surfaces, kdtree, coords_df, cp_column='c_p_0'):
+    """Assigns Cp to surfaces like get_cp (mean over the nearest CFD node of every vertex), for all surfaces in one query.
+    Returns the vertices, the vertex offsets of every surface, the Cp per surface and the nearest-node distance per vertex."""
+    coords = [np.asarray(surface.coords, dtype=np.float64) for surface in surfaces]
+    counts = np.array([len(c) for c in coords], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    vertices = np.concatenate(coords) if coords else np.empty((0, 3))
+    distances, indices = kdtree.query(vertices, k=1)
+    node_cp = coords_df[cp_column].to_numpy()[indices]
+    cp = np.add.reduceat(node_cp, offsets[:-1]) / counts if len(counts) else np.empty(0)
+    return vertices, offsets, cp, distances
+
+def _cfd_trace(xyz_df, color_column='c_p_0', max_points=MAX_PLOT_POINTS, color=None):
+    """Scatter3d trace (WebGL) of the CFD nodes, voxel-downsampled to at most max_points."""
+    points, values, _ = voxel_downsample(xyz_df[['x', 'y', 'z']].to_numpy(), xyz_df[color_column].to_numpy(),
+                                         max_points=max_points)
+    marker = dict(size=2, color=color) if color else \
+        dict(size=2, color=values, colorscale='Viridis', colorbar=dict(title=color_column))
+    return go.Scatter3d(x=points[:, 0], y=points[:, 1], z=points[:, 2], mode='markers', marker=marker,
+                        name='CFD nodes', hoverinfo='skip' if color else None)
+
+def _scene_layout(title):
+    return dict(title=title, scene=dict(xaxis_title="X", yaxis_title="Y", zaxis_title="Z", zaxis_range=[-50,250]))
+
+def plot_cfd_values(xyz_df, max_points=MAX_PLOT_POINTS):
+    fig = go.Figure(_cfd_trace(xyz_df, max_points=max_points))
+    fig.update_layout(**_scene_layout("CP Values from CFD Simulation"))
     fig.show()
 
 def plot_windows_from_idf(points_array):
@@ -142,53 +251,64 @@ def plot_windows_from_idf(points_array):
         mode='markers',
         marker=dict(size=2, color='blue')
     ))
-    fig.update_layout(
-        title="Windows from IDF Object",
-        scene=dict(
-            xaxis_title="X",
-            yaxis_title="Y",
-            zaxis_title="Z",
-            zaxis_range=[-50,250])
-    )
+    fig.update_layout(**_scene_layout("Windows from IDF Object"))
     fig.show()
 
-def plot_combined(xyz_df, points_array):
+def plot_combined(xyz_df, points_array, max_points=MAX_PLOT_POINTS):
     fig = go.Figure()
     # CFD points
-    fig.add_trace(go.Scatter3d(
-        x=xyz_df['x'], y=xyz_df['y'], z=xyz_df['z'],
-        mode='markers',
-        marker=dict(
-            size=2,
-            color='red'
-        )
-    ))
+    fig.add_trace(_cfd_trace(xyz_df, max_points=max_points, color='red'))
     # IDF points
     fig.add_trace(go.Scatter3d(
         x=points_array[:,0], y=points_array[:,1], z=points_array[:,2],
         mode='markers',
         marker=dict(size=2, color='blue')
     ))
-    fig.update_layout(
-        title="Combined Plot of Values from CFD and IDF",
-        scene=dict(
-            xaxis_title="X",
-            yaxis_title="Y",
-            zaxis_title="Z",
-            zaxis_range=[-50,250])
-    )
+    fig.update_layout(**_scene_layout("Combined Plot of Values from CFD and IDF"))
     fig.show()
 
-def plot_objects(fenestration_objects, xyz_df):
+def plot_objects(fenestration_objects, xyz_df, max_points=MAX_PLOT_POINTS):
     points = [coord for surface in fenestration_objects for coord in surface.coords]
     points_array = np.array(points)
 
     # Plot 1
-    plot_cfd_values(xyz_df)
+    plot_cfd_values(xyz_df, max_points)
     # Plot 2
     plot_windows_from_idf(points_array)
     # Plot 3
-    plot_combined(xyz_df, points_array)
+    plot_combined(xyz_df, points_array, max_points)
+
+def plot_diagnostics(surfaces, xyz_df, kdtree, threshold=None, cp_column='c_p_0', max_points=MAX_PLOT_POINTS):
+    """One figure to check the Cp assignment: the downsampled CFD cloud, the surfaces coloured by their assigned Cp
+    and the distribution of nearest-node distances that the threshold of get_cp is applied to."""
+    from plotly.subplots import make_subplots
+    vertices, offsets, cp, distances = surface_cp(surfaces, kdtree, xyz_df, cp_column)
+
+    # Fan triangulation of every surface polygon, one Cp per triangle
+    starts, counts = offsets[:-1], np.diff(offsets)
+    triangles = counts - 2
+    first = np.repeat(starts, triangles)
+    step = np.arange(triangles.sum()) - np.repeat(np.cumsum(triangles) - triangles, triangles)
+    second = first + step + 1
+
+    fig = make_subplots(rows=1, cols=2, column_widths=[0.7, 0.3], specs=[[{'type': 'scene'}, {'type': 'xy'}]],
+                        subplot_titles=(f"Surfaces coloured by assigned {cp_column}", "Distance to nearest CFD node"))
+    cloud = _cfd_trace(xyz_df, cp_column, max_points)
+    cloud.marker.update(size=1, opacity=0.3, showscale=False)
+    fig.add_trace(cloud, row=1, col=1)
+    fig.add_trace(go.Mesh3d(x=vertices[:, 0], y=vertices[:, 1], z=vertices[:, 2], i=first, j=second, k=second + 1,
+                            intensity=np.repeat(cp, triangles), intensitymode='cell', colorscale='RdBu_r',
+                            colorbar=dict(title=cp_column, x=0.62), name='Surfaces',
+                            hovertext=np.repeat([surface.Name for surface in surfaces], triangles)), row=1, col=1)
+    fig.add_trace(go.Histogram(x=distances, nbinsx=100, name='Vertex distances', showlegend=False), row=1, col=2)
+    if threshold:
+        fig.add_vline(x=threshold, line_dash='dash', line_color='red', row=1, col=2)
+        logger.info(f'{np.mean(distances > threshold):.1%} of vertices are further than {threshold} m from a CFD node')
+    fig.update_xaxes(title_text='Distance [m]', row=1, col=2)
+    fig.update_yaxes(title_text='Vertices', row=1, col=2)
+    fig.update_layout(scene=dict(xaxis_title="X", yaxis_title="Y", zaxis_title="Z", aspectmode='data'))
+    fig.show()
+    return fig
 
 
 def add_cp_fenestration(idf1, fenestration_objects,wind_pressure_coefficient_array, kdtree, coords_df):
@@ -0,0 +1,293 @@
+# Author: Computational Sustainable Design group, Chalmers
+# Batched geocoding of address lists: a persistent cache of normalised
+# addresses, pooled HTTP connections, bounded concurrent requests with rate
+# limiting and retries, and replaceable backends (geocode.xyz or a local table).
+
+# -------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------
+
+import re                                           # For normalising addresses
+import csv                                          # For the input and output files
+import time                                         # For rate limiting and backoff
+import sqlite3                                      # For the address cache
+import logging                                      # For progress messages
+import threading                                    # For the shared rate limiter
+import unicodedata                                  # For normalising addresses
+from urllib.parse import quote                      # For addresses in request URLs
+from concurrent.futures import ThreadPoolExecutor   # For concurrent requests
+
+try:
+    import requests                                 # For HTTP requests
+    from requests.adapters import HTTPAdapter       # For connection pooling
+except ImportError:
+    requests = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('Geocoding')
+
+RESULT_FIELDS = ['address', 'lat', 'lon', 'confidence']
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+# -------------------------------------------------------------------------------
+# Backends
+# -------------------------------------------------------------------------------
+
+class GeocodeError(Exception):
+    """A request that failed. Transient errors (rate limits, timeouts) are retried."""
+
+    def __init__(self, message, transient=False):
+        super().__init__(message)
+        self.transient = transient
+
+
+class GeocodeXYZ:
+    """
+    geocode.xyz backend.
+
+    One requests.Session is shared by all threads, so connections to the
+    server are kept open and reused instead of being set up for every address.
+
+    Parameters:
+    - auth_key: geocode.xyz API key (without a key the service allows about one request per second).
+    - region: Region code, e.g. 'SE'.
+    - timeout: Request timeout in seconds.
+    - pool_size: Number of connections kept open, at least the number of threads.
+    """
+
+    name = 'geocode.xyz'
+    url = 'https://geocode.xyz/{address}'
+
+    def __init__(self, auth_key=None, region='SE', timeout=30, pool_size=8):
+        if requests is None:
+            raise ImportError('\nFailed to import requests, install it with pip install requests')
+        self.auth_key = auth_key
+        self.region = region
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+
+    def geocode(self, address):
+        """
+        Returns:
+        - Dictionary with lat, lon and confidence.
+        """
+        params = {'region': self.region, 'json': 1}
+        if self.auth_key:
+            params['auth'] = self.auth_key
+        try:
+            response = self.session.get(self.url.format(address=quote(address)), params=params, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise GeocodeError(str(e), transient=True)
+        if response.status_code in RETRY_STATUS:
+            raise GeocodeError(f'HTTP {response.status_code}', transient=True)
+        response.raise_for_status()
+        data = response.json()
+        if 'error' in data:
+            error = data['error']
+            message = error.get('description', str(error)) if isinstance(error, dict) else str(error)
+            # geocode.xyz reports throttling as an error in the JSON body
+            raise GeocodeError(message, transient='throttled' in message.lower())
+        return {
+            'lat': float(data['latt']),
+            'lon': float(data['longt']),
+            'confidence': float(data.get('standard', {}).get('confidence', 'nan')),
+        }
+
+
+class TableBackend:
+    """
+    Offline backend that looks addresses up in a table, e.g. for tests or
+    addresses that were geocoded by hand.
+
+    Parameters:
+    - table: Dictionary {address: (lat, lon) or (lat, lon, confidence)}.
+    """
+
+    name = 'table'
+
+    def __init__(self, table):
+        self.table = {normalise_address(address): value for address, value in table.items()}
+
+    def geocode(self, address):
+        value = self.table.get(normalise_address(address))
+        if value is None:
+            raise GeocodeError(f'{address!r} not in table')
+        lat, lon, confidence = (tuple(value) + (1.0,))[:3]
+        return {'lat': float(lat), 'lon': float(lon), 'confidence': float(confidence)}
+
+# -------------------------------------------------------------------------------
+# Cache and rate limiting
+# -------------------------------------------------------------------------------
+
+def normalise_address(address):
+    """
+    Cache key of an address: Unicode NFC, lower case, single spaces and no
+    spaces before commas, so 'Sven Hultins gata 6 , Göteborg' and
+    'sven hultins gata 6, göteborg' are geocoded once.
+    """
+    address = unicodedata.normalize('NFC', str(address)).lower()
+    address = re.sub(r'\s+', ' ', address).strip()
+    return re.sub(r'\s+,', ',', address)
+
+
+class GeocodeCache:
+    """
+    SQLite cache of geocoded addresses, keyed by backend, region and normalised address.
+
+    Only successful lookups are stored, so failed addresses are tried again on the next run.
+    """
+
+    def __init__(self, path='geocode_cache.db'):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS geocodes (
+                backend TEXT, region TEXT, address TEXT, lat REAL, lon REAL, confidence REAL, created REAL,
+                PRIMARY KEY (backend, region, address))
+        ''')
+        self.connection.commit()
+
+    def get_many(self, backend, region, addresses):
+        """Cached results {normalised address: result} of the addresses that are in the cache."""
+        found = {}
+        addresses = list(addresses)
+        with self.lock:
+            for i in range(0, len(addresses), 500):
+                chunk = addresses[i:i + 500]
+                rows = self.connection.execute(
+                    f'SELECT address, lat, lon, confidence FROM geocodes WHERE backend = ? AND region = ? '
+                    f'AND address IN ({",".join("?" * len(chunk))})', (backend, region, *chunk)).fetchall()
+                found.update({address: {'lat': lat, 'lon': lon, 'confidence': confidence}
+                              for address, lat, lon, confidence in rows})
+        return found
+
+    def put(self, backend, region, address, result):
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                    (backend, region, address, result['lat'], result['lon'],
+                                     result['confidence'], time.time()))
+            self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+class RateLimiter:
+    """Spaces out calls from all threads to at most `rate` per second."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+# -------------------------------------------------------------------------------
+# Batched geocoding
+# -------------------------------------------------------------------------------
+
+def _geocode_one(backend, address, limiter, retries, backoff):
+    for attempt in range(retries + 1):
+        limiter.wait()
+        try:
+            return backend.geocode(address), None
+        except GeocodeError as e:
+            if not e.transient or attempt == retries:
+                return None, str(e)
+        except Exception as e:
+            return None, str(e)
+        time.sleep(backoff * 2 ** attempt)
+
+
+def geocode_addresses(addresses, backend, cache_path='geocode_cache.db', max_workers=4, rate=1.0,
+                      retries=3, backoff=2.0):
+    """
+    Geocode a list of addresses.
+
+    Addresses are normalised and deduplicated, cached results are used as they
+    are, and only the remaining addresses are sent to the backend, from
+    max_workers threads at no more than `rate` requests per second in total.
+    Rate limits, timeouts and server errors are retried with exponential backoff.
+
+    Parameters:
+    - addresses: List of address strings.
+    - backend: GeocodeXYZ, TableBackend or any object with a name and a geocode(address) method.
+    - cache_path: SQLite cache file, None for no cache.
+    - max_workers: Number of concurrent requests.
+    - rate: Maximum requests per second (None for no limit).
+    - retries: Retries of transient errors.
+    - backoff: Seconds before the first retry, doubled for every next one.
+
+    Returns:
+    - List of dictionaries with address, lat, lon, confidence (None if it
+      failed) and error, in the order of the input.
+    """
+    keys = [normalise_address(address) for address in addresses]
+    region = getattr(backend, 'region', '')
+    cache = GeocodeCache(cache_path) if cache_path else None
+    try:
+        results = cache.get_many(backend.name, region, set(keys)) if cache else {}
+        todo = sorted({key: address for key, address in zip(keys, addresses) if key not in results}.items())
+        logger.info(f'{len(set(keys))} unique addresses, {len(results)} cached, {len(todo)} to geocode')
+
+        errors = {}
+        limiter = RateLimiter(rate)
+
+        def work(item):
+            key, address = item
+            result, error = _geocode_one(backend, address, limiter, retries, backoff)
+            if result is None:
+                errors[key] = error
+                return
+            results[key] = result
+            if cache:
+                cache.put(backend.name, region, key, result)
+
+        if todo:
+            with ThreadPoolExecutor(max_workers) as pool:
+                for done, _ in enumerate(pool.map(work, todo), 1):
+                    if done % 100 == 0:
+                        logger.info(f'{done} of {len(todo)} addresses geocoded')
+        if errors:
+            logger.warning(f'{len(errors)} addresses could not be geocoded')
+    finally:
+        if cache:
+            cache.close()
+
+    rows = []
+    for address, key in zip(addresses, keys):
+        result = results.get(key, {'lat': None, 'lon': None, 'confidence': None})
+        rows.append({'address': address, **result, 'error': errors.get(key)})
+    return rows
+
+
+def geocode_csv(input_file, output_file, backend, address_column='address', **kwargs):
+    """
+    Geocode the address column of a CSV file and write address, lat, lon and confidence.
+
+    Parameters:
+    - input_file: CSV file with an address column.
+    - output_file: CSV file to write.
+    - backend: See geocode_addresses.
+    - address_column: Name of the address column.
+    - kwargs: Passed to geocode_addresses (cache_path, max_workers, rate, ...).
+
+    Returns:
+    - List of result dictionaries.
+    """
+    with open(input_file, 'r', encoding='utf-8', newline='') as file:
+        addresses = [row[address_column] for row in csv.DictReader(file)]
+    rows = geocode_addresses(addresses, backend, **kwargs)
+    with open(output_file, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=RESULT_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
@@ -0,0 +1,116 @@
+# Author: Computational Sustainable Design group, Chalmers
+# Building footprints from a GeoJSON file as local x, y coordinates (e.g. for
+# Rhino): exterior rings are extracted with the vectorised shapely 2 API into
+# one flat coordinate array with ring offsets, and the origin is subtracted once.
+
+# -------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------
+
+import json                                         # For the JSON output
+import numpy as np                                  # For the coordinate arrays
+import shapely                                      # For vectorised geometry functions (shapely >= 2.0)
+import geopandas as gpd                             # For reading and reprojecting GeoJSON
+
+OUTPUT_EPSG = 3006                                  # SWEREF 99 TM
+POLYGON = 3                                         # shapely.get_type_id of polygons
+
+# -------------------------------------------------------------------------------
+# Extraction
+# -------------------------------------------------------------------------------
+
+class Rings:
+    """
+    Exterior rings of many footprints in flat arrays.
+
+    Ring i has the coordinates coords[offsets[i]:offsets[i + 1]] and belongs to
+    row feature[i] of the input (a MultiPolygon gives one ring per part).
+    """
+
+    def __init__(self, coords, offsets, feature, origin=(0.0, 0.0)):
+        self.coords = coords
+        self.offsets = offsets
+        self.feature = feature
+        self.origin = origin
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.coords[self.offsets[i]:self.offsets[i + 1]]
+
+    def to_list(self, decimals=3):
+        """Rings as nested lists [[[x, y], ...], ...], rounded to decimals (mm by default)."""
+        if len(self) == 0:
+            return []
+        rounded = np.round(self.coords, decimals)
+        return [ring.tolist() for ring in np.split(rounded, self.offsets[1:-1])]
+
+    def save_npz(self, path):
+        """
+        Compact binary output: float32 coordinates (exact to well below a mm once
+        the origin is subtracted), int64 offsets and feature indices, and the origin.
+        """
+        np.savez_compressed(path, coords=self.coords.astype(np.float32), offsets=self.offsets,
+                            feature=self.feature, origin=np.asarray(self.origin, dtype=np.float64))
+
+    def save_json(self, path, decimals=3):
+        """JSON output {"origin": [x, y], "buildings": [[[x, y], ...], ...]}."""
+        with open(path, 'w') as file:
+            json.dump({'origin': list(self.origin), 'buildings': self.to_list(decimals)}, file,
+                      separators=(',', ':'))
+
+    @classmethod
+    def load_npz(cls, path):
+        data = np.load(path)
+        return cls(data['coords'], data['offsets'], data['feature'], tuple(data['origin']))
+
+
+def exterior_rings(geometries, origin=(0.0, 0.0), closed=True):
+    """
+    Exterior rings of polygons and multipolygons as flat arrays.
+
+    Parameters:
+    - geometries: Array or GeoSeries of shapely geometries; other geometry types
+      and empty geometries are skipped.
+    - origin: (x, y) subtracted from every coordinate.
+    - closed: Keep the last point of every ring, which repeats the first.
+
+    Returns:
+    - Rings.
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    parts, feature = shapely.get_parts(geometries, return_index=True)
+    keep = (shapely.get_type_id(parts) == POLYGON) & ~shapely.is_empty(parts)
+    rings = shapely.get_exterior_ring(parts[keep])
+    feature = feature[keep]
+
+    coords = shapely.get_coordinates(rings)
+    counts = shapely.get_num_coordinates(rings)
+    if not closed:
+        ends = np.cumsum(counts) - 1
+        coords = np.delete(coords, ends, axis=0)
+        counts = counts - 1
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    coords = coords - np.asarray(origin, dtype=np.float64)
+    return Rings(coords, offsets, feature.astype(np.int64), tuple(origin))
+
+
+def footprints_xy(input_file, origin, output_epsg=OUTPUT_EPSG, closed=True):
+    """
+    Read a GeoJSON file of footprints, reproject it and return local coordinates.
+
+    Parameters:
+    - input_file: GeoJSON (or any file geopandas reads).
+    - origin: (x, y) of the local origin in the output CRS.
+    - output_epsg: EPSG code of the output CRS.
+    - closed: Keep the closing point of every ring.
+
+    Returns:
+    - Tuple with the GeoDataFrame (in the output CRS) and the Rings.
+    """
+    gdf = gpd.read_file(input_file)
+    if gdf.crs is not None and gdf.crs.to_epsg() != output_epsg:
+        gdf = gdf.to_crs(epsg=output_epsg)
+    return gdf, exterior_rings(gdf.geometry.values, origin, closed)
@@ -27,71 +27,73 @@ let dataSets;
 //const cityModelPath = '../Grasshopper Scripts/DTCC_CITYJSON_parser/CityModel.json'
 
 // Paths loaded through web worker (CSVs) need to be
-// relative to the worker directory (src/)
+// relative to the worker directory (src/). Binary files (.bin, written by
+// pipeline/binary_grids.py) are fetched from the page, so they are relative
+// to this directory.
 let dataSpecs = [
     {
         name: 'Option 0',
-        noisePath: '../data/noise/option_0_Lden.csv',
-        radiationPath: '../data/radiation/20230327_RadiationBaseCase.csv',
+        noisePath: './data/noise/option_0_Lden.bin',
+        radiationPath: './data/radiation/20230327_RadiationBaseCase.bin',
         windSurfaceCellPath: '../data/wind/Option_0/WindroseSurfaceCell_small.csv',
-        windSurfaceNodesPath: '../data/wind/Option_0/WindroseSurfaceNodes_small.csv'
+        windSurfaceNodesPath: './data/wind/Option_0/WindroseSurfaceNodes_small.bin'
     },
     {
         name: 'Option 1',
-        buildingOptionPath: './data/buildingOptions/option_1.stl',
+        buildingOptionPath: './data/buildingOptions/option_1.glb',
         energyPath: './data/energy/alt_1.csv',
-        noisePath: '../data/noise/option_1_Lden.csv',
-        radiationPath: '../data/radiation/20230328_RadiationOption1_10mgrid.csv',
+        noisePath: './data/noise/option_1_Lden.bin',
+        radiationPath: './data/radiation/20230328_RadiationOption1_10mgrid.bin',
         windSurfaceCellPath: '../data/wind/Option_1/WindroseSurfaceCell_small.csv',
-        windSurfaceNodesPath: '../data/wind/Option_1/WindroseSurfaceNodes_small.csv'
+        windSurfaceNodesPath: './data/wind/Option_1/WindroseSurfaceNodes_small.bin'
     },
     {
         name: 'Option 2',
-        buildingOptionPath: './data/buildingOptions/option_2.stl',
-        noisePath: '../data/noise/option_2_Lden.csv',
-        radiationPath: '../data/radiation/20230328_RadiationOption2_10mgrid.csv',
+        buildingOptionPath: './data/buildingOptions/option_2.glb',
+        noisePath: './data/noise/option_2_Lden.bin',
+        radiationPath: './data/radiation/20230328_RadiationOption2_10mgrid.bin',
         windSurfaceCellPath: '../data/wind/Option_2/WindroseSurfaceCell_small.csv',
-        windSurfaceNodesPath: '../data/wind/Option_2/WindroseSurfaceNodes_small.csv'
+        windSurfaceNodesPath: './data/wind/Option_2/WindroseSurfaceNodes_small.bin'
     },
     {
         name: 'Option 3',
-        buildingOptionPath: './data/buildingOptions/option_3.stl',
-        noisePath: '../data/noise/option_3_Lden.csv',
-        radiationPath: '../data/radiation/20230328_RadiationOption3_10mgrid.csv',
+        buildingOptionPath: './data/buildingOptions/option_3.glb',
+        noisePath: './data/noise/option_3_Lden.bin',
+        radiationPath: './data/radiation/20230328_RadiationOption3_10mgrid.bin',
         windSurfaceCellPath: '../data/wind/Option_3/WindroseSurfaceCell_small.csv',
-        windSurfaceNodesPath: '../data/wind/Option_3/WindroseSurfaceNodes_small.csv'
+        windSurfaceNodesPath: './data/wind/Option_3/WindroseSurfaceNodes_small.bin'
     },
     {
         name: 'Option 4',
-        buildingOptionPath: './data/buildingOptions/option_4.stl',
-        noisePath: '../data/noise/option_4_Lden.csv',
-        radiationPath: '../data/radiation/20230328_RadiationOption4_10mgrid.csv',
+        buildingOptionPath: './data/buildingOptions/option_4.glb',
+        noisePath: './data/noise/option_4_Lden.bin',
+        radiationPath: './data/radiation/20230328_RadiationOption4_10mgrid.bin',
         windSurfaceCellPath: '../data/wind/Option_4/WindroseSurfaceCell_small.csv',
-        windSurfaceNodesPath: '../data/wind/Option_4/WindroseSurfaceNodes_small.csv'
+        windSurfaceNodesPath: './data/wind/Option_4/WindroseSurfaceNodes_small.bin'
     },
     {
         name: 'Option 5',
-        buildingOptionPath: './data/buildingOptions/option_5.stl',
-        noisePath: '../data/noise/option_5_Lden.csv',
-        radiationPath: '../data/radiation/20230328_RadiationOption5_10mgrid.csv',
+        buildingOptionPath: './data/buildingOptions/option_5.glb',
+        noisePath: './data/noise/option_5_Lden.bin',
+        radiationPath: './data/radiation/20230328_RadiationOption5_10mgrid.bin',
         windSurfaceCellPath: '../data/wind/Option_5/WindroseSurfaceCell_small.csv',
-        windSurfaceNodesPath: '../data/wind/Option_5/WindroseSurfaceNodes_small.csv'
+        windSurfaceNodesPath: './data/wind/Option_5/WindroseSurfaceNodes_small.bin'
     },
     {
         name: 'Option 6',
-        buildingOptionPath: './data/buildingOptions/option_6.stl',
-        noisePath: '../data/noise/option_6_Lden.csv',
-        radiationPath: '../data/radiation/20230328_RadiationOption6_10mgrid.csv',
+        buildingOptionPath: './data/buildingOptions/option_6.glb',
+        noisePath: './data/noise/option_6_Lden.bin',
+        radiationPath: './data/radiation/20230328_RadiationOption6_10mgrid.bin',
         windSurfaceCellPath: '../data/wind/Option_6/WindroseSurfaceCell_small.csv',
-        windSurfaceNodesPath: '../data/wind/Option_6/WindroseSurfaceNodes_small.csv'
+        windSurfaceNodesPath: './data/wind/Option_6/WindroseSurfaceNodes_small.bin'
     },
     {
         name: 'Option 7',
-        buildingOptionPath: './data/buildingOptions/option_7.stl',
-        noisePath: '../data/noise/option_7_Lden.csv',
-        radiationPath: '../data/radiation/20230328_RadiationOption7_10mgrid.csv',
+        buildingOptionPath: './data/buildingOptions/option_7.glb',
+        noisePath: './data/noise/option_7_Lden.bin',
+        radiationPath: './data/radiation/20230328_RadiationOption7_10mgrid.bin',
         windSurfaceCellPath: '../data/wind/Option_7/WindroseSurfaceCell_small.csv',
-        windSurfaceNodesPath: '../data/wind/Option_7/WindroseSurfaceNodes_small.csv'
+        windSurfaceNodesPath: './data/wind/Option_7/WindroseSurfaceNodes_small.bin'
     }
 ]
 
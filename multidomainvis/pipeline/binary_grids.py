@@ -0,0 +1,361 @@
+# Author: Computational Sustainable Design group, Chalmers
+# Converts the multidomainvis CSV point grids into compact binary files that
+# the viewer can fetch directly (see src/BinaryLoader.js).
+
+# -------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------
+
+import argparse                                     # For the command line interface
+import glob                                         # For finding the datasets
+import json                                         # For the file header
+import logging                                      # For progress messages
+import os                                           # For file and directory operations
+import struct                                       # For the fixed size file prefix
+import numpy as np                                  # For the array operations
+import pandas as pd                                 # For fast CSV parsing
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('multidomainvis binary grids')
+
+# -------------------------------------------------------------------------------
+# File layout
+# -------------------------------------------------------------------------------
+#
+#   bytes 0-3   magic b'MDVG'
+#   bytes 4-7   uint32 little endian length of the JSON header
+#   header      utf-8 JSON, padded with spaces so the body starts on 8 bytes
+#   body        tiles (grids) or ids + positions (points)
+#
+# Grid tiles are stored row-major. Each tile holds a packed validity bitmask
+# (1 = value present, NaN cells are 0) followed by the values, both padded to
+# 4 bytes. Quantised values decode as offset + q * scale.
+
+MAGIC = b'MDVG'
+VERSION = 1
+DEFAULT_TILE_SIZE = 256
+UINT16_MAX = 65535
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+
+
+def _pad(length, multiple=4):
+    """Returns the number of bytes needed to pad length to a multiple."""
+    return (-length) % multiple
+
+
+def _pack_header(header):
+    """Serialises the header with the magic prefix, padded so the body is 8 byte aligned."""
+    text = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    text += b' ' * _pad(len(MAGIC) + 4 + len(text), 8)
+    return MAGIC + struct.pack('<I', len(text)) + text
+
+
+def _unpack_header(buffer):
+    """Returns the header dict and the body offset of a binary file buffer."""
+    if bytes(buffer[:4]) != MAGIC:
+        raise ValueError('Not a multidomainvis binary file (bad magic number)')
+    (length,) = struct.unpack('<I', bytes(buffer[4:8]))
+    header = json.loads(bytes(buffer[8:8 + length]).decode('utf-8'))
+    return header, 8 + length
+
+# -------------------------------------------------------------------------------
+# CSV reading
+# -------------------------------------------------------------------------------
+
+def read_point_csv(path):
+    """
+    Read a noise or radiation point CSV into numpy arrays.
+
+    Noise files have no header (x, y, value), radiation files have the header
+    x,y,value. NaN values are kept.
+
+    Parameters:
+    - path: Path to the CSV file.
+
+    Returns:
+    - Tuple of float64 arrays (x, y, value).
+    """
+    with open(path, 'r') as file:
+        has_header = not file.readline()[:1].lstrip('-').isdigit()
+    df = pd.read_csv(path, header=0 if has_header else None, names=['x', 'y', 'value'],
+                     dtype='float64', engine='c')
+    return df['x'].to_numpy(), df['y'].to_numpy(), df['value'].to_numpy()
+
+
+def infer_grid(x, y, tolerance=0.25):
+    """
+    Infer the regular grid that a set of scattered points lies on.
+
+    Parameters:
+    - x, y: Point coordinates.
+    - tolerance: Maximum allowed deviation from the grid, as a fraction of the spacing.
+
+    Returns:
+    - Tuple (origin, spacing, shape, rows, cols) where origin and spacing are
+      (x, y) pairs, shape is (n_rows, n_cols) and rows/cols index every point.
+    """
+    origin = []
+    spacing = []
+    indices = []
+    for values in (x, y):
+        unique = np.unique(values)
+        if len(unique) > 1:
+            steps = np.diff(unique)
+            step = np.median(steps[steps > 0])
+            # Average over the full extent to avoid accumulated rounding errors
+            n = np.rint((unique[-1] - unique[0]) / step)
+            step = (unique[-1] - unique[0]) / n
+        else:
+            step = 1.0
+        index = np.rint((values - unique[0]) / step)
+        if np.max(np.abs((values - unique[0]) / step - index)) > tolerance:
+            raise ValueError('Points do not lie on a regular grid')
+        origin.append(float(unique[0]))
+        spacing.append(float(step))
+        indices.append(index.astype(np.int64))
+    cols, rows = indices
+    shape = (int(rows.max()) + 1, int(cols.max()) + 1)
+    return tuple(origin), tuple(spacing), shape, rows, cols
+
+
+def points_to_raster(x, y, value):
+    """
+    Place scattered grid points into a dense raster, missing cells are NaN.
+
+    Returns:
+    - Tuple (raster, origin, spacing) with raster of shape (n_rows, n_cols).
+    """
+    origin, spacing, shape, rows, cols = infer_grid(x, y)
+    raster = np.full(shape, np.nan, dtype=np.float64)
+    raster[rows, cols] = value
+    return raster, origin, spacing
+
+# -------------------------------------------------------------------------------
+# Encoding and decoding
+# -------------------------------------------------------------------------------
+
+def encode_grid(raster, origin, spacing, quantise=True, tile_size=DEFAULT_TILE_SIZE, attributes=None):
+    """
+    Encode a dense raster as a tiled binary grid.
+
+    Parameters:
+    - raster: 2D array (n_rows, n_cols), NaN marks missing cells.
+    - origin: (x, y) of cell (0, 0).
+    - spacing: (dx, dy) grid spacing.
+    - quantise: Store values as uint16 with scale/offset instead of float32.
+    - tile_size: Number of cells along each tile edge.
+    - attributes: Optional dict stored in the header (e.g. the source file).
+
+    Returns:
+    - The encoded file as bytes.
+    """
+    raster = np.asarray(raster, dtype=np.float64)
+    valid = ~np.isnan(raster)
+    header = {
+        'version': VERSION,
+        'kind': 'grid',
+        'origin': [float(origin[0]), float(origin[1])],
+        'spacing': [float(spacing[0]), float(spacing[1])],
+        'shape': [int(raster.shape[0]), int(raster.shape[1])],
+        'dtype': 'uint16' if quantise else 'float32',
+        'scale': 1.0,
+        'offset': 0.0,
+        'min': float(np.nanmin(raster)) if valid.any() else None,
+        'max': float(np.nanmax(raster)) if valid.any() else None,
+        'count': int(valid.sum()),
+        'tileSize': int(tile_size),
+        'tiles': [],
+        'attributes': attributes or {},
+    }
+
+    if quantise:
+        vmin = header['min'] if header['min'] is not None else 0.0
+        vmax = header['max'] if header['max'] is not None else 0.0
+        scale = (vmax - vmin) / (UINT16_MAX - 1) if vmax > vmin else 1.0
+        header['scale'] = scale
+        header['offset'] = vmin
+        encoded = np.zeros(raster.shape, dtype='<u2')
+        encoded[valid] = np.rint((raster[valid] - vmin) / scale).astype('<u2')
+    else:
+        encoded = np.where(valid, raster, np.nan).astype('<f4')
+
+    chunks = []
+    position = 0
+    for row in range(0, raster.shape[0], tile_size):
+        for col in range(0, raster.shape[1], tile_size):
+            tile_valid = valid[row:row + tile_size, col:col + tile_size]
+            mask = np.packbits(tile_valid.ravel(), bitorder='little').tobytes()
+            mask += b'\0' * _pad(len(mask))
+            values = np.ascontiguousarray(encoded[row:row + tile_size, col:col + tile_size]).tobytes()
+            values += b'\0' * _pad(len(values))
+            header['tiles'].append({
+                'row': row, 'col': col, 'shape': list(tile_valid.shape),
+                'maskOffset': position, 'valueOffset': position + len(mask),
+                'byteLength': len(mask) + len(values),
+            })
+            chunks.extend([mask, values])
+            position += len(mask) + len(values)
+
+    return _pack_header(header) + b''.join(chunks)
+
+
+def decode_grid(buffer):
+    """
+    Decode a binary grid back into a dense float32 raster.
+
+    Returns:
+    - Tuple (raster, header); missing cells are NaN.
+    """
+    header, body = _unpack_header(buffer)
+    if header['kind'] != 'grid':
+        raise ValueError('Expected a grid file, got {}'.format(header['kind']))
+    dtype = np.dtype('<u2') if header['dtype'] == 'uint16' else np.dtype('<f4')
+    raster = np.full(header['shape'], np.nan, dtype=np.float32)
+    for tile in header['tiles']:
+        rows, cols = tile['shape']
+        n = rows * cols
+        mask = np.unpackbits(np.frombuffer(buffer, np.uint8, (n + 7) // 8, body + tile['maskOffset']),
+                             count=n, bitorder='little').astype(bool).reshape(rows, cols)
+        values = np.frombuffer(buffer, dtype, n, body + tile['valueOffset']).reshape(rows, cols)
+        values = values.astype(np.float32) * np.float32(header['scale']) + np.float32(header['offset'])
+        block = raster[tile['row']:tile['row'] + rows, tile['col']:tile['col'] + cols]
+        block[mask] = values[mask]
+    return raster, header
+
+
+def encode_points(ids, xyz, attributes=None):
+    """
+    Encode scattered nodes (e.g. wind surface nodes) as ids and float32 positions.
+
+    Positions are stored relative to the minimum corner so that float32 keeps
+    centimetre precision for SWEREF99 coordinates.
+
+    Parameters:
+    - ids: Integer node ids.
+    - xyz: Array of shape (n, 3).
+    - attributes: Optional dict stored in the header.
+
+    Returns:
+    - The encoded file as bytes.
+    """
+    xyz = np.asarray(xyz, dtype=np.float64)
+    origin = xyz.min(axis=0)
+    header = {
+        'version': VERSION,
+        'kind': 'points',
+        'count': int(len(xyz)),
+        'origin': [float(v) for v in origin],
+        'idOffset': 0,
+        'positionOffset': 4 * len(xyz),
+        'attributes': attributes or {},
+    }
+    body = np.asarray(ids, dtype='<u4').tobytes() + (xyz - origin).astype('<f4').tobytes()
+    return _pack_header(header) + body
+
+
+def decode_points(buffer):
+    """Decode a binary points file into (ids, xyz, header), xyz in float64 world coordinates."""
+    header, body = _unpack_header(buffer)
+    if header['kind'] != 'points':
+        raise ValueError('Expected a points file, got {}'.format(header['kind']))
+    n = header['count']
+    ids = np.frombuffer(buffer, '<u4', n, body + header['idOffset'])
+    xyz = np.frombuffer(buffer, '<f4', n * 3, body + header['positionOffset']).reshape(n, 3)
+    return ids, xyz.astype(np.float64) + np.asarray(header['origin']), header
+
+
+def read_binary(path):
+    """Read and decode a binary grid or points file from disk."""
+    with open(path, 'rb') as file:
+        buffer = file.read()
+    header, _ = _unpack_header(buffer)
+    if header['kind'] == 'grid':
+        return decode_grid(buffer)
+    return decode_points(buffer)
+
+
+def write_atomic(path, data):
+    """Write bytes to a temporary file and move it into place."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(data)
+    os.replace(tmp_path, path)
+
+# -------------------------------------------------------------------------------
+# Dataset conversion
+# -------------------------------------------------------------------------------
+
+def convert_point_grid(csv_path, out_path=None, quantise=True, tile_size=DEFAULT_TILE_SIZE):
+    """
+    Convert a noise or radiation CSV into a binary grid next to it.
+
+    Returns:
+    - Path to the written .bin file.
+    """
+    out_path = out_path or os.path.splitext(csv_path)[0] + '.bin'
+    x, y, value = read_point_csv(csv_path)
+    raster, origin, spacing = points_to_raster(x, y, value)
+    data = encode_grid(raster, origin, spacing, quantise=quantise, tile_size=tile_size,
+                       attributes={'source': os.path.basename(csv_path)})
+    write_atomic(out_path, data)
+    logger.info(f'{csv_path}: {os.path.getsize(csv_path)} -> {len(data)} bytes')
+    return out_path
+
+
+def convert_wind_nodes(csv_path, out_path=None):
+    """
+    Convert a WindroseSurfaceNodes CSV (ID,x,y,z) into a binary points file.
+
+    Returns:
+    - Path to the written .bin file.
+    """
+    out_path = out_path or os.path.splitext(csv_path)[0] + '.bin'
+    df = pd.read_csv(csv_path)
+    # Some exports (Option_7) leave the id column header empty
+    df = df.rename(columns={df.columns[0]: 'ID'}).astype({'ID': 'int64', 'x': 'float64', 'y': 'float64', 'z': 'float64'})
+    data = encode_points(df['ID'].to_numpy(), df[['x', 'y', 'z']].to_numpy(),
+                         attributes={'source': os.path.basename(csv_path)})
+    write_atomic(out_path, data)
+    logger.info(f'{csv_path}: {os.path.getsize(csv_path)} -> {len(data)} bytes')
+    return out_path
+
+
+def convert_all(data_dir=DATA_DIR, quantise=True, tile_size=DEFAULT_TILE_SIZE, wind=True):
+    """
+    Convert every noise, radiation and (optionally) wind node dataset in data_dir.
+
+    Returns:
+    - List of written file paths.
+    """
+    written = []
+    for csv_path in sorted(glob.glob(os.path.join(data_dir, 'noise', 'option_*_Lden.csv')) +
+                           glob.glob(os.path.join(data_dir, 'radiation', '*.csv'))):
+        written.append(convert_point_grid(csv_path, quantise=quantise, tile_size=tile_size))
+    if wind:
+        for csv_path in sorted(glob.glob(os.path.join(data_dir, 'wind', 'Option_*', 'WindroseSurfaceNodes*.csv'))):
+            written.append(convert_wind_nodes(csv_path))
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert multidomainvis CSV grids into binary tiles.')
+    parser.add_argument('paths', nargs='*', help='CSV files to convert (default: all datasets in data/)')
+    parser.add_argument('--data-dir', default=DATA_DIR, help='Data directory used when no paths are given')
+    parser.add_argument('--float32', action='store_true', help='Store float32 values instead of quantised uint16')
+    parser.add_argument('--tile-size', type=int, default=DEFAULT_TILE_SIZE, help='Cells per tile edge')
+    parser.add_argument('--no-wind', action='store_true', help='Skip the wind surface node files')
+    args = parser.parse_args()
+
+    if not args.paths:
+        convert_all(args.data_dir, quantise=not args.float32, tile_size=args.tile_size, wind=not args.no_wind)
+        return
+    for path in args.paths:
+        if 'WindroseSurfaceNodes' in os.path.basename(path):
+            convert_wind_nodes(path)
+        else:
+            convert_point_grid(path, quantise=not args.float32, tile_size=args.tile_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,344 @@
+# Author: Computational Sustainable Design group, Chalmers
+# Samples the noise and radiation grids of every design option on the surfaces
+# of the option buildings and writes per-building aggregates, so the domains
+# can be compared building by building instead of only visually.
+
+# -------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------
+
+import argparse                                     # For the command line interface
+import glob                                         # For finding the datasets
+import hashlib                                      # For recognising grids that share their points
+import logging                                      # For progress messages
+import os                                           # For file and directory operations
+import re                                           # For option numbers in file names
+import numpy as np                                  # For the array operations
+import pandas as pd                                 # For the output table
+from scipy.sparse import coo_matrix                 # For splitting meshes into buildings
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree                   # For the nearest grid points
+from binary_grids import DATA_DIR, infer_grid, read_point_csv, write_atomic
+from gltf_assets import CITY_ORIGIN, read_stl, weld
+from option_diffs import DOMAINS, register_base
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('multidomainvis building samples')
+
+# Coordinate frame of every domain: noise is in SWEREF99 and is moved by the
+# city origin, radiation is already relative to the city origin (its base case
+# is registered first with the base_frame of option_diffs.DOMAINS)
+FRAMES = {'noise': 'sweref99', 'radiation': 'local'}
+# Surfaces by the z component of their normal
+SURFACES = {
+    'all': lambda nz: np.ones(len(nz), dtype=bool),
+    'roof': lambda nz: nz > 0.5,
+    'facade': lambda nz: np.abs(nz) <= 0.5,
+    'footprint': lambda nz: nz < -0.5,
+}
+STATISTICS = ['samples', 'area', 'mean', 'min', 'max']
+# Absolute values of difference domains (option delta plus base) that are
+# slightly negative come from the option and base simulations not agreeing
+# exactly, or from grids of different resolution, and are clipped to 0. Values
+# below this fraction of the base maximum mean the grids are not in one frame.
+NEGATIVE_TOLERANCE = 0.02
+
+# -------------------------------------------------------------------------------
+# Grids
+# -------------------------------------------------------------------------------
+
+class Grid:
+    """
+    A noise or radiation point grid in the local frame, with its KD-tree.
+
+    Grids with the same points (e.g. all noise options) share one tree, so
+    the samples are queried once for all of them.
+    """
+
+    _trees = {}                                     # coordinate digest -> cKDTree
+    _cache = {}                                     # (path, size, mtime) -> Grid
+
+    def __init__(self, path, domain, option, origin=(0.0, 0.0), frame=None):
+        x, y, self.values = read_point_csv(path)
+        x, y = register_base(x, y, frame)
+        self.xy = np.column_stack([x - origin[0], y - origin[1]])
+        self.path = path
+        self.domain = domain
+        self.option = option
+        _, spacing, _, _, _ = infer_grid(x, y)
+        self.spacing = max(spacing)
+        self.key = hashlib.sha1(np.ascontiguousarray(np.round(self.xy, 3)).tobytes()).hexdigest()
+
+    @property
+    def tree(self):
+        """KD-tree of the grid points, built once per distinct set of points."""
+        if self.key not in Grid._trees:
+            Grid._trees[self.key] = cKDTree(self.xy)
+        return Grid._trees[self.key]
+
+    @classmethod
+    def load(cls, path, domain, option, origin=(0.0, 0.0), frame=None):
+        """Read a grid, or return it from the cache if the file has not changed since."""
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, tuple(origin), frame)
+        if key not in cls._cache:
+            cls._cache[key] = cls(path, domain, option, origin, frame)
+        return cls._cache[key]
+
+
+def find_grids(data_dir=DATA_DIR, domains=DOMAINS, city_origin=CITY_ORIGIN):
+    """
+    Every base case and option grid of every domain.
+
+    Returns:
+    - List of Grid, the base case of each domain as option 0.
+    """
+    grids = []
+    for domain, config in domains.items():
+        origin = city_origin if FRAMES.get(domain) == 'sweref99' else (0.0, 0.0)
+        base = glob.glob(os.path.join(data_dir, config['base']))
+        if base:
+            grids.append(Grid.load(base[0], domain, 0, origin, config.get('base_frame')))
+        for path in sorted(glob.glob(os.path.join(data_dir, config['options']))):
+            if base and os.path.abspath(path) == os.path.abspath(base[0]):
+                continue
+            option = int(re.search(config['option_regex'], os.path.basename(path)).group(1))
+            grids.append(Grid.load(path, domain, option, origin))
+    return grids
+
+# -------------------------------------------------------------------------------
+# Sample points
+# -------------------------------------------------------------------------------
+
+def split_buildings(triangles, tolerance=1e-3):
+    """
+    Building index of every triangle, from the connected parts of the welded mesh.
+
+    Returns:
+    - Integer array (n_triangles,).
+    """
+    positions, indices = weld(triangles, tolerance)
+    rows = np.repeat(indices[:, 0], 2)
+    cols = indices[:, 1:].ravel()
+    graph = coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(len(positions),) * 2)
+    _, labels = connected_components(graph, directed=False)
+    # Number the buildings in order of their first triangle
+    _, first, building = np.unique(labels[indices[:, 0]], return_index=True, return_inverse=True)
+    return np.argsort(np.argsort(first))[building]
+
+
+def _lattice(n):
+    """Barycentric centroids of the n * n sub triangles of a triangle."""
+    i, j = np.meshgrid(np.arange(n), np.arange(n), indexing='ij')
+    up = i + j <= n - 1
+    down = i + j <= n - 2
+    a = np.concatenate([i[up] + 1 / 3, i[down] + 2 / 3]) / n
+    b = np.concatenate([j[up] + 1 / 3, j[down] + 2 / 3]) / n
+    return np.column_stack([1 - a - b, a, b])
+
+
+def surface_samples(triangles, spacing=2.0):
+    """
+    Points spread over the triangles at about the given spacing.
+
+    Every triangle is split into n * n equal sub triangles, with n chosen from
+    its longest edge, and sampled at their centroids.
+
+    Returns:
+    - Tuple (points (m, 3), triangle index (m,), area weight (m,)).
+    """
+    edges = np.linalg.norm(triangles - np.roll(triangles, 1, axis=1), axis=2).max(axis=1)
+    area = 0.5 * np.linalg.norm(np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0]),
+                                axis=1)
+    subdivisions = np.maximum(np.ceil(edges / spacing), 1).astype(np.int64)
+    points, owner, weight = [], [], []
+    for n in np.unique(subdivisions):
+        selected = np.flatnonzero(subdivisions == n)
+        barycentric = _lattice(n)
+        points.append(np.einsum('sk,tkd->tsd', barycentric, triangles[selected]).reshape(-1, 3))
+        owner.append(np.repeat(selected, len(barycentric)))
+        weight.append(np.repeat(area[selected] / (n * n), len(barycentric)))
+    if not points:
+        return np.empty((0, 3)), np.empty(0, dtype=np.int64), np.empty(0)
+    return np.concatenate(points), np.concatenate(owner), np.concatenate(weight)
+
+# -------------------------------------------------------------------------------
+# Sampling
+# -------------------------------------------------------------------------------
+
+def sample_grids(grids, xy, k=4, max_distance=None):
+    """
+    Values of many grids at the same points.
+
+    Grids that share their points are queried together with one vectorised
+    KD-tree query. Every sample takes the inverse distance weighted mean of
+    its k nearest grid points that are within max_distance and not NaN, so
+    points inside a building take the values around it.
+
+    Parameters:
+    - grids: List of Grid.
+    - xy: Array (m, 2) of sample points in the local frame.
+    - k: Number of nearest grid points.
+    - max_distance: Largest distance to a grid point (default: twice the grid spacing).
+
+    Returns:
+    - Array (m, len(grids)), NaN where no grid point was found.
+    """
+    values = np.full((len(xy), len(grids)), np.nan)
+    groups = {}
+    for column, grid in enumerate(grids):
+        groups.setdefault(grid.key, []).append(column)
+    for columns in groups.values():
+        grid = grids[columns[0]]
+        limit = max_distance if max_distance is not None else 2.0 * grid.spacing
+        distance, nearest = grid.tree.query(xy, k=k, distance_upper_bound=limit)
+        distance, nearest = distance.reshape(len(xy), -1), nearest.reshape(len(xy), -1)
+        found = np.isfinite(distance)
+        nearest = np.where(found, nearest, 0)
+        weight = np.where(found, 1.0 / np.maximum(distance, 1e-6), 0.0)
+        # (samples, k, grids of the group)
+        stacked = np.stack([grids[c].values for c in columns], axis=1)[nearest]
+        w = np.where(np.isnan(stacked), 0.0, weight[:, :, None])
+        total = w.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values[:, columns] = np.where(total > 0, (w * np.nan_to_num(stacked)).sum(axis=1) / total, np.nan)
+    return values
+
+
+def aggregate(values, building, weight, n_buildings):
+    """
+    Area weighted statistics of the sampled values per building.
+
+    Returns:
+    - Dictionary {statistic: array (n_buildings, n_grids)}, see STATISTICS.
+    """
+    valid = ~np.isnan(values)
+    w = np.where(valid, weight[:, None], 0.0)
+    shape = (n_buildings, values.shape[1])
+    samples, area, total = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+    np.add.at(samples, building, valid)
+    np.add.at(area, building, w)
+    np.add.at(total, building, w * np.nan_to_num(values))
+    low, high = np.full(shape, np.inf), np.full(shape, -np.inf)
+    np.minimum.at(low, building, np.where(valid, values, np.inf))
+    np.maximum.at(high, building, np.where(valid, values, -np.inf))
+    empty = samples == 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(empty, np.nan, total / area)
+    return {'samples': samples, 'area': area, 'mean': mean,
+            'min': np.where(empty, np.nan, low), 'max': np.where(empty, np.nan, high)}
+
+
+def sample_buildings(stl_path, grids, surface='all', spacing=2.0, k=4, max_distance=None,
+                     city_origin=CITY_ORIGIN, domains=DOMAINS):
+    """
+    Per-building statistics of every grid on the buildings of one STL.
+
+    For domains whose option files hold differences to the base case
+    (radiation), the base values are added so the statistics are of absolute
+    values, clipped to 0 (see NEGATIVE_TOLERANCE); the difference to the base
+    case is in the delta column.
+
+    Parameters:
+    - stl_path: Building option STL (SWEREF99 coordinates).
+    - grids: List of Grid, e.g. from find_grids.
+    - surface: 'all', 'roof', 'facade' or 'footprint' (see SURFACES).
+    - spacing: Distance between sample points on the surfaces [m].
+    - k, max_distance: See sample_grids.
+    - city_origin: SWEREF99 (x, y) of the local frame.
+    - domains: Domain configurations (for is_difference).
+
+    Returns:
+    - DataFrame with one row per building and grid.
+    """
+    triangles = read_stl(stl_path)
+    building = split_buildings(triangles)
+    normal = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    nz = normal[:, 2] / np.maximum(np.linalg.norm(normal, axis=1), 1e-12)
+    keep = SURFACES[surface](nz)
+    points, owner, weight = surface_samples(triangles[keep], spacing)
+    owner = building[keep][owner]
+    xy = points[:, :2] - np.asarray(city_origin)
+    n_buildings = int(building.max()) + 1 if len(building) else 0
+
+    values = sample_grids(grids, xy, k, max_distance)
+    delta = np.full_like(values, np.nan)
+    base = {grid.domain: column for column, grid in enumerate(grids) if grid.option == 0}
+    for column, grid in enumerate(grids):
+        if grid.domain not in base:
+            continue
+        if domains[grid.domain]['is_difference'] and grid.option != 0:
+            base_values = values[:, base[grid.domain]]
+            absolute = values[:, column] + base_values
+            lowest = np.nanmin(absolute, initial=0.0)
+            if lowest < -NEGATIVE_TOLERANCE * np.nanmax(base_values, initial=0.0):
+                raise ValueError(f'{grid.path}: absolute {grid.domain} down to {lowest:.2f}, '
+                                 f'the option and base grids are not in the same frame')
+            delta[:, column] = values[:, column]
+            values[:, column] = np.maximum(absolute, 0.0)
+            assert not (values[:, column] < 0).any()
+        else:
+            delta[:, column] = values[:, column] - values[:, base[grid.domain]]
+    stats = aggregate(values, owner, weight, n_buildings)
+    delta_mean = aggregate(delta, owner, weight, n_buildings)['mean']
+
+    rows = []
+    for b in range(n_buildings):
+        for column, grid in enumerate(grids):
+            row = {'building': b, 'domain': grid.domain, 'option': grid.option}
+            row.update({name: stats[name][b, column] for name in STATISTICS})
+            row['delta'] = delta_mean[b, column]
+            rows.append(row)
+    frame = pd.DataFrame(rows)
+    frame['samples'] = frame['samples'].astype(np.int64)
+    logger.info(f'{stl_path}: {n_buildings} buildings, {len(points)} samples, {len(grids)} grids')
+    return frame
+
+
+def sample_all(data_dir=DATA_DIR, out_path=None, surface='all', spacing=2.0, k=4, max_distance=None,
+               cross=False):
+    """
+    Sample the grids on the buildings of every option and write one CSV
+    (default: data/buildings/building_samples.csv) with the columns
+    buildingOption, building, domain, option, samples, area, mean, min, max, delta.
+
+    The buildings of option_<n>.stl are sampled on the grids of option n and
+    of the base case (option 0). With cross, every option STL is sampled on
+    the grids of every option.
+
+    Returns:
+    - DataFrame.
+    """
+    out_path = out_path or os.path.join(data_dir, 'buildings', 'building_samples.csv')
+    grids = find_grids(data_dir)
+    frames = []
+    for stl_path in sorted(glob.glob(os.path.join(data_dir, 'buildingOptions', 'option_*.stl'))):
+        building_option = int(re.search(r'option_(\d+)', os.path.basename(stl_path)).group(1))
+        selected = [grid for grid in grids if cross or grid.option in (0, building_option)]
+        frame = sample_buildings(stl_path, selected, surface, spacing, k, max_distance)
+        frame.insert(0, 'buildingOption', building_option)
+        frames.append(frame)
+    result = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    write_atomic(out_path, result.to_csv(index=False, float_format='%.3f').encode('utf-8'))
+    logger.info(f'{out_path}: {len(result)} rows')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-building noise and radiation statistics for multidomainvis.')
+    parser.add_argument('--data-dir', default=DATA_DIR, help='multidomainvis data folder')
+    parser.add_argument('--out', default=None, help='Output CSV (default: data/buildings/building_samples.csv)')
+    parser.add_argument('--surface', default='all', choices=sorted(SURFACES), help='Surfaces to sample')
+    parser.add_argument('--spacing', type=float, default=2.0, help='Distance between sample points [m]')
+    parser.add_argument('--k', type=int, default=4, help='Nearest grid points per sample')
+    parser.add_argument('--max-distance', type=float, default=None,
+                        help='Largest distance to a grid point [m] (default: twice the grid spacing)')
+    parser.add_argument('--cross', action='store_true',
+                        help='Sample every option STL on the grids of every option, not only its own and the base case')
+    args = parser.parse_args()
+    sample_all(args.data_dir, args.out, args.surface, args.spacing, args.k, args.max_distance, args.cross)
+
+
+if __name__ == '__main__':
+    main()
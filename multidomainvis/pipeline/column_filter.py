@@ -0,0 +1,212 @@
+# Author: Computational Sustainable Design group, Chalmers
+# Streaming CSV column projector for the wind, noise and radiation datasets.
+# Replaces data/wind/removecols.py.
+
+# -------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------
+
+import argparse                                     # For the command line interface
+import csv                                          # For quoted lines
+import glob                                         # For finding the option folders
+import io                                           # For re-quoting quoted lines
+import logging                                      # For progress messages
+import os                                           # For file and directory operations
+import time                                         # For throughput logging
+from concurrent.futures import ProcessPoolExecutor  # For processing options in parallel
+from operator import itemgetter                     # For fast column selection
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('multidomainvis column filter')
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+CHUNK_SIZE = 16 * 1024 * 1024  # bytes read per chunk
+
+# Node columns plus one comfort criterion, as used by src/windDataWorker.js
+WIND_NODE_COLUMNS = ['node 1', 'node 2', 'node 3']
+WIND_PRESETS = {
+    'davenport': WIND_NODE_COLUMNS + ['Davenport'],
+    'lawson': WIND_NODE_COLUMNS + ['Lawson'],
+    'nen8100': WIND_NODE_COLUMNS + ['NEN8100'],
+}
+
+# -------------------------------------------------------------------------------
+# Column resolution
+# -------------------------------------------------------------------------------
+
+def resolve_columns(header, columns):
+    """
+    Resolve requested columns to indices in the header.
+
+    A column can be given as an integer index, an exact name or a
+    case-insensitive name prefix ('Lawson' matches 'Lawson LDDC').
+
+    Parameters:
+    - header: List of column names, or None for files without a header.
+    - columns: List of names or indices.
+
+    Returns:
+    - List of integer indices.
+    """
+    indices = []
+    for column in columns:
+        if isinstance(column, int) or (isinstance(column, str) and column.isdigit()):
+            indices.append(int(column))
+            continue
+        if header is None:
+            raise ValueError(f'Cannot select column {column!r} by name in a file without a header')
+        if column in header:
+            indices.append(header.index(column))
+            continue
+        matches = [i for i, name in enumerate(header) if name.lower().startswith(column.lower())]
+        if len(matches) != 1:
+            raise ValueError(f'Column {column!r} matches {len(matches)} columns in {header}')
+        indices.append(matches[0])
+    return indices
+
+# -------------------------------------------------------------------------------
+# Projection
+# -------------------------------------------------------------------------------
+
+def _project_lines(lines, getter, single):
+    """Project a list of raw lines (bytes, no newline) to the selected columns."""
+    if any(b'"' in line for line in lines):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        for row in csv.reader(line.decode('utf-8') for line in lines):
+            writer.writerow([getter(row)] if single else getter(row))
+        return buffer.getvalue().rstrip('\n').encode('utf-8').split(b'\n')
+    if single:
+        return [getter(line.split(b',')) for line in lines]
+    return [b','.join(getter(line.split(b','))) for line in lines]
+
+
+def project_file(src_path, dst_path, columns, header=True, chunk_size=CHUNK_SIZE):
+    """
+    Copy the selected columns of a CSV file to a new file.
+
+    The file is read in large binary chunks and each chunk is split into
+    lines at once, so values are copied byte for byte without parsing. The
+    output is written to a temporary file and moved into place when complete,
+    so re-runs replace the previous output and an interrupted run leaves no
+    partial file. Fields must not contain embedded newlines.
+
+    Parameters:
+    - src_path: Input CSV.
+    - dst_path: Output CSV (may not be the input).
+    - columns: Column names or indices to keep, in output order.
+    - header: Whether the first line is a header.
+    - chunk_size: Number of bytes read per chunk.
+
+    Returns:
+    - Number of data rows written.
+    """
+    if os.path.abspath(src_path) == os.path.abspath(dst_path):
+        raise ValueError('Output path must differ from the input path')
+    start = time.perf_counter()
+    tmp_path = dst_path + '.tmp'
+    n_rows = 0
+    try:
+        with open(src_path, 'rb') as fr, open(tmp_path, 'wb') as fw:
+            first = fr.readline()
+            names = None
+            if header:
+                names = [name.strip().strip('"') for name in first.rstrip(b'\r\n').decode('utf-8-sig').split(',')]
+                indices = resolve_columns(names, columns)
+                fw.write(','.join(names[i] for i in indices).encode('utf-8') + b'\n')
+                remainder = b''
+            else:
+                indices = resolve_columns(None, columns)
+                remainder = first
+            getter = itemgetter(*indices)
+            single = len(indices) == 1
+
+            while True:
+                chunk = fr.read(chunk_size)
+                if not chunk:
+                    break
+                chunk = remainder + chunk
+                end = chunk.rfind(b'\n')
+                if end == -1:
+                    remainder = chunk
+                    continue
+                remainder = chunk[end + 1:]
+                lines = chunk[:end].replace(b'\r', b'').split(b'\n')
+                lines = [line for line in lines if line]
+                if lines:
+                    fw.write(b'\n'.join(_project_lines(lines, getter, single)) + b'\n')
+                    n_rows += len(lines)
+            remainder = remainder.strip(b'\r\n')
+            if remainder:
+                fw.write(b'\n'.join(_project_lines([remainder], getter, single)) + b'\n')
+                n_rows += 1
+        os.replace(tmp_path, dst_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    elapsed = time.perf_counter() - start
+    size_mb = os.path.getsize(src_path) / 1e6
+    logger.info(f'{src_path} -> {dst_path}: {n_rows} rows, {size_mb:.1f} MB in {elapsed:.2f} s')
+    return n_rows
+
+
+def _project_job(args):
+    """Unpacks arguments for project_file in worker processes."""
+    return project_file(*args)
+
+
+def project_options(data_dir, filename, out_filename, columns, header=True, workers=None):
+    """
+    Run project_file for the same file in every Option_* folder in parallel.
+
+    Parameters:
+    - data_dir: Directory containing the Option_* folders (e.g. data/wind).
+    - filename: Input file name or glob inside each option folder.
+    - out_filename: Output file name inside each option folder.
+    - columns: Column names or indices to keep.
+    - header: Whether the files have a header line.
+    - workers: Number of processes (default: one per CPU).
+
+    Returns:
+    - Dictionary mapping output paths to the number of rows written.
+    """
+    jobs = []
+    for option_dir in sorted(glob.glob(os.path.join(data_dir, 'Option_*'))):
+        for src_path in sorted(glob.glob(os.path.join(option_dir, filename))):
+            jobs.append((src_path, os.path.join(option_dir, out_filename), columns, header))
+    if not jobs:
+        logger.warning(f'No files matching {filename} in {data_dir}/Option_*')
+        return {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        counts = list(pool.map(_project_job, jobs))
+    return {job[1]: count for job, count in zip(jobs, counts)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Keep selected columns of large CSV files.')
+    parser.add_argument('paths', nargs='*', help='CSV files to filter, given before the options (default: the wind cells of every option)')
+    parser.add_argument('-c', '--columns', nargs='+', help='Column names or indices to keep')
+    parser.add_argument('-p', '--preset', choices=sorted(WIND_PRESETS), default='lawson',
+                        help='Wind comfort criterion to keep when --columns is not given')
+    parser.add_argument('--no-header', action='store_true', help='Files have no header line (select by index)')
+    parser.add_argument('--suffix', default='_small', help='Suffix appended to the output file names')
+    parser.add_argument('--data-dir', default=os.path.join(DATA_DIR, 'wind'), help='Folder with the Option_* folders')
+    parser.add_argument('--input', default='WindroseSurfaceCell.csv', help='File name inside each Option_* folder')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='Number of parallel processes')
+    args = parser.parse_args()
+
+    columns = args.columns or WIND_PRESETS[args.preset]
+    header = not args.no_header
+
+    if not args.paths:
+        stem, ext = os.path.splitext(args.input)
+        project_options(args.data_dir, args.input, stem + args.suffix + ext, columns, header, args.workers)
+        return
+    jobs = [(path, '{0}{2}{1}'.format(*os.path.splitext(path), args.suffix), columns, header) for path in args.paths]
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        list(pool.map(_project_job, jobs))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+# Author: Computational Sustainable Design group, Chalmers
+# Exports the energy results of an IDF simulation sweep to the per-option
+# building energy files of the viewer (data/energy/alt_<option>.csv), by
+# joining the runs to building UUIDs and option numbers through a mapping table.
+
+# -------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------
+
+import argparse                                     # For the command line interface
+import logging                                      # For progress messages
+import os                                           # For file and directory operations
+import sqlite3                                      # For reading the result store
+import numpy as np                                  # For the hourly series
+import pandas as pd                                 # For the tables
+from binary_grids import DATA_DIR, write_atomic
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('multidomainvis energy export')
+
+# End uses of the viewer files. The series names are alternatives in order of
+# preference (they report the same energy): every run uses the first one found
+# in the run_compaction result store (in J). Runs without series use the annual
+# metric in kWh instead.
+END_USES = {
+    'Heating': {
+        'series': ['DistrictHeating:Facility', 'DistrictHeatingWater:Facility', 'Heating:EnergyTransfer'],
+        'metric': 'district_heating_demand_kwh',
+    },
+    'Cooling': {
+        'series': ['DistrictCooling:Facility', 'Cooling:EnergyTransfer'],
+        'metric': 'district_cooling_demand_kwh',
+    },
+}
+AREA_METRIC = 'total_building_area_m2'
+J_PER_KWH = 3.6e6
+VIEWER_COLUMNS = ['ID', 'building', *END_USES, 'Total']
+
+# -------------------------------------------------------------------------------
+# Reading
+# -------------------------------------------------------------------------------
+
+def read_mapping(path):
+    """
+    Read the table that links runs to the viewer buildings.
+
+    The CSV (comma or semicolon separated) has the columns idf_name, option,
+    ID (building UUID, as in the CityModel) and optionally building (display
+    name). Several runs can map to the same building and option, e.g. one IDF
+    per part of a building; their energy and floor areas are added up.
+
+    Returns:
+    - DataFrame.
+    """
+    mapping = pd.read_csv(path, sep=None, engine='python', dtype={'idf_name': str, 'ID': str})
+    missing = {'idf_name', 'option', 'ID'} - set(mapping.columns)
+    if missing:
+        raise ValueError(f'{path} is missing the columns {sorted(missing)}')
+    if 'building' not in mapping.columns:
+        mapping['building'] = mapping['ID']
+    return mapping
+
+
+def read_store(store_path, end_uses=END_USES, frequency='Hourly'):
+    """
+    Annual end uses of every run in a run_compaction result store.
+
+    All metrics and the selected series are read with one query each. Per run
+    and end use the first series name of the end use that was stored is used.
+
+    Returns:
+    - Tuple (annual DataFrame indexed by idf_name with one kWh column per end
+      use and the floor area, hourly dictionary {(idf_name, end use): kWh array}).
+    """
+    connection = sqlite3.connect(f'file:{os.path.abspath(store_path)}?mode=ro', uri=True)
+    try:
+        metrics = pd.read_sql_query('SELECT idf_name, metric, value FROM metrics', connection)
+        names = sorted({name for config in end_uses.values() for name in config['series']})
+        rows = connection.execute(
+            f'SELECT idf_name, name, units, data FROM series WHERE frequency = ? '
+            f'AND name IN ({",".join("?" * len(names))})', (frequency, *names)).fetchall()
+    finally:
+        connection.close()
+
+    annual = metrics.pivot_table(index='idf_name', columns='metric', values='value', aggfunc='first').astype(float)
+    result = pd.DataFrame(index=annual.index.union(pd.Index(sorted({row[0] for row in rows}), dtype=object)))
+    result[AREA_METRIC] = annual[AREA_METRIC] if AREA_METRIC in annual else np.nan
+    for end_use, config in end_uses.items():
+        result[end_use] = annual[config['metric']] if config['metric'] in annual else np.nan
+
+    stored = {}
+    for idf_name, name, units, data in rows:
+        values = np.frombuffer(data, dtype=np.float32).astype(np.float64)
+        if (units or 'J').upper() == 'J':
+            values = values / J_PER_KWH
+        stored[(idf_name, name)] = values
+    hourly = {}
+    for idf_name in sorted({row[0] for row in rows}):
+        for end_use, config in end_uses.items():
+            name = next((name for name in config['series'] if (idf_name, name) in stored), None)
+            if name is not None:
+                hourly[(idf_name, end_use)] = stored[(idf_name, name)]
+    # Series take precedence over the annual metric of the same run
+    for end_use in end_uses:
+        totals = {idf_name: values.sum() for (idf_name, key), values in hourly.items() if key == end_use}
+        result.loc[list(totals), end_use] = list(totals.values())
+    return result.rename_axis('idf_name'), hourly
+
+
+def read_results_csv(results_csv, end_uses=END_USES):
+    """
+    Annual end uses from the results.csv of eppy_parallel_helper.parse_results.
+
+    Returns:
+    - Annual DataFrame indexed by idf_name, see read_store.
+    """
+    results = pd.read_csv(results_csv, dtype={'idf_name': str}).set_index('idf_name')
+    annual = pd.DataFrame(index=results.index)
+    annual[AREA_METRIC] = results.get(AREA_METRIC, np.nan)
+    for end_use, config in end_uses.items():
+        annual[end_use] = pd.to_numeric(results[config['metric']], errors='coerce') \
+            if config['metric'] in results else np.nan
+    return annual
+
+# -------------------------------------------------------------------------------
+# Export
+# -------------------------------------------------------------------------------
+
+def aggregate(annual, mapping, end_uses=END_USES):
+    """
+    Energy per option and building in kWh/m2, as shown by the viewer.
+
+    Runs are joined to the mapping, summed per option and building (energy
+    and floor area), and divided by the floor area. Missing end uses count as 0
+    in the total; buildings without any result are left out.
+
+    Returns:
+    - DataFrame with the columns option and VIEWER_COLUMNS.
+    """
+    joined = mapping.merge(annual, left_on='idf_name', right_index=True, how='left', validate='many_to_one')
+    unmatched = joined[list(end_uses)].isna().all(axis=1)
+    if unmatched.any():
+        logger.warning(f'{unmatched.sum()} mapped runs have no results, e.g. {joined["idf_name"][unmatched].iloc[0]}')
+    grouped = joined[~unmatched].groupby(['option', 'ID'], sort=True).agg(
+        building=('building', 'first'), area=(AREA_METRIC, 'sum'),
+        **{end_use: (end_use, lambda values: values.sum(min_count=1)) for end_use in end_uses})
+    area = grouped['area'].where(grouped['area'] > 0)
+    if area.isna().any():
+        logger.warning(f'{area.isna().sum()} buildings have no floor area, their energy is left in kWh')
+    for end_use in end_uses:
+        grouped[end_use] = grouped[end_use] / area.fillna(1.0)
+    grouped['Total'] = grouped[list(end_uses)].sum(axis=1, min_count=1)
+    return grouped.reset_index()[['option', *VIEWER_COLUMNS]]
+
+
+def hourly_profiles(hourly, mapping, end_use, annual):
+    """
+    Hourly kWh of one end use per option and building.
+
+    A building is only included if every run that adds to its annual value
+    (see aggregate) has an hourly series, so the two exports agree.
+
+    Returns:
+    - Dictionary {option: (list of building IDs, float32 array (buildings, hours))}.
+    """
+    profiles = {}
+    incomplete = 0
+    for (option, building), runs in mapping.groupby(['option', 'ID'])['idf_name']:
+        with_results = [run for run in runs if run in annual.index and not np.isnan(annual.at[run, end_use])]
+        series = [hourly[(run, end_use)] for run in with_results if (run, end_use) in hourly]
+        if not series:
+            continue
+        if len(series) < len(with_results):
+            incomplete += 1
+            continue
+        length = min(len(values) for values in series)
+        profiles.setdefault(option, {})[building] = np.sum([values[:length] for values in series], axis=0)
+    if incomplete:
+        logger.warning(f'{incomplete} buildings left out of the hourly {end_use} profiles: '
+                       f'some of their runs have only annual results')
+    result = {}
+    for option, buildings in profiles.items():
+        length = min(len(values) for values in buildings.values())
+        ids = sorted(buildings)
+        result[option] = (ids, np.array([buildings[b][:length] for b in ids], dtype=np.float32))
+    return result
+
+
+def export_energy(mapping_path, store_path=None, results_csv=None, out_dir=None, data_dir=DATA_DIR, hourly=False):
+    """
+    Write data/energy/alt_<option>.csv for every option in the mapping.
+
+    The files have the format the viewer reads (semicolon separated ID,
+    building, Heating, Cooling, Total in kWh/m2). With hourly, the hourly
+    kWh of every end use are written next to them as alt_<option>_hourly.npz
+    (ids and one buildings x hours array per end use).
+
+    Parameters:
+    - mapping_path: Mapping CSV, see read_mapping.
+    - store_path: run_compaction result store (annual metrics and hourly series).
+    - results_csv: results.csv of parse_results, used for runs missing from the store.
+    - out_dir: Output folder (default: data/energy).
+    - data_dir: multidomainvis data folder.
+    - hourly: Also write the hourly profiles (needs store_path).
+
+    Returns:
+    - List of written paths.
+    """
+    if not store_path and not results_csv:
+        raise ValueError('Give a result store, a results.csv or both')
+    out_dir = out_dir or os.path.join(data_dir, 'energy')
+    mapping = read_mapping(mapping_path)
+    annual, series = read_store(store_path) if store_path else (None, {})
+    if results_csv:
+        from_csv = read_results_csv(results_csv)
+        annual = from_csv if annual is None else annual.combine_first(from_csv)
+    missing = [end_use for end_use in END_USES if annual[end_use].isna().all()]
+    if missing:
+        # An empty column would silently turn Total into a partial sum
+        raise ValueError(f'No run has results for {missing}; store the metrics '
+                         f'{[END_USES[end_use]["metric"] for end_use in missing]} or their series')
+    table = aggregate(annual, mapping)
+
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    for option, rows in table.groupby('option'):
+        path = os.path.join(out_dir, f'alt_{option}.csv')
+        write_atomic(path, rows[VIEWER_COLUMNS].to_csv(sep=';', index=False).encode('utf-8'))
+        written.append(path)
+        logger.info(f'{path}: {len(rows)} buildings')
+    if hourly and series:
+        profiles = {end_use: hourly_profiles(series, mapping, end_use, annual) for end_use in END_USES}
+        for option in sorted({option for by_option in profiles.values() for option in by_option}):
+            path = os.path.join(out_dir, f'alt_{option}_hourly.npz')
+            arrays = {}
+            for end_use, by_option in profiles.items():
+                if option in by_option:
+                    arrays[f'{end_use}_ids'] = np.array(by_option[option][0])
+                    arrays[end_use] = by_option[option][1]
+            np.savez_compressed(path, **arrays)
+            written.append(path)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export sweep energy results to the multidomainvis energy files.')
+    parser.add_argument('mapping', help='CSV with idf_name, option, ID and building columns')
+    parser.add_argument('--store', default=None, help='run_compaction result store (store.db)')
+    parser.add_argument('--results', default=None, help='results.csv of parse_results')
+    parser.add_argument('--data-dir', default=DATA_DIR, help='multidomainvis data folder')
+    parser.add_argument('--out-dir', default=None, help='Output folder (default: data/energy)')
+    parser.add_argument('--hourly', action='store_true', help='Also write the hourly profiles per option')
+    args = parser.parse_args()
+    export_energy(args.mapping, args.store, args.results, args.out_dir, args.data_dir, args.hourly)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,386 @@
+# Author: Computational Sustainable Design group, Chalmers
+# Builds one binary glTF (GLB) per design option from the building option STL
+# and, when available, the wind surface nodes and cells. Meshes are indexed,
+# quantised (KHR_mesh_quantization) and stored at several levels of detail.
+
+# -------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------
+
+import argparse                                     # For the command line interface
+import glob                                         # For finding the options
+import json                                         # For the glTF JSON chunk
+import logging                                      # For progress messages
+import os                                           # For file and directory operations
+import re                                           # For option numbers in file names
+import struct                                       # For the GLB container
+import numpy as np                                  # For the array operations
+import pandas as pd                                 # For reading the wind CSVs
+from binary_grids import DATA_DIR, write_atomic
+from column_filter import resolve_columns
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('multidomainvis glTF assets')
+
+# Same default origin as src/Dataset.js (taken from CityModel.json)
+CITY_ORIGIN = (319189.0, 6396991.0)
+# Vertex clustering cell sizes [m] for the levels of detail, 0 keeps the full mesh
+LOD_CELL_SIZES = (0.0, 2.0, 8.0)
+# Lawson LDDC colours, same as src/windDataWorker.js
+LAWSON_COLORS = np.array([
+    [0x00, 0x00, 0xFF],  # A | Frequent sitting
+    [0x00, 0xAA, 0xFF],  # B | Occasional Sitting
+    [0xAA, 0xFF, 0xFF],  # C | Standing
+    [0x55, 0xFF, 0x00],  # D | Walking
+    [0xFF, 0xFF, 0x00],  # E | Uncomfortable
+    [0xFF, 0x55, 0x00],  # S | Unsafe
+], dtype=np.uint8)
+
+# glTF constants
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+COMPONENT_TYPES = {np.dtype('uint8'): 5121, np.dtype('uint16'): 5123,
+                   np.dtype('uint32'): 5125, np.dtype('float32'): 5126}
+TYPES = {1: 'SCALAR', 2: 'VEC2', 3: 'VEC3', 4: 'VEC4'}
+
+# -------------------------------------------------------------------------------
+# Geometry
+# -------------------------------------------------------------------------------
+
+def read_stl(path):
+    """
+    Read a binary or ASCII STL file.
+
+    Returns:
+    - Array (n_triangles, 3, 3) of float64 vertex coordinates.
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    if len(data) >= 84:
+        (count,) = struct.unpack('<I', data[80:84])
+        if 84 + 50 * count == len(data):
+            record = np.dtype([('normal', '<f4', 3), ('vertices', '<f4', (3, 3)), ('attribute', '<u2')])
+            return np.frombuffer(data, record, count, 84)['vertices'].astype(np.float64)
+    text = data.decode('utf-8', errors='ignore')
+    values = re.findall(r'vertex\s+(\S+)\s+(\S+)\s+(\S+)', text)
+    return np.array(values, dtype=np.float64).reshape(-1, 3, 3)
+
+
+def weld(triangles, tolerance=1e-3):
+    """
+    Merge duplicate triangle corners into an indexed mesh.
+
+    Returns:
+    - Tuple (positions (m, 3), indices (n, 3)).
+    """
+    corners = triangles.reshape(-1, 3)
+    keys = np.round(corners / tolerance).astype(np.int64)
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    return corners[first], inverse.reshape(-1, 3)
+
+
+def to_viewer_frame(xyz, city_origin=CITY_ORIGIN):
+    """Convert SWEREF99 (x, y, z) to the viewer's y-up frame centred on the city origin."""
+    xyz = np.asarray(xyz, dtype=np.float64)
+    return np.column_stack([xyz[:, 0] - city_origin[0], xyz[:, 2], -(xyz[:, 1] - city_origin[1])])
+
+
+def decimate(positions, indices, cell_size, classes=None):
+    """
+    Simplify a mesh by vertex clustering on a regular grid.
+
+    All vertices in one grid cell are merged into their mean; triangles that
+    collapse or become duplicates are removed. Vertex classes (e.g. Lawson
+    categories) keep the worst (highest) class of the merged vertices.
+
+    Parameters:
+    - positions: Array (m, 3).
+    - indices: Array (n, 3).
+    - cell_size: Grid cell size, 0 returns the mesh unchanged.
+    - classes: Optional integer array (m,) of per-vertex classes.
+
+    Returns:
+    - Tuple (positions, indices, classes).
+    """
+    if cell_size <= 0:
+        return positions, indices, classes
+    cells = np.floor(positions / cell_size).astype(np.int64)
+    _, cluster = np.unique(cells, axis=0, return_inverse=True)
+    cluster = cluster.ravel()
+    n = cluster.max() + 1
+    merged = np.zeros((n, 3))
+    np.add.at(merged, cluster, positions)
+    merged /= np.bincount(cluster, minlength=n)[:, None]
+    merged_classes = None
+    if classes is not None:
+        merged_classes = np.zeros(n, dtype=classes.dtype)
+        np.maximum.at(merged_classes, cluster, classes)
+
+    triangles = cluster[indices]
+    keep = ((triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2]) &
+            (triangles[:, 0] != triangles[:, 2]))
+    triangles = triangles[keep]
+    _, unique_rows = np.unique(np.sort(triangles, axis=1), axis=0, return_index=True)
+    triangles = triangles[np.sort(unique_rows)]
+
+    used, remap = np.unique(triangles, return_inverse=True)
+    merged_classes = merged_classes[used] if merged_classes is not None else None
+    return merged[used], remap.reshape(-1, 3), merged_classes
+
+
+def quantise_positions(positions):
+    """
+    Quantise positions to uint16 for KHR_mesh_quantization.
+
+    Returns:
+    - Tuple (quantised uint16 array, scale (3,), translation (3,)) so that
+      position = translation + quantised * scale.
+    """
+    lower = positions.min(axis=0)
+    extent = positions.max(axis=0) - lower
+    scale = np.where(extent > 0, extent / 65535.0, 1.0)
+    quantised = np.rint((positions - lower) / scale).astype(np.uint16)
+    return quantised, scale, lower
+
+# -------------------------------------------------------------------------------
+# Wind surface
+# -------------------------------------------------------------------------------
+
+def read_wind_surface(nodes_csv, cells_csv, criterion='Lawson'):
+    """
+    Read the wind surface nodes and cells into an indexed mesh.
+
+    Parameters:
+    - nodes_csv: WindroseSurfaceNodes CSV with ID,x,y,z.
+    - cells_csv: WindroseSurfaceCell CSV with node 1..3 and the comfort classes.
+    - criterion: Name (or prefix) of the comfort column to keep.
+
+    Returns:
+    - Tuple (positions (m, 3) SWEREF99, indices (n, 3), classes (m,) uint8).
+    """
+    nodes = pd.read_csv(nodes_csv, dtype={'ID': 'int64', 'x': 'float64', 'y': 'float64', 'z': 'float64'})
+    cells = pd.read_csv(cells_csv)
+    header = list(cells.columns)
+    node_columns = resolve_columns(header, ['node 1', 'node 2', 'node 3'])
+    (class_column,) = resolve_columns(header, [criterion])
+
+    order = np.argsort(nodes['ID'].to_numpy())
+    sorted_ids = nodes['ID'].to_numpy()[order]
+    cell_nodes = cells.iloc[:, node_columns].to_numpy(dtype=np.int64)
+    position = np.clip(np.searchsorted(sorted_ids, cell_nodes), 0, len(sorted_ids) - 1)
+    indices = order[position]
+    if not np.array_equal(sorted_ids[position], cell_nodes):
+        raise ValueError(f'{cells_csv} references nodes missing from {nodes_csv}')
+
+    # A vertex takes the class of the last cell using it, as in src/windDataWorker.js
+    classes = np.zeros(len(nodes), dtype=np.uint8)
+    classes[indices.ravel()] = np.repeat(cells.iloc[:, class_column].to_numpy(dtype=np.uint8), 3)
+    return nodes[['x', 'y', 'z']].to_numpy(), indices, classes
+
+# -------------------------------------------------------------------------------
+# GLB writing
+# -------------------------------------------------------------------------------
+
+class GLBBuilder:
+    """Collects quantised meshes into a single-buffer glTF 2.0 binary."""
+
+    def __init__(self):
+        self.gltf = {
+            'asset': {'version': '2.0', 'generator': 'multidomainvis pipeline/gltf_assets.py'},
+            'extensionsUsed': ['KHR_mesh_quantization'],
+            'extensionsRequired': ['KHR_mesh_quantization'],
+            'scene': 0,
+            'scenes': [{'nodes': []}],
+            'nodes': [], 'meshes': [], 'materials': [],
+            'accessors': [], 'bufferViews': [], 'buffers': [],
+        }
+        self.chunks = []
+        self.length = 0
+
+    def _add_accessor(self, array, target, normalized=False, with_bounds=False):
+        array = np.ascontiguousarray(array)
+        data = array.tobytes()
+        buffer_view = {'buffer': 0, 'byteOffset': self.length, 'byteLength': len(data), 'target': target}
+        element_size = array.itemsize * (1 if array.ndim == 1 else array.shape[1])
+        stride = element_size + (-element_size) % 4
+        if target == ARRAY_BUFFER and stride != element_size:
+            # Vertex attribute elements must start on 4-byte boundaries, e.g.
+            # uint16 VEC3 positions take 8 bytes and uint8 VEC3 colours 4
+            padded = np.zeros((len(array), stride), dtype=np.uint8)
+            padded[:, :element_size] = np.frombuffer(data, dtype=np.uint8).reshape(len(array), element_size)
+            data = padded.tobytes()
+            buffer_view.update(byteLength=len(data), byteStride=stride)
+        self.gltf['bufferViews'].append(buffer_view)
+        data += b'\0' * ((-len(data)) % 4)
+        self.chunks.append(data)
+        self.length += len(data)
+        item_size = 1 if array.ndim == 1 else array.shape[1]
+        accessor = {
+            'bufferView': len(self.gltf['bufferViews']) - 1,
+            'componentType': COMPONENT_TYPES[array.dtype],
+            'count': int(array.shape[0]),
+            'type': TYPES[item_size],
+        }
+        if normalized:
+            accessor['normalized'] = True
+        if with_bounds:
+            accessor['min'] = array.min(axis=0).tolist()
+            accessor['max'] = array.max(axis=0).tolist()
+        self.gltf['accessors'].append(accessor)
+        return len(self.gltf['accessors']) - 1
+
+    def add_mesh(self, name, positions, indices, colors=None, attributes=None, extras=None, material=None):
+        """
+        Add an indexed triangle mesh as its own node.
+
+        Parameters:
+        - name: Node and mesh name.
+        - positions: Array (m, 3) in the viewer frame, quantised to uint16.
+        - indices: Array (n, 3).
+        - colors: Optional uint8 array (m, 3), stored as normalised COLOR_0.
+        - attributes: Optional dict of custom per-vertex arrays (names start with '_').
+        - extras: Optional dict stored on the node (e.g. the level of detail).
+        - material: Optional glTF material dict.
+        """
+        quantised, scale, translation = quantise_positions(np.asarray(positions, dtype=np.float64))
+        index_dtype = np.uint16 if len(positions) < 65536 else np.uint32
+        primitive = {
+            'attributes': {'POSITION': self._add_accessor(quantised, ARRAY_BUFFER, with_bounds=True)},
+            'indices': self._add_accessor(np.asarray(indices, dtype=index_dtype).ravel(), ELEMENT_ARRAY_BUFFER),
+            'mode': 4,
+        }
+        if colors is not None:
+            primitive['attributes']['COLOR_0'] = self._add_accessor(
+                np.asarray(colors, dtype=np.uint8), ARRAY_BUFFER, normalized=True)
+        for key, values in (attributes or {}).items():
+            primitive['attributes'][key] = self._add_accessor(np.asarray(values), ARRAY_BUFFER)
+        if material is not None:
+            if material not in self.gltf['materials']:
+                self.gltf['materials'].append(material)
+            primitive['material'] = self.gltf['materials'].index(material)
+
+        self.gltf['meshes'].append({'name': name, 'primitives': [primitive]})
+        self.gltf['nodes'].append({
+            'name': name, 'mesh': len(self.gltf['meshes']) - 1,
+            'translation': translation.tolist(), 'scale': scale.tolist(),
+            'extras': extras or {},
+        })
+        self.gltf['scenes'][0]['nodes'].append(len(self.gltf['nodes']) - 1)
+
+    def to_bytes(self):
+        """Serialise to a GLB container."""
+        self.gltf['buffers'] = [{'byteLength': self.length}]
+        gltf = {key: value for key, value in self.gltf.items() if value != []}
+        json_chunk = json.dumps(gltf, separators=(',', ':')).encode('utf-8')
+        json_chunk += b' ' * ((-len(json_chunk)) % 4)
+        bin_chunk = b''.join(self.chunks)
+        total = 12 + 8 + len(json_chunk) + 8 + len(bin_chunk)
+        return (struct.pack('<4sII', b'glTF', 2, total) +
+                struct.pack('<I4s', len(json_chunk), b'JSON') + json_chunk +
+                struct.pack('<I4s', len(bin_chunk), b'BIN\0') + bin_chunk)
+
+# -------------------------------------------------------------------------------
+# Option assets
+# -------------------------------------------------------------------------------
+
+def add_lods(builder, name, positions, indices, lod_cell_sizes, classes=None, material=None):
+    """Add a mesh to the builder once per level of detail."""
+    previous = None
+    lod = 0
+    for cell_size in lod_cell_sizes:
+        lod_positions, lod_indices, lod_classes = decimate(positions, indices, cell_size, classes)
+        if len(lod_indices) == 0:
+            break
+        if previous is not None and len(lod_indices) >= previous:
+            # No triangles removed at this cell size; merging vertices alone
+            # only moves them, it does not make the level cheaper to draw
+            continue
+        previous = len(lod_indices)
+        colors = LAWSON_COLORS[np.minimum(lod_classes, len(LAWSON_COLORS) - 1)] if lod_classes is not None else None
+        attributes = {'_LAWSON': lod_classes} if lod_classes is not None else None
+        builder.add_mesh(f'{name}_lod{lod}', lod_positions, lod_indices, colors=colors, attributes=attributes,
+                         extras={'object': name, 'lod': lod, 'cellSize': cell_size,
+                                 'distance': cell_size * 100.0},
+                         material=material)
+        lod += 1
+
+
+def build_option(out_path, stl_path=None, nodes_csv=None, cells_csv=None, city_origin=CITY_ORIGIN,
+                 lod_cell_sizes=LOD_CELL_SIZES, criterion='Lawson'):
+    """
+    Build the GLB for one design option.
+
+    Parameters:
+    - out_path: Output .glb path.
+    - stl_path: Building option STL (optional).
+    - nodes_csv, cells_csv: Wind surface nodes and cells (optional, both needed).
+    - city_origin: SWEREF99 (x, y) subtracted from all coordinates.
+    - lod_cell_sizes: Vertex clustering cell sizes, one per level of detail.
+    - criterion: Wind comfort column used for the vertex classes and colours.
+
+    Returns:
+    - Number of bytes written, or 0 if there was nothing to write.
+    """
+    builder = GLBBuilder()
+    # Lets the viewer shift the meshes if it uses another origin
+    builder.gltf['asset']['extras'] = {'cityOrigin': [float(city_origin[0]), float(city_origin[1])]}
+    if stl_path:
+        positions, indices = weld(read_stl(stl_path))
+        add_lods(builder, 'building', to_viewer_frame(positions, city_origin), indices, lod_cell_sizes,
+                 material={'name': 'building', 'pbrMetallicRoughness': {
+                     'baseColorFactor': [0.667, 0.667, 0.667, 0.8], 'metallicFactor': 0.0}, 'alphaMode': 'BLEND'})
+    if nodes_csv and cells_csv:
+        positions, indices, classes = read_wind_surface(nodes_csv, cells_csv, criterion)
+        add_lods(builder, 'wind', to_viewer_frame(positions, city_origin), indices, lod_cell_sizes,
+                 classes=classes, material={'name': 'wind', 'pbrMetallicRoughness': {'metallicFactor': 0.0}})
+    if not builder.gltf['meshes']:
+        return 0
+    data = builder.to_bytes()
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    write_atomic(out_path, data)
+    logger.info(f'{out_path}: {len(builder.gltf["meshes"])} meshes, {len(data)} bytes')
+    return len(data)
+
+
+def build_all(data_dir=DATA_DIR, out_dir=None, **kwargs):
+    """
+    Build data/buildingOptions/option_<n>.glb for every option with an STL or wind surface.
+
+    Returns:
+    - List of written paths.
+    """
+    out_dir = out_dir or os.path.join(data_dir, 'buildingOptions')
+    options = set()
+    for path in glob.glob(os.path.join(data_dir, 'buildingOptions', 'option_*.stl')):
+        options.add(int(re.search(r'option_(\d+)', os.path.basename(path)).group(1)))
+    for path in glob.glob(os.path.join(data_dir, 'wind', 'Option_*')):
+        options.add(int(re.search(r'Option_(\d+)', os.path.basename(path)).group(1)))
+
+    written = []
+    for option in sorted(options):
+        stl_path = os.path.join(data_dir, 'buildingOptions', f'option_{option}.stl')
+        wind_dir = os.path.join(data_dir, 'wind', f'Option_{option}')
+        nodes = sorted(glob.glob(os.path.join(wind_dir, 'WindroseSurfaceNodes*.csv')))
+        cells = sorted(glob.glob(os.path.join(wind_dir, 'WindroseSurfaceCell*.csv')))
+        out_path = os.path.join(out_dir, f'option_{option}.glb')
+        if build_option(out_path,
+                        stl_path=stl_path if os.path.exists(stl_path) else None,
+                        nodes_csv=nodes[0] if nodes else None,
+                        cells_csv=cells[0] if cells else None, **kwargs):
+            written.append(out_path)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build one GLB per multidomainvis design option.')
+    parser.add_argument('--data-dir', default=DATA_DIR, help='multidomainvis data folder')
+    parser.add_argument('--out-dir', default=None, help='Output folder (default: data/buildingOptions)')
+    parser.add_argument('--lod', type=float, nargs='+', default=list(LOD_CELL_SIZES),
+                        help='Vertex clustering cell size per level of detail [m], 0 = full resolution')
+    parser.add_argument('--criterion', default='Lawson', help='Wind comfort column (Lawson, Davenport, NEN8100)')
+    args = parser.parse_args()
+    build_all(args.data_dir, args.out_dir, lod_cell_sizes=args.lod, criterion=args.criterion)
+
+
+if __name__ == '__main__':
+    main()
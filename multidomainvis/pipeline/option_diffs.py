@@ -0,0 +1,264 @@
+# Author: Computational Sustainable Design group, Chalmers
+# Precomputes option-vs-base difference fields and summary statistics for the
+# noise and radiation grids, so comparisons do not need both datasets in the browser.
+
+# -------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------
+
+import argparse                                     # For the command line interface
+import glob                                         # For finding the datasets
+import json                                         # For the summary file
+import logging                                      # For progress messages
+import os                                           # For file and directory operations
+import re                                           # For option numbers in file names
+import numpy as np                                  # For the array operations
+from scipy.spatial import cKDTree                   # For aligning grids that do not share points
+from binary_grids import DATA_DIR, encode_grid, infer_grid, points_to_raster, read_point_csv, write_atomic
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('multidomainvis option diffs')
+
+# Per domain: base file, option files, how the option number is found, whether
+# the option files already hold differences to the base case, the value
+# thresholds used for the area statistics, and optionally the frame correction
+# of the base file (see register_base).
+DOMAINS = {
+    'noise': {
+        'base': 'noise/option_0_Lden.csv',
+        'options': 'noise/option_*_Lden.csv',
+        'option_regex': r'option_(\d+)_Lden',
+        'is_difference': False,
+        'thresholds': [50, 55, 60, 65],  # dB
+    },
+    'radiation': {
+        'base': 'radiation/*RadiationBaseCase.csv',
+        'options': 'radiation/*RadiationOption*_10mgrid.csv',
+        'option_regex': r'RadiationOption(\d+)',
+        'is_difference': True,
+        'thresholds': [400, 600, 800],  # kWh/m2
+        # The base case grid is offset about (23 m, 32 m) from the option grids
+        # and the buildings (the "magic grid offset" of src/DataHandler.js).
+        # Per axis (scale, offset), fitted on the extents of the 10 m grids,
+        # which have the same 138 x 189 points; it maps them exactly onto each other.
+        'base_frame': ((0.9976951942936721, -23.254953605152618),
+                       (1.0005284043203269, -32.532489155887724)),
+    },
+}
+PERCENTILES = [5, 25, 50, 75, 95]
+
+# -------------------------------------------------------------------------------
+# Alignment
+# -------------------------------------------------------------------------------
+
+def register_base(x, y, frame=None):
+    """
+    Move base case coordinates into the frame of the option grids.
+
+    Parameters:
+    - x, y: Base case coordinates.
+    - frame: ((x scale, x offset), (y scale, y offset)) of the domain
+      ('base_frame' in DOMAINS), None if the frames already agree.
+
+    Returns:
+    - Tuple (x, y).
+    """
+    if frame is None:
+        return x, y
+    (sx, tx), (sy, ty) = frame
+    return sx * x + tx, sy * y + ty
+
+
+def align_points(base_xy, other_xy, max_distance, decimals=3):
+    """
+    Find the base point matching every other point.
+
+    Points are first matched exactly on coordinates rounded to `decimals`
+    (grids that share their points, e.g. the noise options). Points left
+    unmatched are matched to their nearest base point with a KD-tree if it is
+    closer than max_distance (grids with a different origin or spacing, e.g.
+    the radiation 10 m grids).
+
+    Parameters:
+    - base_xy: Array (n, 2) of base coordinates.
+    - other_xy: Array (m, 2) of coordinates to align.
+    - max_distance: Largest accepted nearest-neighbour distance.
+    - decimals: Rounding used for the exact match.
+
+    Returns:
+    - Integer array (m,) of indices into base_xy, -1 where nothing matched.
+    """
+    base_keys = np.round(base_xy, decimals)
+    other_keys = np.round(other_xy, decimals)
+    # Hash join on the rounded coordinates through a structured view
+    dtype = np.dtype([('x', base_keys.dtype), ('y', base_keys.dtype)])
+    base_view = np.ascontiguousarray(base_keys).view(dtype).ravel()
+    other_view = np.ascontiguousarray(other_keys).view(dtype).ravel()
+    order = np.argsort(base_view)
+    position = np.searchsorted(base_view[order], other_view)
+    position = np.clip(position, 0, len(order) - 1)
+    index = order[position]
+    matched = base_view[index] == other_view
+    index = np.where(matched, index, -1)
+
+    if not matched.all():
+        remaining = ~matched
+        distances, nearest = cKDTree(base_xy).query(other_xy[remaining], k=1,
+                                                    distance_upper_bound=max_distance)
+        index[remaining] = np.where(np.isfinite(distances), nearest, -1)
+    return index
+
+# -------------------------------------------------------------------------------
+# Statistics
+# -------------------------------------------------------------------------------
+
+def summarise(delta, option_values, base_values, cell_area, thresholds):
+    """
+    Summary statistics of one option compared to the base case.
+
+    Parameters:
+    - delta: Option minus base for every point (NaN where unknown).
+    - option_values, base_values: Absolute values at the same points.
+    - cell_area: Area represented by one grid point [m2].
+    - thresholds: Values for the area-above statistics.
+
+    Returns:
+    - Dictionary of JSON serialisable statistics.
+    """
+    valid = ~np.isnan(delta)
+    d = delta[valid]
+    stats = {
+        'count': int(len(delta)),
+        'matched': int(valid.sum()),
+        'cellArea': float(cell_area),
+        'mean': float(d.mean()) if len(d) else None,
+        'std': float(d.std()) if len(d) else None,
+        'min': float(d.min()) if len(d) else None,
+        'max': float(d.max()) if len(d) else None,
+        'percentiles': dict(zip([str(p) for p in PERCENTILES],
+                                np.percentile(d, PERCENTILES).tolist() if len(d) else [None] * len(PERCENTILES))),
+        'areaIncreased': float((d > 0).sum() * cell_area),
+        'areaDecreased': float((d < 0).sum() * cell_area),
+        'areaAbove': {},
+        'baseAreaAbove': {},
+    }
+    option_valid = option_values[valid]
+    base_valid = base_values[valid]
+    for threshold in thresholds:
+        stats['areaAbove'][str(threshold)] = float((option_valid > threshold).sum() * cell_area)
+        stats['baseAreaAbove'][str(threshold)] = float((base_valid > threshold).sum() * cell_area)
+    return stats
+
+# -------------------------------------------------------------------------------
+# Building the diffs
+# -------------------------------------------------------------------------------
+
+def build_diff(base_csv, option_csv, out_path, is_difference=False, thresholds=(), quantise=True, base_frame=None):
+    """
+    Write the delta field of one option as a binary grid and return its statistics.
+
+    The delta is stored on the option's own grid (see binary_grids.py); the
+    statistics are stored in the file header under attributes.summary as well.
+    Option files that already hold differences keep every value as the delta;
+    the base case is only matched to them for the absolute thresholds.
+
+    Parameters:
+    - base_csv: Base case CSV.
+    - option_csv: Option CSV.
+    - out_path: Output .bin path.
+    - is_difference: The option file already holds option minus base.
+    - thresholds: Values for the area-above statistics.
+    - quantise: Store uint16 instead of float32 values.
+    - base_frame: Frame correction of the base case, see register_base.
+
+    Returns:
+    - Dictionary of statistics, see summarise.
+    """
+    bx, by, bv = read_point_csv(base_csv)
+    bx, by = register_base(bx, by, base_frame)
+    ox, oy, ov = read_point_csv(option_csv)
+    base_keep = ~np.isnan(bv)
+    base_xy = np.column_stack([bx, by])[base_keep]
+    bv = bv[base_keep]
+
+    _, spacing, _, _, _ = infer_grid(ox, oy)
+    _, base_spacing, _, _, _ = infer_grid(bx, by)
+    # Half the cell diagonal of the coarser grid, so points of a finer grid
+    # match the coarse cell they lie in
+    max_distance = 0.5 * max(np.hypot(*spacing), np.hypot(*base_spacing))
+
+    index = align_points(base_xy, np.column_stack([ox, oy]), max_distance)
+    matched = index >= 0
+    base_at_option = np.full(len(ov), np.nan)
+    base_at_option[matched] = bv[index[matched]]
+
+    if is_difference:
+        delta = ov
+        option_abs = base_at_option + ov
+    else:
+        delta = ov - base_at_option
+        option_abs = ov
+
+    stats = summarise(delta, option_abs, base_at_option, spacing[0] * spacing[1], thresholds)
+    stats['matched'] = int(matched.sum())
+    if is_difference and stats['mean'] is not None and not np.isclose(stats['mean'], np.nanmean(ov)):
+        raise ValueError(f'{option_csv}: mean delta {stats["mean"]} differs from the file mean {np.nanmean(ov)}')
+    stats['base'] = os.path.basename(base_csv)
+    stats['option'] = os.path.basename(option_csv)
+
+    delta_raster, origin, spacing = points_to_raster(ox, oy, delta)
+    data = encode_grid(delta_raster, origin, spacing, quantise=quantise,
+                       attributes={'source': stats['option'], 'base': stats['base'], 'summary': stats})
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    write_atomic(out_path, data)
+    mean = 'n/a' if stats['mean'] is None else f'{stats["mean"]:.3f}'
+    logger.info(f'{option_csv}: {stats["matched"]}/{stats["count"]} points matched, mean delta {mean}')
+    return stats
+
+
+def build_all(data_dir=DATA_DIR, out_dir=None, domains=DOMAINS, quantise=True):
+    """
+    Build the diff fields for every option of every domain and a combined summary.
+
+    Outputs go to <out_dir>/<domain>/<option file>_diff.bin and
+    <out_dir>/summary.json (default out_dir: data/diff).
+
+    Returns:
+    - Nested dictionary {domain: {option number: statistics}}.
+    """
+    out_dir = out_dir or os.path.join(data_dir, 'diff')
+    summary = {}
+    for domain, config in domains.items():
+        base_matches = glob.glob(os.path.join(data_dir, config['base']))
+        if not base_matches:
+            logger.warning(f'No base case found for {domain}')
+            continue
+        base_csv = base_matches[0]
+        summary[domain] = {}
+        for option_csv in sorted(glob.glob(os.path.join(data_dir, config['options']))):
+            if os.path.abspath(option_csv) == os.path.abspath(base_csv):
+                continue
+            option = int(re.search(config['option_regex'], os.path.basename(option_csv)).group(1))
+            name = os.path.splitext(os.path.basename(option_csv))[0] + '_diff.bin'
+            summary[domain][option] = build_diff(
+                base_csv, option_csv, os.path.join(out_dir, domain, name),
+                is_difference=config['is_difference'], thresholds=config['thresholds'], quantise=quantise,
+                base_frame=config.get('base_frame'))
+
+    os.makedirs(out_dir, exist_ok=True)
+    write_atomic(os.path.join(out_dir, 'summary.json'),
+                 json.dumps(summary, indent=1, sort_keys=True).encode('utf-8'))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute option differences for multidomainvis.')
+    parser.add_argument('--data-dir', default=DATA_DIR, help='Folder with the noise and radiation data')
+    parser.add_argument('--out-dir', default=None, help='Output folder (default: data/diff)')
+    parser.add_argument('--float32', action='store_true', help='Store float32 values instead of quantised uint16')
+    args = parser.parse_args()
+    build_all(args.data_dir, args.out_dir, quantise=not args.float32)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+# Author: Computational Sustainable Design group, Chalmers
+# Wind comfort statistics over all design options: the wind surface cells of
+# every option are aligned to the base case, and the comfort class
+# distributions, area fractions and changes are computed for all options at once.
+
+# -------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------
+
+import argparse                                     # For the command line interface
+import glob                                         # For finding the options
+import json                                         # For the summary file
+import logging                                      # For progress messages
+import os                                           # For file and directory operations
+import re                                           # For option numbers in folder names
+import numpy as np                                  # For the array operations
+import pandas as pd                                 # For reading the wind CSVs
+from scipy.spatial import cKDTree                   # For matching cells by position
+from binary_grids import DATA_DIR, write_atomic
+from column_filter import WIND_NODE_COLUMNS, resolve_columns
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('multidomainvis wind comfort')
+
+CRITERIA = ['Lawson', 'Davenport', 'NEN8100']
+# Class labels where they are known (Lawson LDDC, same as src/windDataWorker.js);
+# other criteria are labelled by their class numbers
+CLASS_LABELS = {'Lawson': ['A', 'B', 'C', 'D', 'E', 'S']}
+MISSING = -1                                        # class of cells without a value or match
+
+# -------------------------------------------------------------------------------
+# Reading and alignment
+# -------------------------------------------------------------------------------
+
+def read_cells(nodes_csv, cells_csv, criteria=CRITERIA):
+    """
+    Read the wind surface of one option as cells.
+
+    Parameters:
+    - nodes_csv: WindroseSurfaceNodes CSV (ID,x,y,z; the ID column may be unnamed).
+    - cells_csv: WindroseSurfaceCell CSV with node 1..3 and comfort class columns.
+    - criteria: Comfort columns (names or prefixes); missing columns give MISSING classes.
+
+    Returns:
+    - Dictionary with keys (sorted node ids (n, 3) int64), centroid (n, 3),
+      area (n,) and classes (len(criteria), n) int8.
+    """
+    nodes = pd.read_csv(nodes_csv)
+    ids = nodes.iloc[:, 0].to_numpy(dtype=np.int64)
+    xyz = nodes[['x', 'y', 'z']].to_numpy(dtype=np.float64)
+    cells = pd.read_csv(cells_csv)
+    header = list(cells.columns)
+    cell_nodes = cells.iloc[:, resolve_columns(header, WIND_NODE_COLUMNS)].to_numpy(dtype=np.int64)
+
+    order = np.argsort(ids)
+    position = np.clip(np.searchsorted(ids[order], cell_nodes), 0, len(ids) - 1)
+    if not np.array_equal(ids[order][position], cell_nodes):
+        raise ValueError(f'{cells_csv} references nodes missing from {nodes_csv}')
+    corners = xyz[order[position]]                  # (cells, 3 corners, xyz)
+    area = 0.5 * np.linalg.norm(np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]), axis=1)
+
+    classes = np.full((len(criteria), len(cells)), MISSING, dtype=np.int8)
+    for row, criterion in enumerate(criteria):
+        try:
+            (column,) = resolve_columns(header, [criterion])
+        except ValueError:
+            continue
+        values = cells.iloc[:, column].to_numpy(dtype=np.float64)
+        classes[row] = np.where(np.isnan(values), MISSING, values).astype(np.int8)
+    return {'keys': np.sort(cell_nodes, axis=1), 'centroid': corners.mean(axis=1), 'area': area,
+            'classes': classes}
+
+
+def match_cells(reference, other, match='auto', tolerance=1.0):
+    """
+    Find the reference cell of every cell of another option.
+
+    Parameters:
+    - reference, other: Cells from read_cells.
+    - match: 'id' matches cells with the same three node IDs, 'spatial'
+      matches the nearest reference centroid, 'auto' matches by ID and falls
+      back to the nearest centroid for cells that have no ID match or whose
+      ID match has moved (e.g. a remeshed surface).
+    - tolerance: Largest centroid distance of a match [m].
+
+    Returns:
+    - Integer array (n_other,) of reference indices, -1 where nothing matched.
+    """
+    index = np.full(len(other['area']), -1, dtype=np.int64)
+    if match in ('id', 'auto'):
+        dtype = np.dtype([('a', np.int64), ('b', np.int64), ('c', np.int64)])
+        reference_keys = np.ascontiguousarray(reference['keys']).view(dtype).ravel()
+        other_keys = np.ascontiguousarray(other['keys']).view(dtype).ravel()
+        order = np.argsort(reference_keys)
+        position = np.clip(np.searchsorted(reference_keys[order], other_keys), 0, len(order) - 1)
+        found = order[position]
+        matched = reference_keys[found] == other_keys
+        if match == 'auto':
+            moved = np.linalg.norm(reference['centroid'][found] - other['centroid'], axis=1) > tolerance
+            matched &= ~moved
+        index[matched] = found[matched]
+    if match in ('spatial', 'auto'):
+        remaining = np.flatnonzero(index < 0)
+        if len(remaining):
+            distance, nearest = cKDTree(reference['centroid']).query(
+                other['centroid'][remaining], k=1, distance_upper_bound=tolerance)
+            index[remaining] = np.where(np.isfinite(distance), nearest, -1)
+    return index
+
+
+class WindOptions:
+    """
+    Comfort classes of all options on the cells of the base case.
+
+    classes[c, o, i] is the class of cell i of the base case for criterion
+    criteria[c] in option options[o] (MISSING if the option has no matching
+    cell); area[i] is the cell area in m2.
+    """
+
+    def __init__(self, options, criteria, centroid, area, classes):
+        self.options = options
+        self.criteria = criteria
+        self.centroid = centroid
+        self.area = area
+        self.classes = classes
+
+    @classmethod
+    def load(cls, data_dir=DATA_DIR, criteria=CRITERIA, match='auto', tolerance=1.0):
+        """
+        Read every data/wind/Option_* folder with a nodes and a cells file and
+        align it to the lowest option (the base case, Option_0).
+        """
+        folders = {}
+        for folder in glob.glob(os.path.join(data_dir, 'wind', 'Option_*')):
+            nodes = sorted(glob.glob(os.path.join(folder, 'WindroseSurfaceNodes*.csv')))
+            cells = sorted(glob.glob(os.path.join(folder, 'WindroseSurfaceCell*.csv')))
+            if not (nodes and cells):
+                logger.warning(f'{folder}: no WindroseSurfaceNodes and WindroseSurfaceCell files, skipped')
+                continue
+            folders[int(re.search(r'Option_(\d+)', os.path.basename(folder)).group(1))] = (nodes[0], cells[0])
+        if not folders:
+            raise FileNotFoundError(f'No wind options with nodes and cells in {os.path.join(data_dir, "wind")}')
+
+        options = sorted(folders)
+        reference = read_cells(*folders[options[0]], criteria)
+        classes = np.full((len(criteria), len(options), len(reference['area'])), MISSING, dtype=np.int8)
+        classes[:, 0] = reference['classes']
+        for o, option in enumerate(options[1:], 1):
+            other = read_cells(*folders[option], criteria)
+            index = match_cells(reference, other, match, tolerance)
+            matched = index >= 0
+            classes[:, o, index[matched]] = other['classes'][:, matched]
+            logger.info(f'Option {option}: {matched.sum()} of {len(index)} cells matched to option {options[0]}')
+        return cls(options, list(criteria), reference['centroid'], reference['area'], classes)
+
+    def class_count(self, criterion):
+        """Number of classes of a criterion (from the labels or the largest class found)."""
+        if criterion in CLASS_LABELS:
+            return len(CLASS_LABELS[criterion])
+        return int(self.classes[self.criteria.index(criterion)].max()) + 1
+
+# -------------------------------------------------------------------------------
+# Statistics
+# -------------------------------------------------------------------------------
+
+def class_statistics(classes, area, n_classes):
+    """
+    Class distributions of all options and their changes from the first option.
+
+    Parameters:
+    - classes: Array (options, cells) of classes, MISSING where unknown.
+    - area: Array (cells,) of cell areas.
+    - n_classes: Number of classes.
+
+    Returns:
+    - Dictionary of arrays: count and area (options, classes), fraction of the
+      classified area, deltaFraction (fraction minus the base fraction),
+      transitions (options, base class, option class) area, and areaImproved,
+      areaWorsened and areaUnchanged (options,) where both have a class; a
+      lower class is more comfortable.
+    """
+    n_options = classes.shape[0]
+    valid = (classes >= 0) & (classes < n_classes)
+    option = np.broadcast_to(np.arange(n_options)[:, None], classes.shape)
+    weight = np.broadcast_to(area, classes.shape)
+    bins = option[valid] * n_classes + classes[valid]
+    count = np.bincount(bins, minlength=n_options * n_classes).reshape(n_options, n_classes)
+    class_area = np.bincount(bins, weights=weight[valid], minlength=n_options * n_classes).reshape(
+        n_options, n_classes)
+    total = class_area.sum(axis=1, keepdims=True)
+    fraction = np.divide(class_area, total, out=np.zeros_like(class_area), where=total > 0)
+
+    base = classes[0]
+    both = valid & valid[0]
+    bins = (option[both] * n_classes + base[np.nonzero(both)[1]]) * n_classes + classes[both]
+    transitions = np.bincount(bins, weights=weight[both], minlength=n_options * n_classes ** 2).reshape(
+        n_options, n_classes, n_classes)
+    change = np.sign(classes.astype(np.int16) - base)
+    return {
+        'count': count,
+        'area': class_area,
+        'fraction': fraction,
+        'deltaFraction': fraction - fraction[0],
+        'transitions': transitions,
+        'areaImproved': np.where(both & (change < 0), weight, 0.0).sum(axis=1),
+        'areaWorsened': np.where(both & (change > 0), weight, 0.0).sum(axis=1),
+        'areaUnchanged': np.where(both & (change == 0), weight, 0.0).sum(axis=1),
+    }
+
+
+def summarise(wind):
+    """
+    Statistics of every criterion and option as a JSON serialisable dictionary
+    {criterion: {labels, cells, area, base, options: {option: statistics}}}.
+    """
+    summary = {}
+    for c, criterion in enumerate(wind.criteria):
+        if (wind.classes[c] < 0).all():
+            continue
+        n_classes = wind.class_count(criterion)
+        stats = class_statistics(wind.classes[c], wind.area, n_classes)
+        summary[criterion] = {
+            'labels': CLASS_LABELS.get(criterion, [str(k) for k in range(n_classes)]),
+            'cells': int(len(wind.area)),
+            'area': float(wind.area.sum()),
+            'base': wind.options[0],
+            'options': {str(option): {
+                'matched': int((wind.classes[c, o] >= 0).sum()),
+                **{key: np.round(value[o], 4).tolist() for key, value in stats.items()},
+            } for o, option in enumerate(wind.options)},
+        }
+    return summary
+
+
+def build_summary(data_dir=DATA_DIR, out_path=None, criteria=CRITERIA, match='auto', tolerance=1.0):
+    """
+    Write the wind comfort summary of all options (default: data/wind/comfort_summary.json).
+
+    Returns:
+    - The summary dictionary.
+    """
+    out_path = out_path or os.path.join(data_dir, 'wind', 'comfort_summary.json')
+    wind = WindOptions.load(data_dir, criteria, match, tolerance)
+    summary = summarise(wind)
+    write_atomic(out_path, json.dumps(summary, separators=(',', ':')).encode('utf-8'))
+    logger.info(f'{out_path}: {len(wind.options)} options, {len(wind.area)} cells, {len(summary)} criteria')
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Wind comfort statistics of all multidomainvis options.')
+    parser.add_argument('--data-dir', default=DATA_DIR, help='multidomainvis data folder')
+    parser.add_argument('--out', default=None, help='Output JSON (default: data/wind/comfort_summary.json)')
+    parser.add_argument('--criteria', nargs='+', default=CRITERIA, help='Comfort columns to summarise')
+    parser.add_argument('--match', choices=['auto', 'id', 'spatial'], default='auto',
+                        help='Align cells by node IDs, by position, or by IDs with a position fallback')
+    parser.add_argument('--tolerance', type=float, default=1.0, help='Largest distance of a spatial match [m]')
+    args = parser.parse_args()
+    build_summary(args.data_dir, args.out, args.criteria, args.match, args.tolerance)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+// Loader for the binary grid/points files written by pipeline/binary_grids.py.
+// The data is read straight into typed arrays, no text parsing involved.
+
+const MAGIC = 'MDVG';
+
+function parseHeader(buffer) {
+    const bytes = new Uint8Array(buffer, 0, 4);
+    if (String.fromCharCode(...bytes) !== MAGIC) {
+        throw new Error('Not a multidomainvis binary file');
+    }
+    const length = new DataView(buffer).getUint32(4, true);
+    const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 8, length)));
+    return [header, 8 + length];
+}
+
+// Returns {header, x, y, values} with world coordinates for every valid cell
+function decodeGrid(buffer, header, body) {
+    const [dx, dy] = header.spacing;
+    const [x0, y0] = header.origin;
+    const x = new Float64Array(header.count);
+    const y = new Float64Array(header.count);
+    const values = new Float32Array(header.count);
+    const ValueArray = header.dtype === 'uint16' ? Uint16Array : Float32Array;
+
+    let k = 0;
+    for (let tile of header.tiles) {
+        const [rows, cols] = tile.shape;
+        const n = rows * cols;
+        const mask = new Uint8Array(buffer, body + tile.maskOffset, Math.ceil(n / 8));
+        const tileValues = new ValueArray(buffer, body + tile.valueOffset, n);
+        for (let i = 0; i < n; i++) {
+            if ((mask[i >> 3] >> (i & 7)) & 1) {
+                const row = tile.row + Math.floor(i / cols);
+                const col = tile.col + (i % cols);
+                x[k] = x0 + col * dx;
+                y[k] = y0 + row * dy;
+                values[k] = header.offset + tileValues[i] * header.scale;
+                k++;
+            }
+        }
+    }
+    return {header, x, y, values};
+}
+
+// Returns {header, ids, positions}, positions are relative to header.origin
+function decodePoints(buffer, header, body) {
+    const ids = new Uint32Array(buffer, body + header.idOffset, header.count);
+    const positions = new Float32Array(buffer, body + header.positionOffset, header.count * 3);
+    return {header, ids, positions};
+}
+
+function loadBinary(path, callback) {
+    fetch(path)
+        .then(response => response.arrayBuffer())
+        .then(buffer => {
+            const [header, body] = parseHeader(buffer);
+            if (header.kind === 'grid') {
+                callback(decodeGrid(buffer, header, body));
+            } else {
+                callback(decodePoints(buffer, header, body));
+            }
+        });
+}
+
+function isBinaryPath(path) {
+    return path.endsWith('.bin');
+}
+
+export {loadBinary, isBinaryPath}
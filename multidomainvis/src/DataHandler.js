@@ -30,11 +30,32 @@ class DataHandler {
         }
     }
 
-    onRadiationDataLoaded(data, dataSet, callback) {
-        const positions = [];
-        const colors = [];
-        const lut = new Lut("blackbody", 32);
+    // Levels of detail from pipeline/gltf_assets.py, nodes are already in viewer coordinates
+    onBuildingOptionLODLoaded(glb, cityOrigin, callback) {
+        const [x0, y0] = glb.asset.extras?.cityOrigin || [cityOrigin.x, cityOrigin.y];
+        const offset = new THREE.Vector3(x0 - cityOrigin.x, 0, -(y0 - cityOrigin.y));
+        const material = new THREE.MeshStandardMaterial({color: 0xAAAAAA, transparent: true, opacity: 0.8, flatShading: true});
+        const lod = new THREE.LOD();
+        for (let node of glb.nodes.filter(n => n.extras.object === 'building')) {
+            const mesh = new THREE.Mesh(node.geometry, material);
+            mesh.position.fromArray(node.translation).add(offset).multiplyScalar(this.scale);
+            mesh.scale.fromArray(node.scale).multiplyScalar(this.scale);
+            mesh.castShadow = true;
+            mesh.receiveShadow = true;
+            lod.addLevel(mesh, node.extras.distance * this.scale);
+        }
+
+        lod.visible = false;
+        this.scene.add(lod);
 
+        if (callback) {
+            callback(lod);
+        }
+    }
+
+    onRadiationDataLoaded(data, dataSet, callback) {
+        const x = [];
+        const y = [];
         const values = [];
         for (let d of data) {
             const value = d['value'];
@@ -43,20 +64,33 @@ class DataHandler {
                 console.log(d);
                 continue;
             }
+            x.push(d["x"]);
+            y.push(d["y"]);
+            values.push(value);
+        }
+        this.onRadiationGridLoaded({x, y, values}, dataSet, callback);
+    }
+
+    // grid: {x, y, values} arrays, as produced by BinaryLoader.js
+    onRadiationGridLoaded(grid, dataSet, callback) {
+        const {x, y, values} = grid;
+        const positions = new Float32Array(values.length * 3);
+        const colors = new Float32Array(values.length * 3);
+        const lut = new Lut("blackbody", 32);
 
-            positions.push(
-                d["x"] * this.scale, // - 24.850166 , // Magic grid offset number
-                51.3 * this.scale,
-                - (d["y"]) * this.scale, // - 32.03199), // Magic grid offset number
-            );
+        for (let i=0; i<values.length; i++) {
+            positions[i*3] = x[i] * this.scale; // - 24.850166 , // Magic grid offset number
+            positions[i*3 + 1] = 51.3 * this.scale;
+            positions[i*3 + 2] = - (y[i]) * this.scale; // - 32.03199), // Magic grid offset number
 
-            values.push(value);
-            lut.minV = Math.min(lut.minV, value);
-            lut.maxV = Math.max(lut.maxV, value);
+            lut.minV = Math.min(lut.minV, values[i]);
+            lut.maxV = Math.max(lut.maxV, values[i]);
         }
-        for (let v of values) {
-            const color = lut.getColor(v);
-            colors.push(color.r, color.g, color.b);
+        for (let i=0; i<values.length; i++) {
+            const color = lut.getColor(values[i]);
+            colors[i*3] = color.r;
+            colors[i*3 + 1] = color.g;
+            colors[i*3 + 2] = color.b;
         }
 
         const mesh = drawParticles(positions, colors, 15 * this.scale, true);
@@ -114,29 +148,43 @@ class DataHandler {
     }
 
     onNoiseDataLoaded(data, cityOrigin, callback) {
-        const positions = [];
-        const colors = [];
-        const lut = new Lut("rainbow", 32);
-
-        const noiseVals = [];
+        const x = [];
+        const y = [];
+        const values = [];
         for (let d of data) {
-            let [x, y, noiseVal] = d;
+            let [dx, dy, noiseVal] = d;
             if (isNaN(noiseVal)) {
                 continue;
             }
-            positions.push(
-                (x - cityOrigin.x)*this.scale,
-                (59.7)*this.scale,
-                (- (y - cityOrigin.y))*this.scale
-            );
-            noiseVals.push(noiseVal);
-        }
-        lut.minV = Math.min(...noiseVals);
-        lut.maxV = Math.max(...noiseVals);
-
-        for (let v of noiseVals) {
-            const color = lut.getColor(v);
-            colors.push(color.r, color.g, color.b);
+            x.push(dx);
+            y.push(dy);
+            values.push(noiseVal);
+        }
+        this.onNoiseGridLoaded({x, y, values}, cityOrigin, callback);
+    }
+
+    // grid: {x, y, values} arrays without NaNs, as produced by BinaryLoader.js
+    onNoiseGridLoaded(grid, cityOrigin, callback) {
+        const {x, y, values} = grid;
+        const positions = new Float32Array(values.length * 3);
+        const colors = new Float32Array(values.length * 3);
+        const lut = new Lut("rainbow", 32);
+
+        lut.minV = Infinity;
+        lut.maxV = -Infinity;
+        for (let i=0; i<values.length; i++) {
+            positions[i*3] = (x[i] - cityOrigin.x)*this.scale;
+            positions[i*3 + 1] = (59.7)*this.scale;
+            positions[i*3 + 2] = (- (y[i] - cityOrigin.y))*this.scale;
+            lut.minV = Math.min(lut.minV, values[i]);
+            lut.maxV = Math.max(lut.maxV, values[i]);
+        }
+
+        for (let i=0; i<values.length; i++) {
+            const color = lut.getColor(values[i]);
+            colors[i*3] = color.r;
+            colors[i*3 + 1] = color.g;
+            colors[i*3 + 2] = color.b;
         }
 
         const mesh = drawParticles(positions, colors, 4 * this.scale);
@@ -1,5 +1,7 @@
 import * as THREE from 'three';
 import {STLLoader} from '../libs/STLLoader.js';
+import {loadBinary, isBinaryPath} from './BinaryLoader.js';
+import {loadGLB, isGLBPath} from './GLBLoader.js';
 
 class DataSet {
     constructor(name, dataHandler, cityModelData,
@@ -118,6 +120,17 @@ class DataSet {
             console.warn(`No buildingOption data provided for ${this.name}.`);
             return;
         }
+        if (isGLBPath(buildingOptionPath)) {
+            loadGLB(buildingOptionPath, glb => {
+                this.dataHandler.onBuildingOptionLODLoaded(
+                    glb, cityOrigin, lod => {
+                        this.objects.set('buildingOption', lod);
+                        this.logFinished('buildingOption');
+                    }
+                )
+            });
+            return;
+        }
         const loader = new STLLoader();
         loader.load(
             buildingOptionPath,
@@ -137,6 +150,16 @@ class DataSet {
             console.warn(`No noise data provided for ${this.name}.`);
             return;
         }
+        if (isBinaryPath(noisePath)) {
+            loadBinary(noisePath, grid => {
+                this.dataHandler.onNoiseGridLoaded(grid, cityOrigin, (mesh, colorbar) => {
+                    this.legends.set('noise', colorbar);
+                    this.objects.set('noise', mesh);
+                    this.logFinished('noise');
+                });
+            });
+            return;
+        }
         this.csvLoader.loadCSV(noisePath, false, result => {
             this.dataHandler.onNoiseDataLoaded(result, cityOrigin, (mesh, colorbar) => {
                 this.legends.set('noise', colorbar);
@@ -151,6 +174,16 @@ class DataSet {
             console.warn(`No radiation data provided for ${this.name}.`);
             return;
         }
+        if (isBinaryPath(radiationPath)) {
+            loadBinary(radiationPath, grid => {
+                this.dataHandler.onRadiationGridLoaded(grid, this, (mesh, colorbar) => {
+                    this.objects.set('radiation', mesh);
+                    this.legends.set('radiation', colorbar);
+                    this.logFinished('radiation');
+                });
+            });
+            return;
+        }
         this.csvLoader.loadCSV(radiationPath, true, result => {
             this.dataHandler.onRadiationDataLoaded(result, this, (mesh, colorbar) => {
                 this.objects.set('radiation', mesh);
@@ -182,12 +215,17 @@ class DataSet {
             }
         });
 
-        this.csvLoader.loadCSV(windSurfaceNodesPath, true, result => {
+        const onNodesLoaded = result => {
             nodeResults = result;
             if (cellResults) {
                onBothLoaded();
             }
-        });
+        };
+        if (isBinaryPath(windSurfaceNodesPath)) {
+            loadBinary(windSurfaceNodesPath, onNodesLoaded);
+        } else {
+            this.csvLoader.loadCSV(windSurfaceNodesPath, true, onNodesLoaded);
+        }
     }
 }
 
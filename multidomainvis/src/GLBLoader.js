@@ -0,0 +1,86 @@
+// Minimal loader for the binary glTF files written by pipeline/gltf_assets.py.
+// Supports what that script writes: one buffer, triangle meshes, quantised
+// positions (KHR_mesh_quantization), padded vertex attributes (byteStride) and
+// node translation/scale/extras.
+
+import * as THREE from 'three';
+
+const COMPONENT_ARRAYS = {
+    5121: Uint8Array,
+    5123: Uint16Array,
+    5125: Uint32Array,
+    5126: Float32Array,
+};
+const TYPE_SIZES = {SCALAR: 1, VEC2: 2, VEC3: 3, VEC4: 4};
+
+function parseGLB(buffer) {
+    const view = new DataView(buffer);
+    if (view.getUint32(0, true) !== 0x46546C67) {  // 'glTF'
+        throw new Error('Not a binary glTF file');
+    }
+    const jsonLength = view.getUint32(12, true);
+    const json = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 20, jsonLength)));
+    const binOffset = 20 + jsonLength + 8;
+    return [json, binOffset];
+}
+
+function readAccessor(buffer, binOffset, json, index) {
+    const accessor = json.accessors[index];
+    const bufferView = json.bufferViews[accessor.bufferView];
+    const ArrayType = COMPONENT_ARRAYS[accessor.componentType];
+    const itemSize = TYPE_SIZES[accessor.type];
+    const offset = binOffset + (bufferView.byteOffset || 0) + (accessor.byteOffset || 0);
+    const stride = bufferView.byteStride;
+    if (stride && stride !== itemSize * ArrayType.BYTES_PER_ELEMENT) {
+        // Padded vertex attributes (elements aligned to 4 bytes)
+        const stridedItems = stride / ArrayType.BYTES_PER_ELEMENT;
+        const array = new ArrayType(buffer, offset, accessor.count * stridedItems);
+        const interleaved = new THREE.InterleavedBuffer(array, stridedItems);
+        return new THREE.InterleavedBufferAttribute(interleaved, itemSize, 0, accessor.normalized === true);
+    }
+    const array = new ArrayType(buffer, offset, accessor.count * itemSize);
+    return new THREE.BufferAttribute(array, itemSize, accessor.normalized === true);
+}
+
+// Returns [{name, geometry, translation, scale, extras}] for every node with a mesh
+function decodeNodes(buffer, json, binOffset) {
+    const nodes = [];
+    for (let node of json.nodes) {
+        if (node.mesh === undefined) {
+            continue;
+        }
+        const primitive = json.meshes[node.mesh].primitives[0];
+        const geometry = new THREE.BufferGeometry();
+        for (let [name, index] of Object.entries(primitive.attributes)) {
+            const attribute = name === 'POSITION' ? 'position' : name === 'COLOR_0' ? 'color' : name.toLowerCase();
+            geometry.setAttribute(attribute, readAccessor(buffer, binOffset, json, index));
+        }
+        if (primitive.indices !== undefined) {
+            geometry.setIndex(readAccessor(buffer, binOffset, json, primitive.indices));
+        }
+        nodes.push({
+            name: node.name,
+            geometry,
+            translation: node.translation || [0, 0, 0],
+            scale: node.scale || [1, 1, 1],
+            extras: node.extras || {},
+        });
+    }
+    return nodes;
+}
+
+// Calls back with {asset, nodes}, see decodeNodes
+function loadGLB(path, callback) {
+    fetch(path)
+        .then(response => response.arrayBuffer())
+        .then(buffer => {
+            const [json, binOffset] = parseGLB(buffer);
+            callback({asset: json.asset, nodes: decodeNodes(buffer, json, binOffset)});
+        });
+}
+
+function isGLBPath(path) {
+    return path.endsWith('.glb');
+}
+
+export {loadGLB, isGLBPath}
@@ -3,9 +3,10 @@ onmessage = function(e) {
     // Initialise the arrays beforehand for efficiency
     // Each cell triangle has three vertices (nodes), with
     // three positional values, hence 9.
-    const positions = new Float32Array(nodeData.length * 3);
-    const normals = new Float32Array(nodeData.length * 3);
-    const colors = new Array(nodeData.length);
+    const nNodes = nodeData.ids ? nodeData.ids.length : nodeData.length;
+    const positions = new Float32Array(nNodes * 3);
+    const normals = new Float32Array(nNodes * 3);
+    const colors = new Array(nNodes);
     const indices = new Array(cellData.length * 3);
 
     const columns = ['node 1', 'node 2', 'node 3'];
@@ -21,15 +22,27 @@ onmessage = function(e) {
 
     const nodeMap = new Map();
     let node;
-    for (let i=0; i<nodeData.length; i++) {
-        node = nodeData[i];
-        nodeMap.set(node.ID, i);
-        for (let j=0; j<3; j++) {
-            positions[i*3 + j*3] = node.x - cityOrigin.x;
-            positions[i*3 + j*3 + 1] = node.z;
-            positions[i*3 + j*3 + 2] = - (node.y - cityOrigin.y);
+    if (nodeData.ids) {
+        // Binary nodes from BinaryLoader.js, positions relative to the file origin
+        const [ox, oy, oz] = nodeData.header.origin;
+        for (let i=0; i<nodeData.ids.length; i++) {
+            nodeMap.set(nodeData.ids[i], i);
+            positions[i*3] = ox + nodeData.positions[i*3] - cityOrigin.x;
+            positions[i*3 + 1] = oz + nodeData.positions[i*3 + 2];
+            positions[i*3 + 2] = - (oy + nodeData.positions[i*3 + 1] - cityOrigin.y);
+            normals[i*3 + 1] = 1; // Y is up
+        }
+    } else {
+        for (let i=0; i<nodeData.length; i++) {
+            node = nodeData[i];
+            nodeMap.set(node.ID, i);
+            for (let j=0; j<3; j++) {
+                positions[i*3 + j*3] = node.x - cityOrigin.x;
+                positions[i*3 + j*3 + 1] = node.z;
+                positions[i*3 + j*3 + 2] = - (node.y - cityOrigin.y);
 
-            normals[i*3 + j*3 + 1] = 1; // Y is up
+                normals[i*3 + j*3 + 1] = 1; // Y is up
+            }
         }
     }
 